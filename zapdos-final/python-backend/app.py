@@ -5,13 +5,16 @@ import mimetypes
 import tempfile
 from datetime import datetime
 import time 
+import queue
+import functools
+import threading
+import collections
 import concurrent.futures 
 import re
 import openai
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
-import pdfplumber
 from PIL import Image, UnidentifiedImageError # For image processing
 from werkzeug.utils import secure_filename
 
@@ -21,7 +24,16 @@ from openai import OpenAI
 from nltk.tokenize import sent_tokenize 
 import nltk 
 
-from summarizer import process_text_for_qna 
+from summarizer import process_text_for_qna, filter_and_split_pages, get_page_filter_config
+import flashcard_jobs
+import llm_scheduler
+import llm_cache
+import token_budget
+import upload_cache
+import question_stream
+import near_duplicates
+import image_preparation
+import batch_pipeline
 # is_likely_boilerplate_page is used internally by process_text_for_qna
 
 app = Flask(__name__)
@@ -38,8 +50,23 @@ except nltk.downloader.DownloadError:
 OPENAI_API_KEY = "" # Your actual OpenAI key
 
 OPENAI_INPUT_USE_FULL_TEXT_IF_SHORTER_THAN_CHARS = 35000
-MAX_CHARS_PER_CHUNK_FOR_OPENAI = 75000 
-MAX_WORKERS_FOR_CHUNKING = 1 
+MAX_CHARS_PER_CHUNK_FOR_OPENAI = 75000 # Only for the plain-text fallback chunker; sentence chunks are sized in tokens
+OPENAI_MAX_TOKENS_PER_CHUNK_CALL = 24000 # Input + expected output budget of one text Q&A call (~75,000 chars of input when chunked)
+OPENAI_MAX_OUTPUT_TOKENS = 16384 # gpt-4o's completion limit
+OPENAI_PROMPT_OVERHEAD_TOKENS = 1000 # System message + instructions around the text
+OPENAI_OUTPUT_TOKENS_PER_QUESTION = 100 # One question object in the JSON response, MCQ options included
+OPENAI_MAX_QUESTIONS_PER_CHUNK = 30
+OPENAI_EXTRA_QUESTIONS_PER_CHUNK = 10 # Prompts invite this many more than the desired count
+OPENAI_EXTRA_QUESTIONS_SINGLE_CALL = 50
+MAX_WORKERS_FOR_CHUNKING = llm_scheduler.LLM_MAX_CONCURRENCY # Upper bound; the LLM scheduler decides how many calls actually run
+OPENAI_VISION_IMAGE_TOKENS_ESTIMATE = 1105 # A "high" detail image of typical photo size
+OPENAI_VISION_MAX_TOKENS = 1500
+OPENAI_VISION_EXPECTED_QUESTIONS = 7 # The vision prompt asks for 3-7
+OPENAI_VISION_MAX_IMAGE_BYTES = 20 * 1024 * 1024 # OpenAI's per-image limit; an unprepared original over it is rejected
+STREAM_KEEPALIVE_SECONDS = 15 # Streaming responses send a keepalive event when nothing else happened for this long
+STREAM_PROGRESS_MIN_INTERVAL_SECONDS = 1.0 # Progress events within a stage are streamed at most this often; a new stage always is
+STREAM_END_OF_JOB = object() # Queued by a streaming job once it has finished
+SUPPORTED_IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".heic", ".heif", ".webp", ".gif", ".bmp"]
 
 openai_client = None
 if not OPENAI_API_KEY or OPENAI_API_KEY == "YOUR_ACTUAL_OPENAI_API_KEY_PLACEHOLDER": # More generic placeholder check
@@ -52,8 +79,83 @@ else:
         print(f"FATAL ERROR: Could not configure OpenAI client: {e}")
 
 OPENAI_MODEL_NAME = "gpt-4o"
+OPENAI_PROMPT_VERSION = 1 # Part of the LLM response cache key: bump whenever the prompts or their expected output change
+OPENAI_STREAM_RESPONSES = True # Stream question completions, handing on each question object as soon as it closes
 
-def get_questions_from_text_openai(text_content, question_type_selected, source_page_numbers=None, num_meaningful_pages_in_source=0, is_chunked=False, chunk_info=""):
+CompletionText = collections.namedtuple("CompletionText", ["text", "usage"]) # .usage is what the LLM scheduler reads
+
+def request_questions_completion(messages, request_options, on_question_objects=None, log_prefix="[OpenAI]"):
+    """
+    Makes one chat completion request and returns its CompletionText. With on_question_objects
+    (and OPENAI_STREAM_RESPONSES), the completion is streamed and on_question_objects(question_objects)
+    gets the objects of its "questions" array as they close, long before the last token arrives.
+    """
+    if not (OPENAI_STREAM_RESPONSES and on_question_objects):
+        response = openai_client.chat.completions.create(model=OPENAI_MODEL_NAME, messages=messages, **request_options)
+        return CompletionText(response.choices[0].message.content, getattr(response, "usage", None))
+
+    stream_start_time = time.time()
+    question_parser = question_stream.QuestionStreamParser()
+    text_parts = []
+    usage = None
+    stream = openai_client.chat.completions.create(model=OPENAI_MODEL_NAME, messages=messages, stream=True,
+                                                   stream_options={"include_usage": True}, **request_options)
+    try:
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            text_parts.append(chunk.choices[0].delta.content)
+            question_objects = question_parser.feed(chunk.choices[0].delta.content)
+            if question_objects:
+                if question_parser.objects_parsed_count == len(question_objects):
+                    print(f"{log_prefix} First question streamed after {time.time() - stream_start_time:.2f}s.")
+                on_question_objects(question_objects)
+    finally:
+        stream.close()
+    print(f"{log_prefix} Streamed {question_parser.objects_parsed_count} question objects ({question_parser.objects_failed_count} unparseable).")
+    return CompletionText("".join(text_parts), usage)
+
+def strip_json_code_fence(response_text):
+    cleaned_response_text = response_text.strip()
+    if cleaned_response_text.startswith("```json"): cleaned_response_text = cleaned_response_text[7:]
+    if cleaned_response_text.endswith("```"): cleaned_response_text = cleaned_response_text[:-3]
+    return cleaned_response_text.strip()
+
+def is_cacheable_questions_response(response_text):
+    """Only responses that parse to a {"questions": [...]} object go into the LLM response cache."""
+    try:
+        parsed_response = json.loads(strip_json_code_fence(response_text))
+    except ValueError:
+        return False
+    return isinstance(parsed_response, dict) and isinstance(parsed_response.get("questions"), list)
+
+def get_desired_question_count(text_length_chars, estimated_words, num_meaningful_pages_in_source=0, is_chunked=False):
+    """How many questions the text prompt asks for ("around"/"at least" this many; up to the extra on top)."""
+    if text_length_chars <= 0:
+        return 10 # Default if text_content somehow empty
+    base_qs_from_length = max(10, int(estimated_words / 100)) # ~1 question per 100 words as a base, min 10
+    if is_chunked:
+        num_desired_questions = min(base_qs_from_length, OPENAI_MAX_QUESTIONS_PER_CHUNK) # Cap per chunk
+    else: # Full document (or single large block that wasn't chunked)
+        # Use num_meaningful_pages_in_source if available for a better estimate for the whole doc
+        if num_meaningful_pages_in_source > 0:
+            num_desired_questions = max(15, min(num_meaningful_pages_in_source * 2, 200)) # Up to 2 Qs per original page, max 200
+        else: # Fallback if no page count, use text length more aggressively for full doc
+            num_desired_questions = min(base_qs_from_length * 2, 200) # Cap at 200
+    return max(10, num_desired_questions) # Absolute minimum
+
+def get_expected_output_tokens(num_desired_questions, is_chunked):
+    """Output tokens to reserve for a text Q&A call: the most questions its prompt invites, at a typical size each."""
+    extra_questions = OPENAI_EXTRA_QUESTIONS_PER_CHUNK if is_chunked else OPENAI_EXTRA_QUESTIONS_SINGLE_CALL
+    return min(OPENAI_MAX_OUTPUT_TOKENS, (num_desired_questions + extra_questions) * OPENAI_OUTPUT_TOKENS_PER_QUESTION)
+
+def get_typical_output_tokens(num_desired_questions):
+    """Output tokens a Q&A call usually produces: the desired count at a typical size each (what the LLM scheduler reserves)."""
+    return min(OPENAI_MAX_OUTPUT_TOKENS, num_desired_questions * OPENAI_OUTPUT_TOKENS_PER_QUESTION)
+
+def get_questions_from_text_openai(text_content, question_type_selected, source_page_numbers=None, num_meaningful_pages_in_source=0, is_chunked=False, chunk_info="", bypass_cache=False, on_question_objects=None):
     if not openai_client:
         raise ConnectionError("OpenAI client is not configured.")
     
@@ -78,26 +180,12 @@ def get_questions_from_text_openai(text_content, question_type_selected, source_
     else:
         page_context_instruction = "Set the 'source_page' field to null for each question as source page information is not available for this content."
     
-    num_desired_questions = 0
     estimated_words = len(text_content.split())
-    if len(text_content) > 0:
-        base_qs_from_length = max(10, int(estimated_words / 100)) # ~1 question per 100 words as a base, min 10
-        
-        if is_chunked:
-            num_desired_questions = min(base_qs_from_length, 30) # Cap per chunk, e.g., max 30
-        else: # Full document (or single large block that wasn't chunked)
-            # Use num_meaningful_pages_in_source if available for a better estimate for the whole doc
-            if num_meaningful_pages_in_source > 0:
-                num_desired_questions = max(15, min(num_meaningful_pages_in_source * 2, 200)) # Up to 2 Qs per original page, max 200
-            else: # Fallback if no page count, use text length more aggressively for full doc
-                num_desired_questions = min(base_qs_from_length * 2, 200) # Cap at 200
-        num_desired_questions = max(10, num_desired_questions) # Absolute minimum
-    else: 
-        num_desired_questions = 10 # Default if text_content somehow empty
-
-    quantity_instruction = f"CRITICAL INSTRUCTION: Generate an EXTREMELY COMPREHENSIVE and LARGE set of questions from the provided text (length: {len(text_content)} characters, ~{estimated_words} words). Your primary goal is to maximize the number of high-quality, distinct questions. Aim to generate AT LEAST {max(10, num_desired_questions)} questions. If the content is rich and detailed, generate SIGNIFICANTLY MORE, up to {num_desired_questions + 50} or AS MANY questions as the text can meaningfully support, to ensure exhaustive coverage. Do not be conservative with the quantity; extract every possible question-worthy piece of information. Ensure questions cover a wide range of difficulties and topics from THIS text block."
+    num_desired_questions = get_desired_question_count(len(text_content), estimated_words, num_meaningful_pages_in_source, is_chunked)
+
+    quantity_instruction = f"CRITICAL INSTRUCTION: Generate an EXTREMELY COMPREHENSIVE and LARGE set of questions from the provided text (length: {len(text_content)} characters, ~{estimated_words} words). Your primary goal is to maximize the number of high-quality, distinct questions. Aim to generate AT LEAST {max(10, num_desired_questions)} questions. If the content is rich and detailed, generate SIGNIFICANTLY MORE, up to {num_desired_questions + OPENAI_EXTRA_QUESTIONS_SINGLE_CALL} or AS MANY questions as the text can meaningfully support, to ensure exhaustive coverage. Do not be conservative with the quantity; extract every possible question-worthy piece of information. Ensure questions cover a wide range of difficulties and topics from THIS text block."
     if is_chunked:
-        quantity_instruction = f"This is text chunk {chunk_info}. CRITICAL INSTRUCTION: From THIS CHUNK (length: {len(text_content)} characters, ~{estimated_words} words), generate as many high-quality, distinct questions as possible, ideally around {num_desired_questions}, but feel free to generate more (up to {num_desired_questions + 10}) if the content supports it. Ensure comprehensive coverage of THIS CHUNK."
+        quantity_instruction = f"This is text chunk {chunk_info}. CRITICAL INSTRUCTION: From THIS CHUNK (length: {len(text_content)} characters, ~{estimated_words} words), generate as many high-quality, distinct questions as possible, ideally around {num_desired_questions}, but feel free to generate more (up to {num_desired_questions + OPENAI_EXTRA_QUESTIONS_PER_CHUNK}) if the content supports it. Ensure comprehensive coverage of THIS CHUNK."
 
     prompt = f"""
 You are an AI that generates a large volume of high-quality educational flashcard questions from text. Output MUST be a single, valid JSON object. No markdown or other text.
@@ -135,29 +223,46 @@ Required JSON Output Structure:
         log_prefix = f"[OpenAI Caller Chunk {chunk_info if is_chunked else 'MAIN_CALL'}]"
         print(f"{log_prefix} Sending request (type: {question_type_selected}). Text length: {len(text_content)}. Desired Qs: ~{num_desired_questions}.")
         openai_call_start_time = time.time()
-        response = openai_client.chat.completions.create(
-            model=OPENAI_MODEL_NAME,
-            messages=messages,
-            response_format={"type": "json_object"},
-            temperature=0.3, 
-            # max_tokens parameter removed to let json_object mode try to fit output
-        )
+        request_options = {"response_format": {"type": "json_object"}, "temperature": 0.3} # max_tokens omitted to let json_object mode try to fit output
+        response_content_str = llm_cache.get_or_fetch_response(
+            llm_cache.make_cache_key(OPENAI_MODEL_NAME, messages, OPENAI_PROMPT_VERSION, **request_options),
+            lambda: llm_scheduler.get_llm_scheduler().run(
+                lambda: request_questions_completion(messages, request_options, on_question_objects, log_prefix),
+                llm_scheduler.estimate_tokens(messages[0]["content"] + prompt, OPENAI_MODEL_NAME, get_typical_output_tokens(num_desired_questions)), log_prefix
+            ).text,
+            bypass_cache, is_cacheable_questions_response, log_prefix)
         openai_call_duration = time.time() - openai_call_start_time
         
-        response_content_str = response.choices[0].message.content
-        
         print(f"{log_prefix} Received response in {openai_call_duration:.2f}s. Length: {len(response_content_str)}")
         return response_content_str
     except openai.APIConnectionError as e:
         raise ConnectionError(f"Failed to connect to OpenAI: {e}")
     except openai.RateLimitError as e:
-        raise Exception(f"OpenAI rate limit hit: {e}")
+        raise Exception(f"OpenAI rate limit hit (after {llm_scheduler.LLM_MAX_RETRIES} retries): {e}")
     except openai.APIStatusError as e: 
         raise Exception(f"OpenAI API error: Status {e.status_code} - {e.message}")
     except Exception as e:
         raise Exception(f"OpenAI API call failed: {str(e)}")
 
-def image_to_base64_data_url(image_path):
+def image_to_base64_data_url(image_path, content_sha256=None):
+    """
+    The image as a data URL, prepared (upright, scaled to what the vision model uses, re-encoded) when PIL can read it.
+    An image PIL cannot decode is sent as-is if it is within OPENAI_VISION_MAX_IMAGE_BYTES. Raises
+    FlashcardRequestError (413) for decompression bombs (over twice Image.MAX_IMAGE_PIXELS) and oversized originals.
+    """
+    try:
+        prepared_image = image_preparation.prepare_image_file(image_path, content_sha256)
+        return f"data:{prepared_image.mime_type};base64,{base64.b64encode(prepared_image.image_bytes).decode('utf-8')}"
+    except Image.DecompressionBombError as e_bomb:
+        print(f"[IMAGE_PREP] Rejecting '{image_path}': {e_bomb}")
+        raise FlashcardRequestError("Image has too many pixels to process.", 413)
+    except (UnidentifiedImageError, OSError, ValueError) as e_prepare:
+        heif_note = " (HEIC/HEIF needs pillow-heif)" if image_path.lower().endswith(('.heic', '.heif')) and not image_preparation.is_heif_available() else ""
+        print(f"[IMAGE_PREP] Could not prepare '{image_path}'{heif_note}: {e_prepare}. Sending the original file.")
+    original_file_size = os.path.getsize(image_path)
+    if original_file_size > OPENAI_VISION_MAX_IMAGE_BYTES:
+        print(f"[IMAGE_PREP] Rejecting '{image_path}': the original is {original_file_size} bytes and could not be prepared.")
+        raise FlashcardRequestError("Image is too large to send unprocessed.", 413)
     mime_type, _ = mimetypes.guess_type(image_path)
     if not mime_type:
         if image_path.lower().endswith(('.heic', '.heif')): mime_type = 'image/heic'
@@ -166,9 +271,8 @@ def image_to_base64_data_url(image_path):
         encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
     return f"data:{mime_type};base64,{encoded_string}"
 
-def get_questions_from_image_openai(image_file_path, question_type_selected):
+def get_questions_from_image_openai(base64_image, question_type_selected, bypass_cache=False, on_question_objects=None):
     if not openai_client: raise ConnectionError("OpenAI client not configured.")
-    base64_image = image_to_base64_data_url(image_file_path)
     type_specific_instructions = "" 
     mcq_options_field_example = ""  
     if question_type_selected == "MCQs":
@@ -189,13 +293,17 @@ Required JSON Output Structure: {{ "questions": [ {{ "id": "unique_img_q_id_1",
     try:
         print(f"[OpenAI Vision] Sending request for image Q&A (type: {question_type_selected}).")
         openai_call_start_time = time.time()
-        response = openai_client.chat.completions.create(model=OPENAI_MODEL_NAME, messages=prompt_messages, max_tokens=1500)
+        # The key covers the image's data URL, so only the same image (and prompt) hits the cache
+        response_content_str = llm_cache.get_or_fetch_response(
+            llm_cache.make_cache_key(OPENAI_MODEL_NAME, prompt_messages, OPENAI_PROMPT_VERSION, max_tokens=OPENAI_VISION_MAX_TOKENS),
+            lambda: llm_scheduler.get_llm_scheduler().run(
+                lambda: request_questions_completion(prompt_messages, {"max_tokens": OPENAI_VISION_MAX_TOKENS}, on_question_objects, "[OpenAI Vision]"),
+                llm_scheduler.estimate_tokens(prompt_messages[0]["content"] + prompt_messages[1]["content"][0]["text"], OPENAI_MODEL_NAME,
+                                              OPENAI_VISION_IMAGE_TOKENS_ESTIMATE + get_typical_output_tokens(OPENAI_VISION_EXPECTED_QUESTIONS)), "[OpenAI Vision]"
+            ).text,
+            bypass_cache, is_cacheable_questions_response, "[OpenAI Vision]")
         openai_call_duration = time.time() - openai_call_start_time
-        response_content_str = response.choices[0].message.content
-        cleaned_response_text = response_content_str.strip()
-        if cleaned_response_text.startswith("```json"): cleaned_response_text = cleaned_response_text[7:]
-        if cleaned_response_text.endswith("```"): cleaned_response_text = cleaned_response_text[:-3]
-        cleaned_response_text = cleaned_response_text.strip()
+        cleaned_response_text = strip_json_code_fence(response_content_str)
         print(f"[OpenAI Vision] Received response in {openai_call_duration:.2f}s. Cleaned length: {len(cleaned_response_text)}")
         return cleaned_response_text
     except Exception as e:
@@ -233,161 +341,138 @@ def create_text_chunks_with_page_context(text_to_chunk_str, overall_pages_for_te
     print(f"[CHUNKER] Created {len(chunks)} chunks. Max chars per chunk target: {max_chars_per_chunk}.")
     return chunks
 
-@app.route('/api/generate-flashcards', methods=['POST'])
-def generate_flashcards_route():
-    overall_start_time = time.time()
-    print(f"\n[APP_ROUTE] Request at {datetime.now().isoformat()} using OpenAI {OPENAI_MODEL_NAME}")
+def create_token_budget_chunks(sentence_store, sentence_ids, num_meaningful_pages_in_source):
+    """
+    Packs sentences (read by id from the summarizer pipeline's SentenceStore, so nothing is
+    re-tokenized) into chunks sized in model tokens. The text goes as one call if its input plus
+    the output that call's prompt asks for fits OPENAI_MAX_TOKENS_PER_CHUNK_CALL; otherwise it is
+    split into the fewest, evenly sized chunks whose input plus a chunk's expected output fits.
+    Each chunk carries only the pages of its own sentences.
+    """
+    sentence_ids = list(sentence_ids)
+    if not sentence_ids:
+        return []
+    sentence_token_counts = token_budget.count_tokens_per_text(sentence_store.sentences(sentence_ids), OPENAI_MODEL_NAME)
+    total_tokens = sum(sentence_token_counts)
+    estimated_words = sum(len(sentence_text.split()) for sentence_text in sentence_store.sentences(sentence_ids))
+    text_length_chars = sum(sentence_store.lengths[sentence_id] + 1 for sentence_id in sentence_ids) - 1
 
-    if not openai_client: return jsonify({"error": "OpenAI client not configured."}), 503
-    if 'file' not in request.files: return jsonify({"error": "No file part"}), 400
-    uploaded_file = request.files['file']
-    question_type = request.form.get('question_type')
-    if not uploaded_file.filename: return jsonify({"error": "No selected file"}), 400
-    if not question_type: return jsonify({"error": "Question type not specified"}), 400
+    single_call_output_tokens = get_expected_output_tokens(
+        get_desired_question_count(text_length_chars, estimated_words, num_meaningful_pages_in_source, is_chunked=False), is_chunked=False)
+    if total_tokens + OPENAI_PROMPT_OVERHEAD_TOKENS + single_call_output_tokens <= OPENAI_MAX_TOKENS_PER_CHUNK_CALL:
+        chunk_ranges = [(0, len(sentence_ids))]
+        max_chunk_input_tokens = OPENAI_MAX_TOKENS_PER_CHUNK_CALL - OPENAI_PROMPT_OVERHEAD_TOKENS - single_call_output_tokens
+    else:
+        chunk_output_tokens = get_expected_output_tokens(OPENAI_MAX_QUESTIONS_PER_CHUNK, is_chunked=True)
+        max_chunk_input_tokens = OPENAI_MAX_TOKENS_PER_CHUNK_CALL - OPENAI_PROMPT_OVERHEAD_TOKENS - chunk_output_tokens
+        chunk_ranges = token_budget.balanced_chunk_boundaries(sentence_token_counts, max_chunk_input_tokens)
 
-    original_filename = secure_filename(uploaded_file.filename)
-    _, file_extension = os.path.splitext(original_filename)
-    file_extension = file_extension.lower()
+    chunks = []
+    for start, end in chunk_ranges:
+        chunk_sentence_ids = sentence_ids[start:end]
+        chunks.append({"text": sentence_store.text(chunk_sentence_ids),
+                       "pages": sentence_store.pages_for(chunk_sentence_ids),
+                       "tokens": sum(sentence_token_counts[start:end])})
 
-    temp_file_path = None
-    all_generated_questions = []
+    tokenizer_name = "tiktoken" if token_budget.is_available() else "estimated"
+    print(f"[CHUNKER] Created {len(chunks)} chunks from {len(sentence_ids)} sentences ({total_tokens} {tokenizer_name} tokens). "
+          f"Input budget per chunk: {max_chunk_input_tokens} tokens; chunk sizes: {[chunk['tokens'] for chunk in chunks]}.")
+    return chunks
 
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension, prefix="openai_upload_") as temp_f:
-            uploaded_file.save(temp_f.name)
-            temp_file_path = temp_f.name
-        print(f"[APP_ROUTE] File '{original_filename}' saved to '{temp_file_path}'. QType: '{question_type}'.")
-
-        if file_extension == ".pdf":
-            pdf_process_start_time = time.time()
-            raw_text_by_page = [] 
-            total_pdf_pages = 0
-            with pdfplumber.open(temp_file_path) as pdf:
-                total_pdf_pages = len(pdf.pages)
-                for i, page_obj in enumerate(pdf.pages):
-                    page_text_content = page_obj.extract_text()
-                    if page_text_content and page_text_content.strip():
-                        raw_text_by_page.append((page_text_content.strip(), i + 1)) 
-            
-            if not raw_text_by_page: return jsonify({"error": "No extractable text in PDF."}), 422
-            print(f"[APP_ROUTE_PDF] Extracted text from {len(raw_text_by_page)} of {total_pdf_pages} pages.")
-
-            # Call summarizer.py's process_text_for_qna
-            # It returns: (best_summary_text_for_show, pages_for_best_summary_show, method_for_show, metrics_for_show, 
-            #              full_filtered_text_from_pipeline, pages_for_full_filtered_text_openai)
-            _best_summary_for_show, _pages_for_best_summary_show, _method_for_show, _metrics_for_show, \
-            full_filtered_text_from_pipeline, pages_for_full_filtered_text_openai = \
-                process_text_for_qna(raw_text_by_page, total_pdf_pages)
-            
-            if not full_filtered_text_from_pipeline:
-                print("[APP_ROUTE_PDF_ERROR] Summarizer/Filter pipeline returned no full_filtered_text.")
-                return jsonify({"error": "No content available after boilerplate filtering."}), 500
-            
-            num_meaningful_pages_for_prompt = len(pages_for_full_filtered_text_openai)
-            
-            # --- Decision: What text to send to OpenAI? ---
-            text_to_send_to_openai = full_filtered_text_from_pipeline
-            pages_for_openai_context = pages_for_full_filtered_text_openai
-            
-            # If the full filtered text is shorter than our preferred single-call limit, use it.
-            # Otherwise, use the "best summary" (which is now targeted to be a large % of original).
-            if len(full_filtered_text_from_pipeline) > OPENAI_INPUT_USE_FULL_TEXT_IF_SHORTER_THAN_CHARS:
-                print(f"[APP_ROUTE_PDF] Full filtered text ({len(full_filtered_text_from_pipeline)} chars) is larger than preferred single-call limit ({OPENAI_INPUT_USE_FULL_TEXT_IF_SHORTER_THAN_CHARS} chars).")
-                if _best_summary_for_show and len(_best_summary_for_show) > 0.05 * len(full_filtered_text_from_pipeline): # Ensure summary is not trivially short
-                    print(f"  Using 'best evaluated summary' (method: {_method_for_show}, length: {len(_best_summary_for_show)} chars) instead.")
-                    text_to_send_to_openai = _best_summary_for_show
-                    pages_for_openai_context = _pages_for_best_summary_show
-                    # Update meaningful pages for prompt if using summary's pages
-                    num_meaningful_pages_for_prompt = len(pages_for_openai_context) if pages_for_openai_context else num_meaningful_pages_for_prompt
-                else:
-                    print(f"  'Best evaluated summary' is too short or empty. Proceeding with full filtered text (will be chunked if > chunk limit).")
-            else:
-                 print(f"[APP_ROUTE_PDF] Full filtered text ({len(full_filtered_text_from_pipeline)} chars) is within preferred limit. Using it directly.")
+class FlashcardRequestError(Exception):
+    """A failure the routes answer with a specific HTTP status (bad upload, nothing to generate from, ...)."""
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
 
+def report_progress(progress_callback, stage_name, **details):
+    if progress_callback:
+        progress_callback(stage_name, **details)
 
-            if not text_to_send_to_openai.strip():
-                 print("[APP_ROUTE_PDF_ERROR] No text content selected to send to OpenAI after decision logic.")
-                 return jsonify({"error": "No text content available for Q&A generation after processing."}), 500
+def iter_with_page_progress(pages_iter, progress_callback, stage_name, total_pages):
+    for pages_done, page_item in enumerate(pages_iter, start=1):
+        report_progress(progress_callback, stage_name, pages_done=pages_done, total_pages=total_pages)
+        yield page_item
 
-            pdf_text_prep_duration = time.time() - pdf_process_start_time
-            print(f"[APP_ROUTE_PDF] PDF text extraction, filtering & summarizer 'show' run took {pdf_text_prep_duration:.2f}s.")
-            print(f"[APP_ROUTE_PDF] Final text selected for OpenAI (length: {len(text_to_send_to_openai)} chars) from ~{num_meaningful_pages_for_prompt} effective pages. Associated pages: {pages_for_openai_context[:5]}... (if many)")
+def get_flashcard_error_response(exception):
+    """(error message, HTTP status code) for an exception raised while generating flashcards."""
+    if isinstance(exception, FlashcardRequestError): return str(exception), exception.status_code
+    if isinstance(exception, ConnectionError): return f"AI service connection error: {str(exception)}", 503
+    if isinstance(exception, openai.APIError):
+        print(f"OpenAI API Error in route: {exception}")
+        return f"OpenAI API service error: Status {getattr(exception, 'status_code', 500)} - {exception.message}", getattr(exception, 'status_code', 500)
+    print(f"Unexpected error in route: {exception}")
+    import traceback
+    traceback.print_exception(type(exception), exception, exception.__traceback__)
+    return f"Internal server error: {str(exception)}", 500
 
-            # --- CHUNKING LOGIC for the chosen text_to_send_to_openai ---
-            text_chunks_with_pages = create_text_chunks_with_page_context(
-                text_to_send_to_openai,
-                pages_for_openai_context, # Pass the page context for this block
-                MAX_CHARS_PER_CHUNK_FOR_OPENAI # Use this for chunking chosen text
-            )
-            
-            if not text_chunks_with_pages:
-                 if text_to_send_to_openai.strip(): 
-                     text_chunks_with_pages = [{"text": text_to_send_to_openai, "pages": pages_for_openai_context}]
-                 else:
-                    return jsonify({"error": "No text content available for chunking or Q&A."}), 500
-
-            if len(text_chunks_with_pages) == 1:
-                print("[APP_ROUTE_PDF] Sending single block/chunk to OpenAI.")
-                chunk_data = text_chunks_with_pages[0]
-                qna_json_string = get_questions_from_text_openai(
-                    chunk_data["text"], question_type, chunk_data["pages"], 
-                    num_meaningful_pages_for_prompt, is_chunked=False 
-                )
-                if qna_json_string:
-                    try:
-                        parsed_chunk = json.loads(qna_json_string)
-                        if parsed_chunk and isinstance(parsed_chunk.get("questions"), list):
-                            all_generated_questions.extend(parsed_chunk["questions"])
-                    except Exception as e:
-                        print(f"[APP_ROUTE_PDF] Error parsing single text response: {e}. Response: {qna_json_string[:500]}")
-            else: 
-                print(f"[APP_ROUTE_PDF] Sending {len(text_chunks_with_pages)} chunks to OpenAI in parallel (Max workers: {MAX_WORKERS_FOR_CHUNKING}).")
-                with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS_FOR_CHUNKING) as executor:
-                    future_to_chunk_index = {
-                        executor.submit(
-                            get_questions_from_text_openai,
-                            chunk_data["text"], question_type, chunk_data["pages"],
-                            num_meaningful_pages_for_prompt, True, f"{idx + 1}/{len(text_chunks_with_pages)}"
-                        ): idx for idx, chunk_data in enumerate(text_chunks_with_pages)
-                    }
-                    for future in concurrent.futures.as_completed(future_to_chunk_index):
-                        chunk_idx = future_to_chunk_index[future]
-                        try:
-                            chunk_qna_json_string = future.result()
-                            if chunk_qna_json_string:
-                                chunk_parsed_output = json.loads(chunk_qna_json_string)
-                                if chunk_parsed_output and isinstance(chunk_parsed_output.get("questions"), list):
-                                    all_generated_questions.extend(chunk_parsed_output["questions"])
-                        except Exception as exc:
-                            print(f"[APP_ROUTE_PDF] Chunk {chunk_idx + 1} generated an exception during OpenAI call: {exc}")
-            print(f"[APP_ROUTE_PDF] Processed {len(text_chunks_with_pages)} chunks for PDF.")
-
-        elif file_extension in [".png", ".jpg", ".jpeg", ".heic", ".heif", ".webp", ".gif", ".bmp"]:
-            img_process_start_time = time.time()
-            single_image_qna_json_string = get_questions_from_image_openai(temp_file_path, question_type)
-            if single_image_qna_json_string:
-                try:
-                    parsed_output = json.loads(single_image_qna_json_string)
-                    if parsed_output and isinstance(parsed_output.get("questions"), list):
-                        all_generated_questions.extend(parsed_output["questions"])
-                except Exception as e: print(f"[APP_ROUTE_IMG] Error parsing JSON from image Q&A: {e}")
-            img_process_duration = time.time() - img_process_start_time
-            print(f"[APP_ROUTE_IMG] Image Q&A with OpenAI took {img_process_duration:.2f}s.")
-        else:
-            return jsonify({"error": f"Unsupported file type: '{file_extension}'."}), 415
-        
+def get_question_form_score(question_item):
+    """How well-formed a normalized question is (higher is better), to pick which of several near-duplicates to keep."""
+    question_text = str(question_item.get("question") or "").strip()
+    answer_text = str(question_item.get("answer") or "").strip()
+    form_score = 4 if question_text and answer_text else 0
+    question_type = question_item.get("question_type")
+    if question_type == "MCQs":
+        options = question_item.get("options") or []
+        if 3 <= len(set(map(str, options))) <= 4 and answer_text in options: form_score += 4
+    elif question_type == "Fill-in-the-Blanks":
+        if "___" in question_text: form_score += 2
+    elif question_type == "True or False":
+        if answer_text.lower() in ("true", "false"): form_score += 2
+    if question_item.get("source_page"): form_score += 1
+    return (form_score, min(len(question_text), 300)) # Then the more informative (longer, within reason) wording
+
+def is_well_formed_raw_question(q_item_raw):
+    """Whether an item of a parsed OpenAI response has the fields QuestionCollector needs, with usable types."""
+    if not isinstance(q_item_raw, dict):
+        return False
+    question_text = q_item_raw.get("question")
+    answer_value = q_item_raw.get("answer")
+    return (isinstance(question_text, str) and bool(question_text.strip())
+            and isinstance(answer_value, (str, int, float, bool)))
+
+class QuestionCollector:
+    """
+    Collects the questions of each OpenAI response as it arrives: drops exact duplicates (by
+    normalized question text), normalizes the fields, then clusters near-duplicates (MinHash/LSH
+    over question + answer, Jaccard >= similarity_threshold) so overlapping chunks' paraphrases
+    collapse to the best-formed question of each cluster within a response. Every batch of
+    questions that start a new cluster goes to questions_callback(batch, source_info, question_type)
+    and is final from then on: a duplicate in a later response is dropped even if better formed,
+    so streamed clients and .questions always hold the same questions.
+    Items that are not a dict with a non-empty string "question" and a scalar "answer" are skipped.
+    Streamed responses add questions from several calls' threads at once, so additions are serialized.
+    """
+    def __init__(self, question_type, questions_callback=None, similarity_threshold=None):
+        self.question_type = question_type
+        self.questions_callback = questions_callback
+        self.questions = []
+        self.raw_questions_count = 0
+        self.near_duplicates_count = 0
+        self.formatting_seconds = 0.0
+        self._unique_q_texts = set()
+        self._near_duplicate_index = near_duplicates.NearDuplicateIndex(similarity_threshold)
+        self._cluster_positions = {} # Near-duplicate cluster id -> position of its kept question in self.questions
+        self._lock = threading.Lock()
+
+    def add_raw_questions(self, raw_questions, source_info=None):
+        with self._lock:
+            return self._add_raw_questions(raw_questions, source_info)
+
+    def _add_raw_questions(self, raw_questions, source_info):
         json_parse_start_time = time.time()
-        final_formatted_questions = []
-        unique_q_texts = set() 
-        for i, q_item_raw in enumerate(all_generated_questions):
-            if isinstance(q_item_raw, dict) and "question" in q_item_raw and "answer" in q_item_raw:
+        new_questions = []
+        for q_item_raw in raw_questions:
+            i = self.raw_questions_count
+            self.raw_questions_count += 1
+            if is_well_formed_raw_question(q_item_raw):
                 question_text_norm = q_item_raw["question"].strip().lower()
-                if question_text_norm in unique_q_texts:
+                if question_text_norm in self._unique_q_texts:
                     print(f"Skipping duplicate question: {question_text_norm[:50]}...")
                     continue
-                unique_q_texts.add(question_text_norm)
+                self._unique_q_texts.add(question_text_norm)
                 q_item_raw["id"] = q_item_raw.get("id", f"oa_q_final_{datetime.now().timestamp()}_{i}")
-                q_item_raw["question_type"] = q_item_raw.get("question_type", question_type)
+                q_item_raw["question_type"] = q_item_raw.get("question_type", self.question_type)
                 raw_src_page = q_item_raw.get("source_page")
                 if isinstance(raw_src_page, list): q_item_raw["source_page"] = ", ".join(map(str, raw_src_page))
                 elif raw_src_page is not None: q_item_raw["source_page"] = str(raw_src_page)
@@ -395,27 +480,546 @@ def generate_flashcards_route():
                 if q_item_raw["question_type"] == "MCQs":
                     if "options" not in q_item_raw or not isinstance(q_item_raw["options"], list): q_item_raw["options"] = None
                 else: q_item_raw["options"] = q_item_raw.get("options") 
-                final_formatted_questions.append(q_item_raw)
+                cluster_id = self._near_duplicate_index.add(f"{q_item_raw['question']} {q_item_raw['answer']}")
+                kept_position = self._cluster_positions.get(cluster_id)
+                if kept_position is not None:
+                    self.near_duplicates_count += 1
+                    kept_question = self.questions[kept_position]
+                    is_kept_question_sent = not any(kept_question is batch_question for batch_question in new_questions)
+                    if not is_kept_question_sent and get_question_form_score(q_item_raw) > get_question_form_score(kept_question):
+                        self.questions[kept_position] = q_item_raw
+                        new_questions = [q_item_raw if batch_question is kept_question else batch_question for batch_question in new_questions]
+                    continue
+                self._cluster_positions[cluster_id] = len(self.questions)
+                self.questions.append(q_item_raw)
+                new_questions.append(q_item_raw)
             else: print(f"Skipping malformed Q item during final aggregation: {q_item_raw}")
-        json_parse_duration = time.time() - json_parse_start_time
-        print(f"[APP_ROUTE] JSON parsing & final formatting took {json_parse_duration:.2f}s. Total unique questions: {len(final_formatted_questions)}")
-        if not final_formatted_questions and all_generated_questions: return jsonify({"error": "AI data malformed post-aggregation."}), 500
-        elif not final_formatted_questions: return jsonify({"questions": []}), 200
-        return jsonify({"questions": final_formatted_questions}), 200
-            
-    except ConnectionError as e: return jsonify({"error": f"AI service connection error: {str(e)}"}), 503
-    except openai.APIError as e: 
-        print(f"OpenAI API Error in route: {e}")
-        return jsonify({"error": f"OpenAI API service error: Status {e.status_code} - {e.message}"}), getattr(e, 'status_code', 500)
-    except Exception as e: 
-        print(f"Unexpected error in route: {e}")
-        import traceback
-        traceback.print_exc() 
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+        self.formatting_seconds += time.time() - json_parse_start_time
+        if new_questions and self.questions_callback:
+            self.questions_callback(new_questions, source_info, self.question_type)
+        return new_questions
+
+def generate_flashcards_from_file(file_path, file_extension, question_types, progress_callback=None, questions_callback=None, bypass_llm_cache=False, upload_sha256=None):
+    """
+    Runs the whole pipeline (PDF extraction + summarizer + chunked OpenAI calls, or vision calls
+    for images) on a saved upload and returns {question_type: de-duplicated, formatted questions}.
+    Extraction, filtering, summarization and chunking run once; each chunk then gets one OpenAI
+    call per requested question type, all in parallel.
+    progress_callback(stage_name, **details) is told about each stage as it starts and progresses;
+    questions_callback(new_questions, source_info, question_type) gets each call's new questions as soon as they arrive.
+    bypass_llm_cache forces fresh OpenAI calls instead of cached responses.
+    upload_sha256 (the upload's content hash) lets a PDF's extracted pages, or a prepared image, come from cache.
+    Raises FlashcardRequestError for failures with a specific HTTP status.
+    """
+    question_generation_plan = prepare_question_generation(file_path, file_extension, question_types, progress_callback, bypass_llm_cache, upload_sha256)
+    return run_question_generation(question_generation_plan, question_types, progress_callback, questions_callback)
+
+def prepare_question_generation(file_path, file_extension, question_types, progress_callback=None, bypass_llm_cache=False, upload_sha256=None):
+    """
+    The CPU stages of generate_flashcards_from_file: extraction, filtering, summarization and
+    chunking for a PDF, or preparing an image. Returns the plan for run_question_generation:
+    (question_calls, log_prefix, raise_if_all_failed).
+    """
+    if file_extension == ".pdf":
+        pdf_process_start_time = time.time()
+        extraction_stats = {"pages_with_text": 0}
+        filtered_pages_cache_key = None
+        cached_filtered_pages = None
+        if upload_cache.UPLOAD_CACHE_ENABLED and upload_sha256:
+            filtered_pages_cache_key = upload_cache.get_filtered_pages_cache_key(upload_sha256, get_page_filter_config())
+            cached_filtered_pages = upload_cache.get_cached_filtered_pages(filtered_pages_cache_key)
+        if cached_filtered_pages is not None:
+            # Filtered and split before with the same configuration: the pages are not even read
+            total_pdf_pages, extraction_stats["pages_with_text"], filtered_pages = cached_filtered_pages
+            extraction_stats['upload_cache'] = "filtered hit"
+            report_progress(progress_callback, "extraction_and_summarization", pages_done=total_pdf_pages, total_pages=total_pdf_pages)
+        else:
+            # Same bytes seen before (or being extracted by another request right now): reuse those pages
+            with upload_cache.open_pdf_page_texts(file_path, upload_sha256, extraction_stats) as (total_pdf_pages, pdf_page_texts):
+                report_progress(progress_callback, "extraction_and_summarization", pages_done=0, total_pages=total_pdf_pages)
+                # Pages are extracted (in page ranges on the extraction process pool for long PDFs) while
+                # the boilerplate filter and sentence splitter work through the pages already yielded in order.
+                filtered_pages = filter_and_split_pages(iter_with_page_progress(pdf_page_texts,
+                                                                               progress_callback, "extraction_and_summarization", total_pdf_pages), total_pdf_pages)
+            if filtered_pages_cache_key is not None and extraction_stats["pages_with_text"]:
+                upload_cache.store_filtered_pages(filtered_pages_cache_key, total_pdf_pages, extraction_stats["pages_with_text"], filtered_pages)
+        # It returns: (best_summary_text_for_show, pages_for_best_summary_show, method_for_show, metrics_for_show, 
+        #              full_filtered_text_from_pipeline, pages_for_full_filtered_text_openai, qna_sentences, selection_log)
+        _best_summary_for_show, _pages_for_best_summary_show, _method_for_show, _metrics_for_show, \
+        full_filtered_text_from_pipeline, pages_for_full_filtered_text_openai, qna_sentences, _selection_log = \
+            process_text_for_qna(None, total_pdf_pages, filtered_pages=filtered_pages)
+        
+        if not extraction_stats["pages_with_text"]: raise FlashcardRequestError("No extractable text in PDF.", 422)
+        print(f"[APP_ROUTE_PDF] Extracted text from {extraction_stats['pages_with_text']} of {total_pdf_pages} pages "
+              f"(pypdfium2: {extraction_stats.get('pages_pypdfium2', 0)}, pdfplumber: {extraction_stats.get('pages_pdfplumber', 0)}, "
+              f"upload cache: {extraction_stats['upload_cache']}).")
+        
+        if not full_filtered_text_from_pipeline:
+            print("[APP_ROUTE_PDF_ERROR] Summarizer/Filter pipeline returned no full_filtered_text.")
+            raise FlashcardRequestError("No content available after boilerplate filtering.", 500)
+        
+        num_meaningful_pages_for_prompt = len(pages_for_full_filtered_text_openai)
+        # full_filtered_text_from_pipeline is the store's sentences joined by single spaces; it only decides
+        # how much text to send, and the chunks themselves are cut from the store by sentence id below
+        
+        # --- Decision: What text to send to OpenAI? ---
+        text_to_send_to_openai = full_filtered_text_from_pipeline
+        pages_for_openai_context = pages_for_full_filtered_text_openai
+        sentence_ids_for_openai = None # None -> every sentence in the store
+        
+        # If the full filtered text is shorter than our preferred single-call limit, use it.
+        # Otherwise, use the "best summary" (which is now targeted to be a large % of original).
+        if len(full_filtered_text_from_pipeline) > OPENAI_INPUT_USE_FULL_TEXT_IF_SHORTER_THAN_CHARS:
+            print(f"[APP_ROUTE_PDF] Full filtered text ({len(full_filtered_text_from_pipeline)} chars) is larger than preferred single-call limit ({OPENAI_INPUT_USE_FULL_TEXT_IF_SHORTER_THAN_CHARS} chars).")
+            if _best_summary_for_show and len(_best_summary_for_show) > 0.05 * len(full_filtered_text_from_pipeline): # Ensure summary is not trivially short
+                print(f"  Using 'best evaluated summary' (method: {_method_for_show}, length: {len(_best_summary_for_show)} chars) instead.")
+                text_to_send_to_openai = _best_summary_for_show
+                pages_for_openai_context = _pages_for_best_summary_show
+                sentence_ids_for_openai = qna_sentences['summary_sentence_ids'] if qna_sentences else None
+                # Update meaningful pages for prompt if using summary's pages
+                num_meaningful_pages_for_prompt = len(pages_for_openai_context) if pages_for_openai_context else num_meaningful_pages_for_prompt
+            else:
+                print(f"  'Best evaluated summary' is too short or empty. Proceeding with full filtered text (will be chunked if > chunk limit).")
+        else:
+             print(f"[APP_ROUTE_PDF] Full filtered text ({len(full_filtered_text_from_pipeline)} chars) is within preferred limit. Using it directly.")
+
+
+        if not text_to_send_to_openai.strip():
+             print("[APP_ROUTE_PDF_ERROR] No text content selected to send to OpenAI after decision logic.")
+             raise FlashcardRequestError("No text content available for Q&A generation after processing.", 500)
+
+        pdf_text_prep_duration = time.time() - pdf_process_start_time
+        print(f"[APP_ROUTE_PDF] PDF text extraction, filtering & summarizer 'show' run took {pdf_text_prep_duration:.2f}s.")
+        print(f"[APP_ROUTE_PDF] Final text selected for OpenAI (length: {len(text_to_send_to_openai)} chars) from ~{num_meaningful_pages_for_prompt} effective pages. Associated pages: {pages_for_openai_context[:5]}... (if many)")
+
+        # --- CHUNKING LOGIC for the chosen text_to_send_to_openai ---
+        report_progress(progress_callback, "chunking")
+        if qna_sentences:
+            # Chunk by sentence id straight from the pipeline's sentence store
+            sentence_store = qna_sentences['sentence_store']
+            if sentence_ids_for_openai is None:
+                sentence_ids_for_openai = range(len(sentence_store))
+            text_chunks_with_pages = create_token_budget_chunks(
+                sentence_store, sentence_ids_for_openai, num_meaningful_pages_for_prompt)
+        else:
+            text_chunks_with_pages = create_text_chunks_with_page_context(
+                text_to_send_to_openai,
+                pages_for_openai_context, # Pass the page context for this block
+                MAX_CHARS_PER_CHUNK_FOR_OPENAI # Use this for chunking chosen text
+            )
+        
+        if not text_chunks_with_pages:
+             if text_to_send_to_openai.strip(): 
+                 text_chunks_with_pages = [{"text": text_to_send_to_openai, "pages": pages_for_openai_context}]
+             else:
+                raise FlashcardRequestError("No text content available for chunking or Q&A.", 500)
+
+        # Every chunk is asked for every requested type; the LLM scheduler paces the calls
+        is_chunked = len(text_chunks_with_pages) > 1
+        question_calls = []
+        for idx, chunk_data in enumerate(text_chunks_with_pages):
+            chunk_info = f"{idx + 1}/{len(text_chunks_with_pages)}"
+            for question_type in question_types:
+                question_calls.append((question_type, chunk_info, functools.partial(
+                    get_questions_from_text_openai, chunk_data["text"], question_type, chunk_data["pages"],
+                    num_meaningful_pages_for_prompt, is_chunked, chunk_info, bypass_llm_cache)))
+        print(f"[APP_ROUTE_PDF] Prepared {len(text_chunks_with_pages)} chunk(s) x {len(question_types)} question type(s) for OpenAI (Max workers: {MAX_WORKERS_FOR_CHUNKING}, LLM concurrency limit now {llm_scheduler.get_llm_scheduler().get_stats()['concurrency_limit']}).")
+        return question_calls, "[APP_ROUTE_PDF]", not is_chunked
+
+    if file_extension in SUPPORTED_IMAGE_EXTENSIONS:
+        base64_image = image_to_base64_data_url(file_path, upload_sha256) # Prepared once for every question type's call
+        question_calls = [(question_type, "image", functools.partial(get_questions_from_image_openai, base64_image, question_type, bypass_llm_cache))
+                          for question_type in question_types]
+        return question_calls, "[APP_ROUTE_IMG]", True
+    raise FlashcardRequestError(f"Unsupported file type: '{file_extension}'.", 415)
+
+def run_question_generation(question_generation_plan, question_types, progress_callback=None, questions_callback=None):
+    """
+    The LLM stage of generate_flashcards_from_file: runs a plan's OpenAI calls and returns
+    {question_type: de-duplicated, formatted questions}.
+    """
+    question_calls, log_prefix, raise_if_all_failed = question_generation_plan
+    question_collectors = {question_type: QuestionCollector(question_type, questions_callback) for question_type in question_types}
+    generation_start_time = time.time()
+    run_question_generation_calls(question_calls, question_collectors, progress_callback, log_prefix, raise_if_all_failed)
+    print(f"{log_prefix} {len(question_calls)} OpenAI call(s) took {time.time() - generation_start_time:.2f}s.")
+
+    questions_by_type = {question_type: question_collectors[question_type].questions for question_type in question_types}
+    formatting_seconds = sum(question_collector.formatting_seconds for question_collector in question_collectors.values())
+    unique_questions_count = sum(len(questions) for questions in questions_by_type.values())
+    near_duplicates_count = sum(question_collector.near_duplicates_count for question_collector in question_collectors.values())
+    print(f"[APP_ROUTE] Merged {near_duplicates_count} near-duplicate questions (similarity threshold {near_duplicates.NEAR_DUPLICATE_THRESHOLD}).")
+    print(f"[APP_ROUTE] JSON parsing & final formatting took {formatting_seconds:.2f}s. Total unique questions: {unique_questions_count} ({', '.join(f'{question_type}: {len(questions)}' for question_type, questions in questions_by_type.items())})")
+    if not unique_questions_count and any(question_collector.raw_questions_count for question_collector in question_collectors.values()):
+        raise FlashcardRequestError("AI data malformed post-aggregation.", 500)
+    return questions_by_type
+
+def get_question_object_key(question_object):
+    """Identifies a question object by its content (key order aside), to tell which ones were already collected."""
+    return json.dumps(question_object, sort_keys=True)
+
+def run_question_generation_calls(question_calls, question_collectors, progress_callback, log_prefix, raise_if_all_failed=False):
+    """
+    Runs (question_type, source_info, call_function) OpenAI calls concurrently and hands their
+    questions to that type's QuestionCollector as they arrive: one by one while a response streams
+    (call_function gets an on_question_objects callback), then, once the whole response is in, any
+    of its questions the stream did not yield (all of them for e.g. an LLM cache hit). Objects a
+    call already handed over (e.g. before a scheduler retry re-streams it) are not added again.
+    A failed call is logged and skipped; with raise_if_all_failed, the first error is raised if none succeeded.
+    If progress_callback raises (a cancelled job), calls that have not started yet are dropped.
+    """
+    calls_total = len(question_calls)
+    calls_done = 0
+    call_exceptions = []
+    report_progress(progress_callback, "question_generation", calls_done=0, calls_total=calls_total)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS_FOR_CHUNKING, calls_total))) as executor:
+        future_to_call = {}
+        for question_type, source_info, call_function in question_calls:
+            call_stream_state = {'questions_added': 0, 'question_keys': set()}
+            def on_question_objects(question_objects, question_type=question_type, source_info=source_info, call_stream_state=call_stream_state):
+                new_question_objects = []
+                for question_object in question_objects:
+                    question_key = get_question_object_key(question_object)
+                    if question_key not in call_stream_state['question_keys']:
+                        call_stream_state['question_keys'].add(question_key)
+                        new_question_objects.append(question_object)
+                call_stream_state['questions_added'] += len(new_question_objects)
+                if new_question_objects:
+                    question_collectors[question_type].add_raw_questions(new_question_objects, source_info)
+            future_to_call[executor.submit(call_function, on_question_objects=on_question_objects)] = (question_type, source_info, call_stream_state, on_question_objects)
+        try:
+            for future in concurrent.futures.as_completed(future_to_call):
+                question_type, source_info, call_stream_state, on_question_objects = future_to_call[future]
+                qna_json_string = None
+                try:
+                    qna_json_string = future.result()
+                except Exception as exc:
+                    print(f"{log_prefix} {question_type} call for {source_info} generated an exception during OpenAI call: {exc}")
+                    call_exceptions.append(exc)
+                if qna_json_string:
+                    # The full response is the reference: anything the stream parser could not close or parse is added now
+                    questions_streamed = call_stream_state['questions_added']
+                    try:
+                        parsed_output = json.loads(strip_json_code_fence(qna_json_string))
+                        if parsed_output and isinstance(parsed_output.get("questions"), list):
+                            on_question_objects(parsed_output["questions"])
+                    except Exception as e:
+                        print(f"{log_prefix} Error parsing {question_type} response for {source_info}: {e}. Response: {qna_json_string[:500]}")
+                    questions_recovered = call_stream_state['questions_added'] - questions_streamed
+                    if questions_streamed:
+                        print(f"{log_prefix} {question_type} response for {source_info} streamed {questions_streamed} question objects"
+                              f"{f'; {questions_recovered} more recovered from the full response' if questions_recovered else ''}.")
+                calls_done += 1
+                report_progress(progress_callback, "question_generation", calls_done=calls_done,
+                                questions_generated=sum(len(question_collector.questions) for question_collector in question_collectors.values()))
+        except BaseException:
+            # e.g. the job was cancelled from progress_callback: calls still waiting for a worker are not started
+            for future in future_to_call:
+                future.cancel()
+            raise
+    if raise_if_all_failed and call_exceptions and len(call_exceptions) == calls_total:
+        raise call_exceptions[0]
+
+def get_question_types_from_request():
+    """
+    Requested question types, in order and without repeats: 'question_type' (or 'question_types')
+    may be repeated and/or hold a comma-separated list, e.g. "MCQs,Short Answer".
+    """
+    question_types = []
+    for field_value in request.form.getlist('question_type') + request.form.getlist('question_types'):
+        for question_type in field_value.split(","):
+            question_type = question_type.strip()
+            if question_type and question_type not in question_types:
+                question_types.append(question_type)
+    return question_types
+
+def build_flashcard_response(questions_by_type):
+    """{"questions": [...]} for a single question type (as always), else {"questions_by_type": {type: [...]}}."""
+    if len(questions_by_type) == 1:
+        return {"questions": next(iter(questions_by_type.values()))}
+    return {"questions_by_type": questions_by_type}
+
+def save_uploaded_file_from_request():
+    """
+    Validates the multipart upload and saves it to a temp file (the request stream is gone once
+    the route returns, so jobs need it on disk), hashing the bytes as they are written.
+    Returns (temp_file_path, file_extension, question_types, original_filename, bypass_llm_cache, upload_sha256).
+    """
+    if not openai_client: raise FlashcardRequestError("OpenAI client not configured.", 503)
+    if 'file' not in request.files: raise FlashcardRequestError("No file part", 400)
+    uploaded_file = request.files['file']
+    question_types = get_question_types_from_request()
+    if not uploaded_file.filename: raise FlashcardRequestError("No selected file", 400)
+    if not question_types: raise FlashcardRequestError("Question type not specified", 400)
+    bypass_llm_cache = get_bypass_cache_from_request()
+    temp_file_path, file_extension, original_filename, upload_sha256 = save_uploaded_file(uploaded_file)
+    print(f"[APP_ROUTE] QTypes for '{original_filename}': {question_types}.")
+    return temp_file_path, file_extension, question_types, original_filename, bypass_llm_cache, upload_sha256
+
+def get_bypass_cache_from_request():
+    return request.form.get('bypass_cache', '').lower() in ("1", "true", "yes")
+
+def get_upload_file_extension(uploaded_file):
+    _, file_extension = os.path.splitext(secure_filename(uploaded_file.filename))
+    return file_extension.lower()
+
+def save_uploaded_file(uploaded_file):
+    """Saves one uploaded file to a temp file, hashing it as it is written. Returns (temp_file_path, file_extension, original_filename, upload_sha256)."""
+    original_filename = secure_filename(uploaded_file.filename)
+    file_extension = get_upload_file_extension(uploaded_file)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension, prefix="openai_upload_") as temp_f:
+        upload_sha256, upload_size_bytes = upload_cache.save_and_hash_upload(uploaded_file.stream, temp_f)
+        temp_file_path = temp_f.name
+    print(f"[APP_ROUTE] File '{original_filename}' ({upload_size_bytes} bytes, sha256 {upload_sha256[:12]}) saved to '{temp_file_path}'.")
+    return temp_file_path, file_extension, original_filename, upload_sha256
+
+def remove_temp_file(temp_file_path):
+    if temp_file_path and os.path.exists(temp_file_path):
+        try: os.remove(temp_file_path); print(f"[APP_ROUTE] Cleaned temp: {temp_file_path}")
+        except Exception as e_clean: print(f"Error cleaning temp file {temp_file_path}: {e_clean}")
+
+def submit_flashcard_job_from_request(event_queue=None):
+    """
+    Saves the upload and queues a job that generates its flashcards (and then deletes it).
+    With an event_queue, the job also puts ("progress", stage_name, details) events (throttled to
+    STREAM_PROGRESS_MIN_INTERVAL_SECONDS within a stage) and ("questions", new_questions, source_info,
+    question_type) events on it, then STREAM_END_OF_JOB when it ends.
+    """
+    temp_file_path, file_extension, question_types, original_filename, bypass_llm_cache, upload_sha256 = save_uploaded_file_from_request()
+
+    def run_flashcard_job(progress_callback):
+        questions_callback = None
+        if event_queue is not None:
+            last_progress_event = {'stage_name': None, 'sent_at': 0.0}
+            def streaming_progress_callback(stage_name, **details):
+                progress_callback(stage_name, **details) # The job itself records every update
+                now = time.time()
+                if stage_name == last_progress_event['stage_name'] and now - last_progress_event['sent_at'] < STREAM_PROGRESS_MIN_INTERVAL_SECONDS:
+                    return
+                last_progress_event.update(stage_name=stage_name, sent_at=now)
+                event_queue.put(("progress", stage_name, details))
+            def questions_callback(new_questions, source_info, question_type):
+                event_queue.put(("questions", new_questions, source_info, question_type))
+        try:
+            questions_by_type = generate_flashcards_from_file(temp_file_path, file_extension, question_types,
+                                                              streaming_progress_callback if event_queue is not None else progress_callback,
+                                                              questions_callback, bypass_llm_cache, upload_sha256)
+            return build_flashcard_response(questions_by_type)
+        finally:
+            remove_temp_file(temp_file_path)
+            if event_queue is not None:
+                event_queue.put(STREAM_END_OF_JOB)
+
+    try:
+        return flashcard_jobs.submit_job(run_flashcard_job, {'filename': original_filename, 'question_types': question_types},
+                                         error_handler=get_flashcard_error_response)
+    except Exception:
+        remove_temp_file(temp_file_path)
+        raise
+
+def submit_flashcard_batch_job_from_request():
+    """
+    Saves every upload in 'files' (repeated; 'file' also counts) and queues one job that runs
+    them all through the staged batch pipeline. The job's result has one entry per file, in
+    upload order: {"filename", "status": "succeeded", "questions"/"questions_by_type"} or
+    {"filename", "status": "failed", "error", "status_code"}, so some files can fail while the rest succeed.
+    """
+    if not openai_client: raise FlashcardRequestError("OpenAI client not configured.", 503)
+    uploaded_files = request.files.getlist('files') + request.files.getlist('file')
+    question_types = get_question_types_from_request()
+    if not uploaded_files: raise FlashcardRequestError("No files part", 400)
+    if len(uploaded_files) > batch_pipeline.BATCH_MAX_FILES: raise FlashcardRequestError(f"Too many files (at most {batch_pipeline.BATCH_MAX_FILES} per batch).", 400)
+    if not question_types: raise FlashcardRequestError("Question type not specified", 400)
+    bypass_llm_cache = get_bypass_cache_from_request()
+
+    # Files that cannot be processed fail right away; the rest are saved for the job
+    batch_files = []
+    try:
+        for uploaded_file in uploaded_files:
+            batch_file = {'index': len(batch_files), 'filename': secure_filename(uploaded_file.filename or ""), 'temp_file_path': None}
+            if not uploaded_file.filename:
+                batch_file.update(error="No selected file", status_code=400)
+            elif get_upload_file_extension(uploaded_file) not in [".pdf"] + SUPPORTED_IMAGE_EXTENSIONS:
+                batch_file.update(error=f"Unsupported file type: '{get_upload_file_extension(uploaded_file)}'.", status_code=415)
+            else:
+                batch_file['temp_file_path'], batch_file['file_extension'], _, batch_file['upload_sha256'] = save_uploaded_file(uploaded_file)
+            batch_files.append(batch_file)
+    except Exception:
+        for batch_file in batch_files: remove_temp_file(batch_file['temp_file_path'])
+        raise
+    runnable_files = [batch_file for batch_file in batch_files if batch_file['temp_file_path']]
+    print(f"[APP_BATCH] {len(runnable_files)} of {len(batch_files)} files accepted. QTypes: {question_types}.")
+
+    def run_flashcard_batch_job(progress_callback):
+        batch_progress_lock = threading.Lock()
+        file_stages = ["queued" if batch_file['temp_file_path'] else "failed" for batch_file in batch_files]
+
+        def set_file_stage(batch_file, file_stage):
+            with batch_progress_lock:
+                file_stages[batch_file['index']] = file_stage
+                progress_callback("batch", files_total=len(batch_files), files_succeeded=file_stages.count("succeeded"),
+                                  files_failed=file_stages.count("failed"), file_stages=list(file_stages))
+
+        def prepare_batch_file(batch_file):
+            set_file_stage(batch_file, "preparing")
+            return prepare_question_generation(batch_file['temp_file_path'], batch_file['file_extension'], question_types,
+                                               bypass_llm_cache=bypass_llm_cache, upload_sha256=batch_file['upload_sha256'])
+
+        def generate_batch_file(batch_file, question_generation_plan):
+            set_file_stage(batch_file, "generating")
+            return build_flashcard_response(run_question_generation(question_generation_plan, question_types))
+
+        def on_batch_file_finished(file_index, result, exception):
+            batch_file = runnable_files[file_index]
+            remove_temp_file(batch_file['temp_file_path'])
+            if exception is not None:
+                batch_file['error'], batch_file['status_code'] = get_flashcard_error_response(exception)
+                print(f"[APP_BATCH] '{batch_file['filename']}' failed: {batch_file['error']}")
+            else:
+                batch_file['result'] = result
+            set_file_stage(batch_file, "failed" if exception is not None else "succeeded")
+
+        batch_start_time = time.time()
+        try:
+            batch_pipeline.run_staged_batch(runnable_files, prepare_batch_file, generate_batch_file, on_batch_file_finished)
+        finally:
+            for batch_file in runnable_files: remove_temp_file(batch_file['temp_file_path'])
+
+        file_results = []
+        for batch_file in batch_files:
+            if 'result' in batch_file:
+                file_results.append({"filename": batch_file['filename'], "status": "succeeded", **batch_file['result']})
+            else:
+                file_results.append({"filename": batch_file['filename'], "status": "failed",
+                                     "error": batch_file['error'], "status_code": batch_file['status_code']})
+        files_succeeded_count = sum(1 for file_result in file_results if file_result["status"] == "succeeded")
+        print(f"[APP_BATCH] Batch of {len(batch_files)} files finished in {time.time() - batch_start_time:.2f}s ({files_succeeded_count} succeeded).")
+        return {"files": file_results, "files_succeeded": files_succeeded_count, "files_failed": len(file_results) - files_succeeded_count}
+
+    try:
+        # The batch job only coordinates (the files run on batch_pipeline's pools), so it gets its own job pool
+        return flashcard_jobs.submit_job(run_flashcard_batch_job, {'filenames': [batch_file['filename'] for batch_file in batch_files], 'question_types': question_types},
+                                         error_handler=get_flashcard_error_response, job_kind="batch")
+    except Exception:
+        for batch_file in runnable_files: remove_temp_file(batch_file['temp_file_path'])
+        raise
+
+def format_stream_event(event, use_sse):
+    """One event as an NDJSON line, or as a Server-Sent Events message named after event["event"]."""
+    event_json = json.dumps(event)
+    if use_sse:
+        return f"event: {event['event']}\ndata: {event_json}\n\n"
+    return event_json + "\n"
+
+def iter_flashcard_stream_events(job, event_queue):
+    """
+    Turns a streaming job's queue into client events: the job id first, then progress and
+    question batches as they happen (keepalives while nothing does), then done or error.
+    """
+    yield {"event": "job", "job_id": job.job_id, "status_url": f"/api/flashcard-jobs/{job.job_id}"}
+    questions_streamed_count = 0
+    while True:
+        try:
+            queued_event = event_queue.get(timeout=STREAM_KEEPALIVE_SECONDS)
+        except queue.Empty:
+            yield {"event": "keepalive"}
+            continue
+        if queued_event is STREAM_END_OF_JOB:
+            break
+        if queued_event[0] == "progress":
+            _, stage_name, details = queued_event
+            progress_event = {"event": "progress", "stage": stage_name}
+            progress_event.update(details)
+            yield progress_event
+        else:
+            _, new_questions, source_info, question_type = queued_event
+            questions_streamed_count += len(new_questions)
+            yield {"event": "questions", "question_type": question_type, "chunk": source_info, "questions": new_questions}
+    job.wait()
+    if job.error is not None:
+        yield {"event": "error", "error": job.error, "status_code": job.error_status_code}
+    else:
+        yield {"event": "done", "questions_total": questions_streamed_count}
+
+@app.route('/api/flashcard-jobs', methods=['POST'])
+def create_flashcard_job_route():
+    print(f"\n[APP_JOBS] Job request at {datetime.now().isoformat()} using OpenAI {OPENAI_MODEL_NAME}")
+    try:
+        job = submit_flashcard_job_from_request()
+    except FlashcardRequestError as e: return jsonify({"error": str(e)}), e.status_code
+    response = jsonify({"job_id": job.job_id, "status": job.status, "status_url": f"/api/flashcard-jobs/{job.job_id}"})
+    response.headers["Location"] = f"/api/flashcard-jobs/{job.job_id}"
+    return response, 202
+
+@app.route('/api/flashcard-jobs/<job_id>', methods=['GET'])
+def get_flashcard_job_route(job_id):
+    job = flashcard_jobs.get_job(job_id)
+    if job is None: return jsonify({"error": "Unknown or expired job id."}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/api/flashcard-batches', methods=['POST'])
+def create_flashcard_batch_route():
+    """Queues one job for many PDFs/images ('files', repeated); poll /api/flashcard-jobs/<job_id> for per-file results."""
+    print(f"\n[APP_BATCH] Batch request at {datetime.now().isoformat()} using OpenAI {OPENAI_MODEL_NAME}")
+    try:
+        job = submit_flashcard_batch_job_from_request()
+    except FlashcardRequestError as e: return jsonify({"error": str(e)}), e.status_code
+    response = jsonify({"job_id": job.job_id, "status": job.status, "status_url": f"/api/flashcard-jobs/{job.job_id}"})
+    response.headers["Location"] = f"/api/flashcard-jobs/{job.job_id}"
+    return response, 202
+
+@app.route('/api/generate-flashcards/stream', methods=['POST'])
+def stream_flashcards_route():
+    """
+    Streaming variant of /api/generate-flashcards: each chunk's new (de-duplicated, normalized)
+    questions are sent as soon as that chunk's OpenAI call returns, with progress events in between.
+    NDJSON by default; Server-Sent Events if the client accepts text/event-stream.
+    """
+    print(f"\n[APP_STREAM] Streaming request at {datetime.now().isoformat()} using OpenAI {OPENAI_MODEL_NAME}")
+    use_sse = request.accept_mimetypes.best_match(["application/x-ndjson", "text/event-stream"]) == "text/event-stream"
+    event_queue = queue.Queue()
+    try:
+        job = submit_flashcard_job_from_request(event_queue)
+    except FlashcardRequestError as e: return jsonify({"error": str(e)}), e.status_code
+
+    def generate_stream():
+        stream_start_time = time.time()
+        first_questions_logged = False
+        try:
+            for event in iter_flashcard_stream_events(job, event_queue):
+                if event["event"] == "questions" and not first_questions_logged:
+                    print(f"[APP_STREAM] First questions sent {time.time() - stream_start_time:.2f}s after the request.")
+                    first_questions_logged = True
+                yield format_stream_event(event, use_sse)
+            print(f"[APP_STREAM] Stream for job {job.job_id} finished in {time.time() - stream_start_time:.2f}s.")
+        finally:
+            # Also runs when the client disconnects (the server closes this generator): nobody is left to read the job
+            if not job.is_finished():
+                print(f"[APP_STREAM] Client left the stream for job {job.job_id} after {time.time() - stream_start_time:.2f}s. Cancelling it.")
+                job.cancel()
+            flashcard_jobs.discard_job(job.job_id)
+
+    response = Response(generate_stream(), mimetype="text/event-stream" if use_sse else "application/x-ndjson")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no" # Stop nginx-style proxies from buffering the stream
+    return response
+
+@app.route('/api/generate-flashcards', methods=['POST'])
+def generate_flashcards_route():
+    """Synchronous endpoint: generates in the request thread, so it never waits behind the background job pools."""
+    overall_start_time = time.time()
+    print(f"\n[APP_ROUTE] Request at {datetime.now().isoformat()} using OpenAI {OPENAI_MODEL_NAME}")
+    temp_file_path = None
+    try:
+        temp_file_path, file_extension, question_types, _, bypass_llm_cache, upload_sha256 = save_uploaded_file_from_request()
+        questions_by_type = generate_flashcards_from_file(temp_file_path, file_extension, question_types,
+                                                          bypass_llm_cache=bypass_llm_cache, upload_sha256=upload_sha256)
+        return jsonify(build_flashcard_response(questions_by_type)), 200
+    except Exception as e:
+        error_message, error_status_code = get_flashcard_error_response(e)
+        return jsonify({"error": error_message}), error_status_code
     finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            try: os.remove(temp_file_path); print(f"[APP_ROUTE] Cleaned temp: {temp_file_path}")
-            except Exception as e_clean: print(f"Error cleaning temp file {temp_file_path}: {e_clean}")
+        remove_temp_file(temp_file_path)
         overall_duration = time.time() - overall_start_time
         print(f"[APP_ROUTE] Total request time: {overall_duration:.2f} seconds.")
         print("-" * 70)
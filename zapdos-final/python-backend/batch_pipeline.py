@@ -0,0 +1,86 @@
+"""
+Staged pipeline for batches of uploads.
+
+Every file goes through a preparation stage (PDF extraction, filtering, summarization and
+chunking, or image preparation: CPU work whose heavy parts run on the extraction and
+summarizer process pools) and then a generation stage (its OpenAI calls, paced by the LLM
+scheduler). Each stage has its own bounded thread pool and a file moves on to generation as
+soon as it is prepared, so one file's CPU stages overlap other files' network waits. A file
+that fails only fails itself.
+"""
+import functools
+import threading
+import concurrent.futures
+
+BATCH_MAX_FILES = 50
+BATCH_PREPARATION_MAX_WORKERS = 2 # Files in their CPU stages at once
+BATCH_GENERATION_MAX_WORKERS = 4 # Files in their LLM stage at once; the LLM scheduler paces the calls themselves
+
+_preparation_pool = None
+_generation_pool = None
+_pools_lock = threading.Lock()
+
+
+def get_preparation_pool():
+    """Returns the module-wide thread pool for the preparation stage, creating it on first use."""
+    global _preparation_pool
+    with _pools_lock:
+        if _preparation_pool is None:
+            _preparation_pool = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_PREPARATION_MAX_WORKERS, thread_name_prefix="batch_prepare")
+            print(f"[BATCH_PIPELINE] Started preparation pool with {BATCH_PREPARATION_MAX_WORKERS} workers.")
+        return _preparation_pool
+
+
+def get_generation_pool():
+    """Returns the module-wide thread pool for the generation stage, creating it on first use."""
+    global _generation_pool
+    with _pools_lock:
+        if _generation_pool is None:
+            _generation_pool = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_GENERATION_MAX_WORKERS, thread_name_prefix="batch_generate")
+            print(f"[BATCH_PIPELINE] Started generation pool with {BATCH_GENERATION_MAX_WORKERS} workers.")
+        return _generation_pool
+
+
+def run_staged_batch(items, prepare_function, generate_function, on_item_finished=None):
+    """
+    Runs prepare_function(item) on the preparation pool and then generate_function(item, prepared)
+    on the generation pool for every item, and blocks until all are done. Returns one
+    (result, exception) pair per item, in item order, with exactly one of the two set.
+    on_item_finished(index, result, exception) is called as each item finishes.
+    """
+    item_futures = [concurrent.futures.Future() for _ in items]
+
+    def finish_item(item_index, result=None, exception=None):
+        # The callback runs first, so everything it records is in place once run_staged_batch returns
+        if on_item_finished:
+            try:
+                on_item_finished(item_index, result, exception)
+            except Exception as e_callback:
+                print(f"[BATCH_PIPELINE] on_item_finished failed for item {item_index}: {e_callback}")
+        item_futures[item_index].set_result((result, exception))
+
+    def on_prepared(item_index, preparation_future):
+        try:
+            prepared = preparation_future.result()
+            generation_future = get_generation_pool().submit(generate_function, items[item_index], prepared)
+        except Exception as e_prepare:
+            finish_item(item_index, exception=e_prepare)
+            return
+        generation_future.add_done_callback(functools.partial(on_generated, item_index))
+
+    def on_generated(item_index, generation_future):
+        try:
+            result = generation_future.result()
+        except Exception as e_generate:
+            finish_item(item_index, exception=e_generate)
+            return
+        finish_item(item_index, result=result)
+
+    for item_index, item in enumerate(items):
+        try:
+            preparation_future = get_preparation_pool().submit(prepare_function, item)
+        except Exception as e_submit:
+            finish_item(item_index, exception=e_submit)
+            continue
+        preparation_future.add_done_callback(functools.partial(on_prepared, item_index))
+    return [item_future.result() for item_future in item_futures]
@@ -0,0 +1,45 @@
+"""
+Micro-benchmark: per-page is_likely_boilerplate_page vs. the compiled batch classifier.
+
+Run from zapdos-final/python-backend:
+    python benchmarks/bench_boilerplate_filter.py [page counts...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import summarizer
+from synthetic_documents import make_synthetic_pages
+
+DEFAULT_PAGE_COUNTS = [1000]
+REPEATS = 5
+
+
+def best_time(function, *args):
+    best = float("inf")
+    result = None
+    for _ in range(REPEATS):
+        start_time = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start_time)
+    return best, result
+
+
+def classify_each_page(pages, total_pages):
+    return [summarizer.is_likely_boilerplate_page(page_text, page_num, total_pages) for page_text, page_num in pages]
+
+
+def main(page_counts):
+    print(f"{'pages':>6} {'per-page (ms)':>14} {'batch (ms)':>11} {'speedup':>8} {'filtered':>9} {'same':>5}")
+    for pages_count in page_counts:
+        pages = make_synthetic_pages(pages_count, seed=pages_count)
+        per_page_time, per_page_flags = best_time(classify_each_page, pages, pages_count)
+        batch_time, batch_flags = best_time(summarizer.classify_boilerplate_pages, pages, pages_count)
+        print(f"{pages_count:>6} {per_page_time * 1000:>14.1f} {batch_time * 1000:>11.1f} {per_page_time / max(batch_time, 1e-9):>7.1f}x {sum(batch_flags):>9} {str(per_page_flags == batch_flags):>5}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_PAGE_COUNTS)
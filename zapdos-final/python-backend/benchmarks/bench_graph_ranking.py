@@ -0,0 +1,41 @@
+"""
+Benchmark: sumy's LexRank/TextRank vs. the sparse graph_ranking backend.
+
+Run from zapdos-final/python-backend:
+    python benchmarks/bench_graph_ranking.py [sentence counts...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import summarizer
+from synthetic_documents import make_synthetic_text
+
+DEFAULT_SENTENCE_COUNTS = [100, 500, 1500]
+
+
+def time_summary(text, method_name, backend, target_count, parsed_document):
+    summarizer.GRAPH_RANKING_BACKEND = backend
+    start_time = time.perf_counter()
+    summary_sentences = summarizer.get_sumy_summary(text, method_name, target_count, parsed_document=parsed_document)
+    return time.perf_counter() - start_time, summary_sentences
+
+
+def main(sentence_counts):
+    print(f"{'sentences':>9} {'method':>9} {'sumy (s)':>10} {'sparse (s)':>11} {'speedup':>8} {'same':>5}")
+    for sentences_count in sentence_counts:
+        text = make_synthetic_text(sentences_count, seed=sentences_count)
+        parsed_document = summarizer.ParsedDocument(text)
+        target_count = max(summarizer.MIN_SENTENCES_FOR_SUMMARY,
+                           min(summarizer.MAX_SENTENCES_FOR_SUMMARY, int(sentences_count * summarizer.TARGET_SUMMARY_SENTENCE_COUNT_RATIO)))
+        for method_name in ("lexrank", "textrank"):
+            sumy_time, sumy_summary = time_summary(text, method_name, "sumy", target_count, parsed_document)
+            sparse_time, sparse_summary = time_summary(text, method_name, "sparse", target_count, parsed_document)
+            print(f"{sentences_count:>9} {method_name:>9} {sumy_time:>10.3f} {sparse_time:>11.3f} {sumy_time / max(sparse_time, 1e-9):>7.1f}x {str(sumy_summary == sparse_summary):>5}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SENTENCE_COUNTS)
@@ -0,0 +1,254 @@
+"""
+Benchmark suite for the PDF-to-flashcard pipeline, stage by stage, with a stubbed LLM.
+
+For each page count a synthetic textbook (front matter, TOC, content, references, index)
+is written as a real PDF and pushed through the same steps generate_flashcards_route uses:
+extraction, boilerplate filtering, sentence splitting, parsing, every summarizer, metrics,
+chunking and the (stubbed) OpenAI call, plus process_text_for_qna end to end. Each page
+count runs in its own process (with an address-space limit, so an oversized allocation
+fails that stage instead of getting the process OOM-killed) so peak RSS is per document
+size. Results are JSON so runs on different commits can be diffed.
+
+Run from zapdos-final/python-backend:
+    python benchmarks/bench_pipeline.py [--pages 10 100 1000] [--output results.json] [--memory-limit-mb 4096]
+"""
+import os
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_documents import make_synthetic_pages, make_zipf_vocabulary, write_synthetic_pdf
+
+DEFAULT_PAGE_COUNTS = [10, 100, 1000]
+VOCABULARY_SIZE = 4000
+STUB_QUESTIONS_PER_CALL = 20
+SUMMARIZER_METHODS = ['luhn', 'textrank', 'lexrank', 'lsa']
+DEFAULT_MEMORY_LIMIT_MB = 4096
+
+
+class StubChatCompletions:
+    """Stands in for openai_client.chat.completions: returns a fixed-size question set instantly."""
+    def create(self, model, messages, **kwargs):
+        questions = [{"id": f"stub_{i}", "question_type": "MCQs", "question": f"Stub question {i}?",
+                      "options": ["A", "B", "C", "D"], "answer": "A", "source_page": None}
+                     for i in range(STUB_QUESTIONS_PER_CALL)]
+        message = type("StubMessage", (), {"content": json.dumps({"questions": questions})})()
+        return type("StubResponse", (), {"choices": [type("StubChoice", (), {"message": message})()]})()
+
+
+class StageTimer:
+    """
+    Records seconds, throughput and the process's peak RSS after each stage, and rewrites
+    the partial results to progress_path as it goes so a crashed run still reports them.
+    """
+    def __init__(self, progress_path=None):
+        self.stages = {}
+        self.progress_path = progress_path
+
+    @contextlib.contextmanager
+    def stage(self, stage_name, pages_count=None, sentences_count=None, tolerate_errors=False):
+        """With tolerate_errors, an exception (e.g. MemoryError) is recorded on the stage and the run continues."""
+        self.write_progress(running_stage=stage_name)
+        start_time = time.perf_counter()
+        stage_error = None
+        try:
+            yield
+        except Exception as e_stage:
+            if not tolerate_errors:
+                raise
+            stage_error = f"{type(e_stage).__name__}: {e_stage}"
+        seconds = time.perf_counter() - start_time
+        stage_result = {'seconds': round(seconds, 6), 'peak_rss_mb': round(peak_rss_mb(), 1)}
+        if stage_error:
+            stage_result['error'] = stage_error
+        else:
+            if pages_count is not None:
+                stage_result['pages_per_second'] = round(pages_count / seconds, 1) if seconds > 0 else None
+            if sentences_count is not None:
+                stage_result['sentences_per_second'] = round(sentences_count / seconds, 1) if seconds > 0 else None
+        self.stages[stage_name] = stage_result
+        self.write_progress()
+
+    def write_progress(self, running_stage=None):
+        if self.progress_path:
+            with open(self.progress_path, "w") as progress_file:
+                json.dump({'running_stage': running_stage, 'stages': self.stages}, progress_file)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def run_single_benchmark(pages_count, seed=0, progress_path=None):
+    """Runs every stage on one synthetic document and returns its result dict."""
+    with contextlib.redirect_stdout(io.StringIO()): # The pipeline's own progress prints
+        import app
+        import summarizer
+        import pdf_extraction
+        from sentence_store import SentenceStore
+        from summary_metrics import SummaryMetricsEngine
+    app.openai_client = type("StubOpenAI", (), {"chat": type("StubChat", (), {"completions": StubChatCompletions()})()})()
+    summarizer.SUMMARY_CACHE_ENABLED = False
+    app.llm_cache.LLM_CACHE_ENABLED = False
+    summarizer.SUMMARIZER_EVALUATION_MODE = "sequential"
+    summarizer.SUMMARIZER_PIPELINE_DEADLINE_SECONDS = None
+
+    pages = make_synthetic_pages(pages_count, seed=seed, vocabulary=make_zipf_vocabulary(VOCABULARY_SIZE, seed=seed))
+    timer = StageTimer(progress_path)
+    extraction_stats = {}
+    baseline_rss_mb = peak_rss_mb()
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as temp_dir:
+        pdf_path = os.path.join(temp_dir, f"synthetic_{pages_count}.pdf")
+        write_synthetic_pdf(pages, pdf_path)
+        pdf_size_bytes = os.path.getsize(pdf_path)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            with timer.stage('extraction', pages_count=pages_count):
+                extracted_pages = list(pdf_extraction.iter_pdf_page_texts(pdf_path, extraction_stats=extraction_stats))
+
+            with timer.stage('boilerplate_filter', pages_count=pages_count):
+                boilerplate_flags = summarizer.classify_boilerplate_pages(extracted_pages, pages_count)
+            content_pages = [page for page, is_boilerplate in zip(extracted_pages, boilerplate_flags) if not is_boilerplate]
+
+            with timer.stage('sentence_split', pages_count=len(content_pages)):
+                sentence_store = SentenceStore()
+                for page_text, page_num in content_pages:
+                    sentence_store.add_page(page_text, page_num)
+            sentences_count = len(sentence_store)
+            target_count = summarizer.get_target_summary_sentence_count(sentences_count)
+
+            with timer.stage('parse', sentences_count=sentences_count):
+                parsed_document = summarizer.ParsedDocument(sentence_store=sentence_store)
+
+            summary_ids_by_method = {}
+            for method_name in SUMMARIZER_METHODS:
+                with timer.stage(f'summarizer_{method_name}', sentences_count=sentences_count, tolerate_errors=True):
+                    summary_ids_by_method[method_name] = summarizer.get_summary_sentence_ids(parsed_document, method_name, target_count)
+
+            with timer.stage('metrics_engine_build', sentences_count=sentences_count):
+                metrics_engine = SummaryMetricsEngine(sentence_store)
+            metrics_by_method = {}
+            with timer.stage('metrics_candidates', tolerate_errors=True):
+                for method_name, summary_ids in summary_ids_by_method.items():
+                    metrics_by_method[method_name] = metrics_engine.metrics_for(summary_ids)
+            with timer.stage('metrics_per_summary_reference', tolerate_errors=True):
+                full_text = sentence_store.text()
+                for summary_ids in summary_ids_by_method.values():
+                    summarizer.calculate_all_metrics(sentence_store.text(summary_ids), full_text, summary_sentence_count=len(summary_ids))
+
+            if metrics_by_method:
+                chunk_sentence_ids = summary_ids_by_method[max(metrics_by_method, key=lambda m: metrics_by_method[m]['f1_score_rougeL'])]
+            else:
+                chunk_sentence_ids = range(sentences_count)
+            with timer.stage('chunking', sentences_count=len(chunk_sentence_ids)):
+                chunks = app.create_token_budget_chunks(sentence_store, chunk_sentence_ids, len(content_pages))
+
+            with timer.stage('llm_stub'):
+                for chunk_index, chunk_data in enumerate(chunks):
+                    app.get_questions_from_text_openai(chunk_data["text"], "MCQs", chunk_data["pages"], len(content_pages),
+                                                       len(chunks) > 1, f"{chunk_index + 1}/{len(chunks)}")
+
+            with timer.stage('pipeline_end_to_end', pages_count=pages_count, sentences_count=sentences_count, tolerate_errors=True):
+                pipeline_result = [None, None, "failed"]
+                pipeline_result = summarizer.process_text_for_qna(iter(extracted_pages), pages_count)
+
+    return {
+        'pages': pages_count,
+        'pdf_bytes': pdf_size_bytes,
+        'extraction_workers': pdf_extraction.get_extraction_max_workers(),
+        'extraction_pages_by_backend': {name: count for name, count in extraction_stats.items() if name != 'pages_with_text'},
+        'content_pages': len(content_pages),
+        'sentences': sentences_count,
+        'summary_target_sentences': target_count,
+        'chunks': len(chunks),
+        'pipeline_method': pipeline_result[2],
+        # The staged run and process_text_for_qna on the same extracted pages must filter and split them identically
+        'pipeline_matches_stages': len(pipeline_result) > 4 and pipeline_result[4] == sentence_store.text(),
+        'baseline_rss_mb': round(baseline_rss_mb, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'stages': timer.stages,
+    }
+
+
+def get_commit_hash():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=DEFAULT_PAGE_COUNTS, help="Page counts to benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--memory-limit-mb", type=int, default=DEFAULT_MEMORY_LIMIT_MB, help="Address-space limit per page count (0: none)")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS) # Child process: one page count, JSON on stdout
+    parser.add_argument("--progress-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        if args.memory_limit_mb:
+            memory_limit_bytes = args.memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+        print(json.dumps(run_single_benchmark(args.pages[0], args.seed, args.progress_path)))
+        return
+
+    results = []
+    for pages_count in args.pages:
+        print(f"[BENCH_PIPELINE] {pages_count} pages...", file=sys.stderr)
+        with tempfile.NamedTemporaryFile(suffix=".json", prefix="bench_progress_", delete=False) as progress_file:
+            progress_path = progress_file.name
+        try:
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), "--single", "--pages", str(pages_count), "--seed", str(args.seed),
+                                    "--memory-limit-mb", str(args.memory_limit_mb), "--progress-path", progress_path],
+                                   capture_output=True, text=True)
+            if child.returncode != 0:
+                # Keep whatever stages finished before the crash
+                try:
+                    with open(progress_path) as progress_file:
+                        progress = json.load(progress_file)
+                except (OSError, ValueError):
+                    progress = {'running_stage': None, 'stages': {}}
+                print(f"[BENCH_PIPELINE] {pages_count} pages failed in stage {progress['running_stage']} (exit code {child.returncode}):\n{child.stderr[-2000:]}", file=sys.stderr)
+                results.append({'pages': pages_count, 'error': f"exit code {child.returncode} in stage {progress['running_stage']}", 'stages': progress['stages']})
+                continue
+        finally:
+            os.remove(progress_path)
+        results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+        stage_seconds = ", ".join(f"{name} {stage['seconds']:.2f}s" for name, stage in results[-1]['stages'].items())
+        print(f"[BENCH_PIPELINE] {pages_count} pages: {stage_seconds}; peak RSS {results[-1]['peak_rss_mb']} MB", file=sys.stderr)
+
+    report = {
+        'commit': get_commit_hash(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(report_json + "\n")
+        print(f"[BENCH_PIPELINE] Wrote {args.output}", file=sys.stderr)
+    else:
+        print(report_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Synthetic study material for the benchmarks: sentences, content pages and the usual
+front/back matter (table of contents, preface, index, references) found in textbooks,
+plus a minimal writer that lays the pages out as a text PDF pdfplumber can read back.
+"""
+import random
+
+VOCABULARY = ("cell membrane protein enzyme reaction glucose oxygen carbon water molecule structure function "
+              "process system nucleus mitochondria transport diffusion osmosis gradient energy light plant "
+              "chlorophyll photosynthesis respiration the a of and in to is was were are by with for on that").split()
+
+
+SYLLABLES = ("ba be bi bo bu ca ce ci co cu da de di do du fa fe fi fo fu ga ge gi go gu la le li lo lu "
+             "ma me mi mo mu na ne ni no nu pa pe pi po pu ra re ri ro ru sa se si so su ta te ti to tu").split()
+
+
+def make_zipf_vocabulary(words_count, seed=0):
+    """
+    A larger vocabulary for document-sized benchmarks: VOCABULARY (common and stop words)
+    followed by made-up words, with Zipf weights (1 / rank) for rng.choices.
+    """
+    rng = random.Random(seed)
+    words = list(VOCABULARY)
+    seen_words = set(words)
+    while len(words) < words_count:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen_words:
+            seen_words.add(word)
+            words.append(word)
+    weights = [1.0 / rank for rank in range(1, len(words) + 1)]
+    return words, weights
+
+
+def make_synthetic_sentence(rng, vocabulary=None):
+    if vocabulary is None:
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(6, 24))]
+    else:
+        words = rng.choices(vocabulary[0], weights=vocabulary[1], k=rng.randint(6, 24))
+    return " ".join(words).capitalize() + "."
+
+
+def make_synthetic_text(sentences_count, seed=0):
+    rng = random.Random(seed)
+    return " ".join(make_synthetic_sentence(rng) for _ in range(sentences_count))
+
+
+def make_content_page(rng, page_number, sentences_count=25, vocabulary=None):
+    lines = [f"Chapter {page_number // 20 + 1}: {rng.choice(VOCABULARY).capitalize()} and {rng.choice(VOCABULARY)}"]
+    sentences = [make_synthetic_sentence(rng, vocabulary) for _ in range(sentences_count)]
+    # Wrap into ~90 character lines like pdfplumber output
+    current_line = ""
+    for sentence in sentences:
+        for word in sentence.split():
+            if len(current_line) + len(word) + 1 > 90:
+                lines.append(current_line)
+                current_line = ""
+            current_line = f"{current_line} {word}".strip()
+    lines.append(current_line)
+    lines.append(str(page_number))
+    return "\n".join(lines)
+
+
+def make_toc_page(rng, first_chapter_page, chapters_count=25):
+    lines = ["Table of Contents"]
+    for chapter in range(chapters_count):
+        title = f"{chapter + 1}. {rng.choice(VOCABULARY).capitalize()} {rng.choice(VOCABULARY)}"
+        lines.append(f"{title} {'.' * rng.randint(5, 40)} {first_chapter_page + chapter * 20}")
+    return "\n".join(lines)
+
+
+def make_index_page(rng):
+    lines = ["Index"]
+    for term in sorted(rng.sample(VOCABULARY, 20)):
+        lines.append(f"{term}, {rng.randint(1, 900)}, {rng.randint(1, 900)}")
+    return "\n".join(lines)
+
+
+def make_references_page(rng):
+    lines = ["References"]
+    for i in range(15):
+        lines.append(f"[{i + 1}] A. Author, \"On {rng.choice(VOCABULARY)} {rng.choice(VOCABULARY)}\", Journal of Biology, {rng.randint(1950, 2024)}.")
+    return "\n".join(lines)
+
+
+def make_preface_page(rng):
+    return "Preface\n" + " ".join(make_synthetic_sentence(rng) for _ in range(8))
+
+
+def make_synthetic_pages(pages_count, seed=0, vocabulary=None):
+    """
+    Returns [(page_text, page_number), ...] shaped like the route's raw_text_by_page:
+    a preface and table of contents up front, index and references pages at the back,
+    content pages in between. vocabulary is a (words, weights) pair such as
+    make_zipf_vocabulary returns; content pages use VOCABULARY by default.
+    """
+    rng = random.Random(seed)
+    front_matter = [make_preface_page, lambda r: make_toc_page(r, 3)]
+    back_matter = [make_references_page, make_index_page]
+    pages = []
+    for page_number in range(1, pages_count + 1):
+        if page_number <= len(front_matter) and pages_count > 4:
+            page_text = front_matter[page_number - 1](rng)
+        elif page_number > pages_count - len(back_matter) and pages_count > 4:
+            page_text = back_matter[page_number - (pages_count - len(back_matter)) - 1](rng)
+        else:
+            page_text = make_content_page(rng, page_number, vocabulary=vocabulary)
+        pages.append((page_text, page_number))
+    return pages
+
+
+PDF_PAGE_WIDTH = 612
+PDF_PAGE_HEIGHT = 792
+PDF_FONT_SIZE = 9
+PDF_LINE_HEIGHT = 11
+
+
+def _pdf_string(text):
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def write_synthetic_pdf(pages, pdf_path):
+    """
+    Writes [(page_text, page_number), ...] as a minimal PDF: one page per entry, one text
+    line per line of page_text, in the built-in Helvetica font (so no fonts are embedded).
+    """
+    objects = [None, None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"] # 1: catalog, 2: pages, 3: font
+    page_object_ids = []
+    for page_text, _ in pages:
+        text_commands = [f"BT /F1 {PDF_FONT_SIZE} Tf {PDF_LINE_HEIGHT} TL 40 {PDF_PAGE_HEIGHT - 40} Td"]
+        for line in page_text.splitlines():
+            text_commands.append(f"{_pdf_string(line)} Tj T*")
+        text_commands.append("ET")
+        stream = "\n".join(text_commands).encode("latin-1", "replace")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1") + stream + b"\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PDF_PAGE_WIDTH} {PDF_PAGE_HEIGHT}] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_object_ids.append(len(objects))
+    objects[0] = "<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_object_ids)}] /Count {len(page_object_ids)} >>"
+
+    with open(pdf_path, "wb") as pdf_file:
+        pdf_file.write(b"%PDF-1.4\n")
+        offsets = []
+        for object_id, body in enumerate(objects, start=1):
+            offsets.append(pdf_file.tell())
+            if isinstance(body, str):
+                body = body.encode("latin-1")
+            pdf_file.write(f"{object_id} 0 obj\n".encode("latin-1") + body + b"\nendobj\n")
+        xref_offset = pdf_file.tell()
+        pdf_file.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+        for offset in offsets:
+            pdf_file.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+        pdf_file.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1"))
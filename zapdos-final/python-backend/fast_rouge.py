@@ -0,0 +1,118 @@
+"""
+ROUGE-1/2/L scoring against one fixed reference, reusing the reference's preprocessing.
+
+rouge_score's RougeScorer re-tokenizes and re-stems the reference on every call and
+fills a full Python LCS table, which is quadratic in the (whole-document) reference
+length. Here the reference is tokenized and stemmed once into a RougeReference that
+keeps its n-gram Counters and, for ROUGE-L, one bitmask per distinct token. The LCS
+length is then computed with the bit-parallel algorithm of Allison & Dix / Crochemore
+et al.: one big-integer update per hypothesis token instead of one table row per token.
+
+Tokenization is rouge_score's own (lowercase, non-alphanumerics to spaces, Porter-stem
+tokens longer than 3 characters), so scores are the same as rouge_score's
+RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True).
+"""
+import threading
+from collections import Counter
+
+from nltk.stem import porter
+from rouge_score import tokenize as rouge_tokenize
+
+ROUGE_NGRAM_SIZES = (1, 2)
+
+
+class CachedPorterStemmer:
+    """Porter stemmer with a memo of every word it has stemmed."""
+    def __init__(self):
+        self._stemmer = porter.PorterStemmer()
+        self._stems = {}
+
+    def stem(self, word):
+        stem = self._stems.get(word)
+        if stem is None:
+            stem = self._stemmer.stem(word)
+            self._stems[word] = stem
+        return stem
+
+
+_shared_stemmer = CachedPorterStemmer()
+_last_reference = None
+_last_reference_lock = threading.Lock()
+
+
+def tokenize(text):
+    return rouge_tokenize.tokenize(text, _shared_stemmer)
+
+
+def create_ngrams(tokens, n):
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def fmeasure(precision, recall):
+    return 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+
+
+def score_ngrams(reference_ngrams, hypothesis_ngrams):
+    """ROUGE-N f-measure, same counting as rouge_score._score_ngrams."""
+    overlap_count = sum(min(count, hypothesis_ngrams[ngram]) for ngram, count in reference_ngrams.items() if ngram in hypothesis_ngrams)
+    precision = overlap_count / max(sum(hypothesis_ngrams.values()), 1)
+    recall = overlap_count / max(sum(reference_ngrams.values()), 1)
+    return fmeasure(precision, recall)
+
+
+class RougeReference:
+    """A tokenized, stemmed reference text ready to score many hypotheses against."""
+    def __init__(self, reference_text, tokens=None):
+        # tokens: the reference's tokens when the caller already has them (e.g. per-sentence tokens joined)
+        self.reference_text = reference_text
+        self.tokens = tokens if tokens is not None else tokenize(reference_text)
+        self.ngrams = {n: create_ngrams(self.tokens, n) for n in ROUGE_NGRAM_SIZES}
+
+        # Bit i of match_masks[token] is set when reference token i equals token.
+        self.match_masks = {}
+        for position, token in enumerate(self.tokens):
+            self.match_masks[token] = self.match_masks.get(token, 0) | (1 << position)
+        self.all_bits = (1 << len(self.tokens)) - 1
+
+    def lcs_length(self, hypothesis_tokens):
+        """Length of the longest common subsequence of the reference and hypothesis_tokens."""
+        masks = self.match_masks
+        all_bits = self.all_bits
+        v_bits = all_bits
+        for token in hypothesis_tokens:
+            matches = masks.get(token)
+            if matches is None:
+                continue
+            u_bits = v_bits & matches
+            v_bits = ((v_bits + u_bits) | (v_bits - u_bits)) & all_bits
+        return len(self.tokens) - bin(v_bits).count("1")
+
+    def score_tokens(self, hypothesis_tokens):
+        scores = {}
+        for n in ROUGE_NGRAM_SIZES:
+            scores[f'rouge{n}'] = score_ngrams(self.ngrams[n], create_ngrams(hypothesis_tokens, n))
+        if not self.tokens or not hypothesis_tokens:
+            scores['rougeL'] = 0.0
+        else:
+            lcs = self.lcs_length(hypothesis_tokens)
+            scores['rougeL'] = fmeasure(lcs / len(hypothesis_tokens), lcs / len(self.tokens))
+        return scores
+
+    def score(self, hypothesis_text):
+        """Returns {'rouge1', 'rouge2', 'rougeL'} f-measures of hypothesis_text against this reference."""
+        return self.score_tokens(tokenize(hypothesis_text))
+
+
+def get_reference(reference_text):
+    """
+    Returns a RougeReference for reference_text, reusing the previous one when the same
+    reference is scored again (every candidate summary of a request shares it).
+    """
+    global _last_reference
+    with _last_reference_lock:
+        if _last_reference is not None and _last_reference.reference_text == reference_text:
+            return _last_reference
+    reference = RougeReference(reference_text)
+    with _last_reference_lock:
+        _last_reference = reference
+    return reference
@@ -0,0 +1,230 @@
+"""
+Background jobs for flashcard generation.
+
+A job wraps one run of the generation pipeline on a module-wide thread pool, so the HTTP
+request that starts it can return a job id right away. Each kind of job has its own pool: a
+batch job blocks its worker for the whole batch while the files run on batch_pipeline's
+pools, so batches must not take the workers single-upload jobs need. Jobs live in this process's memory
+(FLASHCARD_JOB_TTL_SECONDS after they finish, then a background sweep drops them) and record per-stage
+progress reported by the pipeline through the job's report_progress callback. Cancelling a job
+(e.g. when a streaming client goes away) stops it at the pipeline's next progress report.
+"""
+import time
+import uuid
+import threading
+import concurrent.futures
+from datetime import datetime
+
+FLASHCARD_JOB_MAX_WORKERS = 2 # For kinds without their own entry below
+FLASHCARD_JOB_MAX_WORKERS_BY_KIND = {'upload': 8, 'batch': 2} # Upload jobs mostly wait on the LLM scheduler; batches only coordinate
+FLASHCARD_JOB_TTL_SECONDS = 60 * 60 # Finished jobs (and their questions) are kept this long
+FLASHCARD_JOB_CLEANUP_INTERVAL_SECONDS = 60 # Also how often the background sweep runs, so an idle server drops old jobs too
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_last_cleanup_time = 0.0
+_cleanup_thread = None
+_job_pools = {} # job kind -> its ThreadPoolExecutor
+_job_pools_lock = threading.Lock()
+_job_stats = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0, 'expired': 0}
+
+
+class JobCancelledError(Exception):
+    """Raised from a cancelled job's report_progress, so the pipeline stops at its next progress report."""
+    pass
+
+
+class FlashcardJob:
+    def __init__(self, description=None):
+        self.job_id = uuid.uuid4().hex
+        self.description = description or {}
+        self.status = JOB_STATUS_QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = [] # [{'name', 'status', 'started_at', 'seconds', ...details}] in pipeline order
+        self.result = None
+        self.error = None
+        self.error_status_code = None
+        self._lock = threading.Lock()
+        self._finished_event = threading.Event()
+        self._cancel_requested = threading.Event()
+
+    def report_progress(self, stage_name, **details):
+        """
+        Pipeline progress callback: starting a new stage finishes the running one; calling it
+        again for the running stage just updates its details (e.g. chunks_done).
+        Raises JobCancelledError once the job has been cancelled.
+        """
+        if self._cancel_requested.is_set():
+            raise JobCancelledError(f"Job {self.job_id} was cancelled.")
+        with self._lock:
+            now = time.time()
+            current_stage = self.stages[-1] if self.stages else None
+            if current_stage is None or current_stage['name'] != stage_name:
+                if current_stage is not None and current_stage['status'] == JOB_STATUS_RUNNING:
+                    current_stage['status'] = "done"
+                    current_stage['seconds'] = round(now - current_stage['started_at'], 3)
+                current_stage = {'name': stage_name, 'status': JOB_STATUS_RUNNING, 'started_at': now, 'seconds': None}
+                self.stages.append(current_stage)
+            current_stage.update(details)
+
+    def _start(self):
+        with self._lock:
+            self.status = JOB_STATUS_RUNNING
+            self.started_at = time.time()
+
+    def _finish(self, result=None, error=None, error_status_code=None, finished_status=None):
+        with self._lock:
+            self.finished_at = time.time()
+            self.status = finished_status or (JOB_STATUS_SUCCEEDED if error is None else JOB_STATUS_FAILED)
+            if self.stages and self.stages[-1]['status'] == JOB_STATUS_RUNNING:
+                self.stages[-1]['status'] = "done" if self.status == JOB_STATUS_SUCCEEDED else self.status
+                self.stages[-1]['seconds'] = round(self.finished_at - self.stages[-1]['started_at'], 3)
+            self.result = result
+            self.error = error
+            self.error_status_code = error_status_code
+        self._finished_event.set()
+
+    def cancel(self):
+        """Asks the job to stop: it ends as cancelled at its next progress report (its first, if it is still queued)."""
+        self._cancel_requested.set()
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished (or timeout seconds pass). Returns whether it finished."""
+        return self._finished_event.wait(timeout)
+
+    def is_finished(self):
+        return self._finished_event.is_set()
+
+    def to_dict(self, include_result=True):
+        with self._lock:
+            job_dict = {
+                'job_id': self.job_id,
+                'status': self.status,
+                'created_at': datetime.fromtimestamp(self.created_at).isoformat(),
+                'started_at': datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+                'finished_at': datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None,
+                'current_stage': self.stages[-1]['name'] if self.stages and self.status == JOB_STATUS_RUNNING else None,
+                'stages': [{key: value for key, value in stage.items() if key != 'started_at'} for stage in self.stages],
+            }
+            job_dict.update(self.description)
+            if self.status in (JOB_STATUS_FAILED, JOB_STATUS_CANCELLED):
+                job_dict['error'] = self.error
+            if include_result and self.status == JOB_STATUS_SUCCEEDED:
+                job_dict['result'] = self.result
+            return job_dict
+
+
+def get_job_pool(job_kind="upload"):
+    """Returns the module-wide thread pool jobs of this kind run on, creating it on first use."""
+    with _job_pools_lock:
+        job_pool = _job_pools.get(job_kind)
+        if job_pool is None:
+            max_workers = FLASHCARD_JOB_MAX_WORKERS_BY_KIND.get(job_kind, FLASHCARD_JOB_MAX_WORKERS)
+            job_pool = _job_pools[job_kind] = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"flashcard_job_{job_kind}")
+            print(f"[FLASHCARD_JOBS] Started {job_kind} job pool with {max_workers} workers.")
+        return job_pool
+
+
+def _sweep_expired_jobs():
+    while True:
+        time.sleep(FLASHCARD_JOB_CLEANUP_INTERVAL_SECONDS)
+        try:
+            cleanup_expired_jobs(force=True)
+        except Exception as e_cleanup:
+            print(f"[FLASHCARD_JOBS] Expired job sweep failed: {e_cleanup}")
+
+
+def start_cleanup_thread():
+    """Starts the daemon thread that drops expired jobs every cleanup interval (once per process)."""
+    global _cleanup_thread
+    with _job_pools_lock:
+        if _cleanup_thread is None:
+            _cleanup_thread = threading.Thread(target=_sweep_expired_jobs, name="flashcard_job_cleanup", daemon=True)
+            _cleanup_thread.start()
+
+
+def _run_job(job, job_function, error_handler):
+    job._start()
+    try:
+        result = job_function(job.report_progress)
+    except JobCancelledError as e_cancelled:
+        print(f"[FLASHCARD_JOBS] Job {job.job_id} cancelled after {time.time() - job.started_at:.2f}s.")
+        with _jobs_lock:
+            _job_stats['cancelled'] += 1
+        job._finish(error=str(e_cancelled), finished_status=JOB_STATUS_CANCELLED)
+        return
+    except Exception as e_job:
+        error_message, error_status_code = error_handler(e_job) if error_handler else (str(e_job), 500)
+        print(f"[FLASHCARD_JOBS] Job {job.job_id} failed after {time.time() - job.started_at:.2f}s: {error_message}")
+        with _jobs_lock:
+            _job_stats['failed'] += 1
+        job._finish(error=error_message, error_status_code=error_status_code)
+        return
+    with _jobs_lock:
+        _job_stats['succeeded'] += 1
+    job._finish(result=result)
+    print(f"[FLASHCARD_JOBS] Job {job.job_id} succeeded in {job.finished_at - job.started_at:.2f}s.")
+
+
+def submit_job(job_function, description=None, error_handler=None, job_kind="upload"):
+    """
+    Queues job_function(report_progress) on the pool for job_kind and returns its FlashcardJob.
+    Its return value becomes job.result; if it raises, error_handler(exception) gives the
+    job's (error message, HTTP status code).
+    """
+    start_cleanup_thread()
+    cleanup_expired_jobs()
+    job = FlashcardJob(description)
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+        _job_stats['submitted'] += 1
+    get_job_pool(job_kind).submit(_run_job, job, job_function, error_handler)
+    print(f"[FLASHCARD_JOBS] Queued {job_kind} job {job.job_id}.")
+    return job
+
+
+def get_job(job_id):
+    """The job with this id, or None if it never existed or has expired."""
+    cleanup_expired_jobs()
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def discard_job(job_id):
+    """Drops a job right away (e.g. once a synchronous caller has its result)."""
+    with _jobs_lock:
+        _jobs.pop(job_id, None)
+
+
+def cleanup_expired_jobs(force=False):
+    """Drops jobs that finished more than FLASHCARD_JOB_TTL_SECONDS ago (at most once per cleanup interval)."""
+    global _last_cleanup_time
+    now = time.time()
+    with _jobs_lock:
+        if not force and now - _last_cleanup_time < FLASHCARD_JOB_CLEANUP_INTERVAL_SECONDS:
+            return 0
+        _last_cleanup_time = now
+        expired_job_ids = [job_id for job_id, job in _jobs.items()
+                           if job.finished_at is not None and now - job.finished_at > FLASHCARD_JOB_TTL_SECONDS]
+        for job_id in expired_job_ids:
+            del _jobs[job_id]
+        _job_stats['expired'] += len(expired_job_ids)
+    if expired_job_ids:
+        print(f"[FLASHCARD_JOBS] Dropped {len(expired_job_ids)} expired jobs.")
+    return len(expired_job_ids)
+
+
+def get_job_stats():
+    with _jobs_lock:
+        job_stats = dict(_job_stats)
+        job_stats['active'] = sum(1 for job in _jobs.values() if not job.is_finished())
+        job_stats['stored'] = len(_jobs)
+        return job_stats
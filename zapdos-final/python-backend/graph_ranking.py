@@ -0,0 +1,154 @@
+"""
+Vectorized LexRank / TextRank sentence ranking on sparse matrices.
+
+Sumy builds both sentence graphs with pure-Python pairwise loops, which is O(n^2)
+interpreted work. Here the sentence-by-term matrix is built once as a scipy.sparse
+matrix, all pairwise similarities come from sparse matrix products (computed in row
+blocks so only the kept edges are ever held in memory) and the power iteration runs
+in NumPy. The maths follow sumy's LexRankSummarizer and TextRankSummarizer, so the
+scores match sumy's up to floating point summation order.
+"""
+import numpy
+
+try:
+    import scipy.sparse as scipy_sparse
+except ImportError:
+    scipy_sparse = None
+
+LEXRANK_THRESHOLD = 0.1
+LEXRANK_EPSILON = 0.1
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_EPSILON = 1e-4
+TEXTRANK_ZERO_DIVISION_PREVENTION = 1e-7
+SIMILARITY_BLOCK_ROWS = 1024 # Rows of the similarity matrix computed per sparse product
+
+
+def is_available():
+    return scipy_sparse is not None
+
+
+def build_term_matrix(sentence_term_counts):
+    """
+    Builds a sparse |sentences| x |terms| count matrix from one Counter (term -> count) per sentence.
+    Returns (csr_matrix, vocabulary dict term -> column).
+    """
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    data = []
+    for term_counts in sentence_term_counts:
+        for term, count in term_counts.items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            data.append(count)
+        indptr.append(len(indices))
+    matrix = scipy_sparse.csr_matrix(
+        (numpy.asarray(data, dtype=numpy.float64), numpy.asarray(indices, dtype=numpy.int64), numpy.asarray(indptr, dtype=numpy.int64)),
+        shape=(len(sentence_term_counts), len(vocabulary)))
+    return matrix, vocabulary
+
+
+def _blockwise_products(left_matrix, right_matrix_t, transform_block):
+    """
+    Computes left_matrix @ right_matrix_t one row block at a time, lets transform_block
+    prune/reweight each block (it receives the block as COO plus its first row index)
+    and stacks what is left into one CSR matrix.
+    """
+    rows_count = left_matrix.shape[0]
+    kept_blocks = []
+    for block_start in range(0, rows_count, SIMILARITY_BLOCK_ROWS):
+        block = (left_matrix[block_start:block_start + SIMILARITY_BLOCK_ROWS] @ right_matrix_t).tocoo()
+        kept_blocks.append(transform_block(block, block_start))
+    if not kept_blocks:
+        return scipy_sparse.csr_matrix((rows_count, rows_count))
+    return scipy_sparse.vstack(kept_blocks, format="csr")
+
+
+def lexrank_adjacency(sentence_term_counts, threshold=LEXRANK_THRESHOLD):
+    """
+    Thresholded idf-modified-cosine adjacency matrix (1.0 where similarity > threshold),
+    exactly the graph sumy's LexRankSummarizer._create_matrix builds before normalization.
+    """
+    counts_matrix, _ = build_term_matrix(sentence_term_counts)
+    sentences_count = counts_matrix.shape[0]
+
+    # tf = count / max count in the sentence; idf = log(N / (1 + sentence frequency))
+    max_tf = counts_matrix.max(axis=1).toarray().ravel()
+    max_tf[max_tf == 0] = 1
+    tf_matrix = scipy_sparse.diags(1.0 / max_tf) @ counts_matrix
+    sentence_frequencies = numpy.bincount(counts_matrix.indices, minlength=counts_matrix.shape[1])
+    idf = numpy.log(sentences_count / (1.0 + sentence_frequencies))
+    tfidf_matrix = (tf_matrix @ scipy_sparse.diags(idf)).tocsr()
+
+    norms = numpy.sqrt(numpy.asarray(tfidf_matrix.multiply(tfidf_matrix).sum(axis=1)).ravel())
+    inverse_norms = numpy.zeros_like(norms)
+    inverse_norms[norms > 0] = 1.0 / norms[norms > 0]
+    normalized_matrix = (scipy_sparse.diags(inverse_norms) @ tfidf_matrix).tocsr()
+
+    def keep_similar(block, block_start):
+        keep = block.data > threshold
+        return scipy_sparse.csr_matrix(
+            (numpy.ones(int(keep.sum())), (block.row[keep], block.col[keep])),
+            shape=block.shape)
+
+    return _blockwise_products(normalized_matrix, normalized_matrix.T.tocsc(), keep_similar)
+
+
+def lexrank_scores(sentence_term_counts, threshold=LEXRANK_THRESHOLD, epsilon=LEXRANK_EPSILON):
+    """LexRank centrality per sentence, same definition and stopping rule as sumy."""
+    sentences_count = len(sentence_term_counts)
+    if sentences_count == 0:
+        return numpy.zeros(0)
+    adjacency = lexrank_adjacency(sentence_term_counts, threshold)
+    degrees = numpy.asarray(adjacency.sum(axis=1)).ravel()
+    degrees[degrees == 0] = 1
+    adjacency_t = adjacency.T.tocsr()
+
+    p_vector = numpy.full(sentences_count, 1.0 / sentences_count)
+    lambda_val = 1.0
+    while lambda_val > epsilon:
+        # (adjacency / degrees[:, None]).T @ p without materializing the normalized matrix
+        next_p = adjacency_t @ (p_vector / degrees)
+        next_p /= numpy.linalg.norm(next_p)
+        lambda_val = numpy.linalg.norm(next_p - p_vector)
+        p_vector = next_p
+    return p_vector
+
+
+def textrank_weights(sentence_term_counts):
+    """
+    Edge weights of sumy's TextRank graph: words shared between two sentences (with
+    multiplicity) divided by the sum of the logs of their lengths.
+    """
+    counts_matrix, _ = build_term_matrix(sentence_term_counts)
+    sentence_lengths = numpy.asarray(counts_matrix.sum(axis=1)).ravel()
+    log_lengths = numpy.zeros_like(sentence_lengths)
+    log_lengths[sentence_lengths > 0] = numpy.log(sentence_lengths[sentence_lengths > 0])
+
+    def rate_edges(block, block_start):
+        norms = log_lengths[block.row + block_start] + log_lengths[block.col]
+        # Two one-word sentences have a log-norm of 0; sumy uses the raw overlap there.
+        single_word_pairs = numpy.isclose(norms, 0.)
+        weights = numpy.where(single_word_pairs, block.data, block.data / numpy.where(single_word_pairs, 1.0, norms))
+        return scipy_sparse.csr_matrix((weights, (block.row, block.col)), shape=block.shape)
+
+    return _blockwise_products(counts_matrix, counts_matrix.T.tocsc(), rate_edges)
+
+
+def textrank_scores(sentence_term_counts, damping=TEXTRANK_DAMPING, epsilon=TEXTRANK_EPSILON):
+    """TextRank (PageRank with damping) score per sentence, same definition and stopping rule as sumy."""
+    sentences_count = len(sentence_term_counts)
+    if sentences_count == 0:
+        return numpy.zeros(0)
+    weights = textrank_weights(sentence_term_counts)
+    row_sums = numpy.asarray(weights.sum(axis=1)).ravel() + TEXTRANK_ZERO_DIVISION_PREVENTION
+    weights_t = weights.T.tocsr()
+    teleport = (1. - damping) / sentences_count
+
+    p_vector = numpy.full(sentences_count, 1.0 / sentences_count)
+    lambda_val = 1.0
+    while lambda_val > epsilon:
+        # M = teleport + damping * weights / row_sums, so M.T @ p splits into a dense and a sparse term
+        next_p = teleport * p_vector.sum() + damping * (weights_t @ (p_vector / row_sums))
+        lambda_val = numpy.linalg.norm(next_p - p_vector)
+        p_vector = next_p
+    return p_vector
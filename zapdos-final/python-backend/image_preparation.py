@@ -0,0 +1,138 @@
+"""
+Prepares uploaded images for the OpenAI vision call.
+
+With detail "high" the model only ever sees the image scaled to fit 2048 x 2048 and then to a
+shortest side of 768, so sending a 12-megapixel photo (or an uncompressed BMP) just makes a
+huge request body. Images are decoded (JPEGs at a reduced draft scale, which is much faster),
+rotated per their EXIF orientation, scaled down to that size, and re-encoded as JPEG; HEIC
+(with pillow-heif installed), BMP, GIF, TIFF and images with transparency are converted on the
+way. The original is kept when it is already an API format, needs no change and is smaller.
+Prepared images are kept in a bounded in-memory LRU cache keyed on the content hash.
+"""
+import io
+import time
+import hashlib
+import threading
+import collections
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+try:
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+except ImportError:
+    pillow_heif = None
+
+IMAGE_MAX_LONG_SIDE = 2048 # OpenAI "high" detail fits the image within 2048 x 2048...
+IMAGE_MAX_SHORT_SIDE = 768 # ...then scales its shortest side to 768
+IMAGE_JPEG_QUALITY = 85 # Text in photographed handouts stays crisp; much smaller than the default 95
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+API_NATIVE_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+EXIF_ORIENTATION_TAG = 0x0112
+
+PreparedImage = collections.namedtuple("PreparedImage", ["image_bytes", "mime_type"])
+
+_prepared_image_cache = collections.OrderedDict() # cache_key -> PreparedImage, least recently used first
+_prepared_image_cache_bytes = 0
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def is_heif_available():
+    return pillow_heif is not None
+
+
+def get_target_size(width, height, max_long_side=None, max_short_side=None):
+    """The largest size within both limits that keeps the aspect ratio (never upscales)."""
+    max_long_side = max_long_side or IMAGE_MAX_LONG_SIDE
+    max_short_side = max_short_side or IMAGE_MAX_SHORT_SIDE
+    scale = min(1.0, max_long_side / max(width, height), max_short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _flatten_to_rgb(image):
+    # JPEG has no alpha: transparent areas become white, like the page they would sit on
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba_image = image.convert("RGBA")
+        flattened_image = Image.new("RGB", rgba_image.size, "white")
+        flattened_image.paste(rgba_image, mask=rgba_image.getchannel("A"))
+        return flattened_image
+    if image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    return image
+
+
+def prepare_image_bytes(original_bytes, log_name="image"):
+    """
+    Returns the PreparedImage to send for an image file's bytes. Raises UnidentifiedImageError if PIL
+    cannot read it, and Image.DecompressionBombError if it has over twice Image.MAX_IMAGE_PIXELS pixels.
+    """
+    prepare_start_time = time.time()
+    with Image.open(io.BytesIO(original_bytes)) as opened_image:
+        original_format = opened_image.format
+        original_dimensions = opened_image.size
+        orientation = opened_image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+        if original_format == "JPEG":
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when that still covers the target size
+            opened_image.draft("RGB", get_target_size(*original_dimensions))
+        image = ImageOps.exif_transpose(opened_image) # A loaded copy (first frame for animations), upright
+    target_dimensions = get_target_size(*image.size)
+    if image.size != target_dimensions:
+        image = image.resize(target_dimensions, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    output_buffer = io.BytesIO()
+    _flatten_to_rgb(image).save(output_buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    prepared_image = PreparedImage(output_buffer.getvalue(), "image/jpeg")
+    if (original_format in API_NATIVE_FORMATS and orientation == 1 and target_dimensions == original_dimensions
+            and len(original_bytes) <= len(prepared_image.image_bytes)):
+        prepared_image = PreparedImage(original_bytes, API_NATIVE_FORMATS[original_format])
+        print(f"[IMAGE_PREP] {log_name}: {original_dimensions[0]}x{original_dimensions[1]} {original_format} "
+              f"{len(original_bytes) / 1024:.0f} KB already fits; sending it unchanged.")
+        return prepared_image
+    print(f"[IMAGE_PREP] {log_name}: {original_dimensions[0]}x{original_dimensions[1]} {original_format} {len(original_bytes) / 1024:.0f} KB "
+          f"-> {target_dimensions[0]}x{target_dimensions[1]} JPEG {len(prepared_image.image_bytes) / 1024:.0f} KB "
+          f"in {time.time() - prepare_start_time:.2f}s (EXIF orientation {orientation}).")
+    return prepared_image
+
+
+def _store_prepared_image(cache_key, prepared_image):
+    global _prepared_image_cache_bytes
+    with _cache_lock:
+        if cache_key in _prepared_image_cache:
+            return
+        _prepared_image_cache[cache_key] = prepared_image
+        _prepared_image_cache_bytes += len(prepared_image.image_bytes)
+        while _prepared_image_cache_bytes > IMAGE_CACHE_MAX_BYTES and len(_prepared_image_cache) > 1:
+            _, evicted_image = _prepared_image_cache.popitem(last=False)
+            _prepared_image_cache_bytes -= len(evicted_image.image_bytes)
+            _cache_stats['evictions'] += 1
+
+
+def prepare_image_file(image_path, content_sha256=None):
+    """
+    PreparedImage for an image file, from the cache when the same bytes (content_sha256, hashed
+    here if not given) were prepared with the same settings before. Raises UnidentifiedImageError
+    if PIL cannot read the file.
+    """
+    with open(image_path, "rb") as image_file:
+        original_bytes = image_file.read()
+    content_sha256 = content_sha256 or hashlib.sha256(original_bytes).hexdigest()
+    cache_key = (content_sha256, IMAGE_MAX_LONG_SIDE, IMAGE_MAX_SHORT_SIDE, IMAGE_JPEG_QUALITY)
+    with _cache_lock:
+        prepared_image = _prepared_image_cache.get(cache_key)
+        if prepared_image is not None:
+            _prepared_image_cache.move_to_end(cache_key)
+            _cache_stats['hits'] += 1
+            print(f"[IMAGE_PREP] Prepared image for {content_sha256[:12]} served from cache ({len(prepared_image.image_bytes) / 1024:.0f} KB).")
+            return prepared_image
+        _cache_stats['misses'] += 1
+    prepared_image = prepare_image_bytes(original_bytes, content_sha256[:12])
+    _store_prepared_image(cache_key, prepared_image)
+    return prepared_image
+
+
+def get_cache_stats():
+    with _cache_lock:
+        cache_stats = dict(_cache_stats)
+        cache_stats.update({'entries': len(_prepared_image_cache), 'bytes': _prepared_image_cache_bytes})
+        return cache_stats
@@ -0,0 +1,175 @@
+"""
+Persistent cache of OpenAI responses, keyed on the exact request.
+
+The key hashes the fully rendered messages (images included, as their data URLs), the model,
+the temperature and other request options, and the caller's prompt version, so a repeated
+upload of the same handout with the same question type is answered from a local SQLite file
+instead of upstream. Entries expire after LLM_CACHE_TTL_SECONDS; beyond LLM_CACHE_MAX_BYTES
+the least recently used are evicted. Identical requests already in flight in this process
+are coalesced: the first caller makes the upstream call and the others wait for its result.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import contextlib
+import concurrent.futures
+
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = os.path.join(tempfile.gettempdir(), "zapdos_llm_cache.sqlite3")
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'writes': 0, 'expired': 0, 'evictions': 0, 'errors': 0}
+_inflight_requests = {} # cache_key -> Future of the upstream call being made for it
+_inflight_lock = threading.Lock()
+
+
+def make_cache_key(model_name, messages, prompt_version, temperature=None, **request_options):
+    key_data = {'model': model_name, 'messages': messages, 'prompt_version': prompt_version,
+                'temperature': temperature, 'options': request_options}
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _connect(cache_path):
+    connection = sqlite3.connect(cache_path, timeout=10)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS llm_cache ("
+        " cache_key TEXT PRIMARY KEY, value TEXT NOT NULL, size_bytes INTEGER NOT NULL,"
+        " created_at REAL NOT NULL, last_access REAL NOT NULL)")
+    return connection
+
+
+@contextlib.contextmanager
+def _open_cache(cache_path):
+    # One short-lived connection per call (commits on success), so the cache is usable from any thread
+    connection = _connect(cache_path)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def get_cached_response(cache_key, cache_path=None, ttl_seconds=None):
+    """Returns the cached response text for cache_key (and marks it recently used), or None if absent or expired."""
+    cache_path = cache_path or LLM_CACHE_PATH
+    ttl_seconds = ttl_seconds or LLM_CACHE_TTL_SECONDS
+    now = time.time()
+    with _cache_lock:
+        try:
+            with _open_cache(cache_path) as connection:
+                row = connection.execute("SELECT value, created_at FROM llm_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+                if row is not None and now - row[1] > ttl_seconds:
+                    connection.execute("DELETE FROM llm_cache WHERE cache_key = ?", (cache_key,))
+                    _cache_stats['expired'] += 1
+                    row = None
+                elif row is not None:
+                    connection.execute("UPDATE llm_cache SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+        except (sqlite3.Error, OSError) as e_cache:
+            _cache_stats['errors'] += 1
+            print(f"[LLM_CACHE] Lookup failed: {e_cache}")
+            return None
+        if row is None:
+            _cache_stats['misses'] += 1
+            return None
+        _cache_stats['hits'] += 1
+    return row[0]
+
+
+def store_response(cache_key, response_text, cache_path=None, max_bytes=None, ttl_seconds=None):
+    """Stores response_text under cache_key, then drops expired entries and evicts least recently used ones beyond max_bytes."""
+    cache_path = cache_path or LLM_CACHE_PATH
+    max_bytes = max_bytes or LLM_CACHE_MAX_BYTES
+    ttl_seconds = ttl_seconds or LLM_CACHE_TTL_SECONDS
+    now = time.time()
+    size_bytes = len(response_text.encode("utf-8"))
+    with _cache_lock:
+        try:
+            with _open_cache(cache_path) as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO llm_cache (cache_key, value, size_bytes, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (cache_key, response_text, size_bytes, now, now))
+                _cache_stats['writes'] += 1
+                _cache_stats['expired'] += connection.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - ttl_seconds,)).rowcount
+                total_bytes = connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM llm_cache").fetchone()[0]
+                if total_bytes > max_bytes:
+                    evicted_count = 0
+                    for evict_key, evict_size_bytes in connection.execute(
+                            "SELECT cache_key, size_bytes FROM llm_cache ORDER BY last_access ASC").fetchall():
+                        if total_bytes <= max_bytes:
+                            break
+                        connection.execute("DELETE FROM llm_cache WHERE cache_key = ?", (evict_key,))
+                        total_bytes -= evict_size_bytes
+                        evicted_count += 1
+                    _cache_stats['evictions'] += evicted_count
+                    print(f"[LLM_CACHE] Evicted {evicted_count} least recently used entries ({total_bytes} bytes kept).")
+        except (sqlite3.Error, OSError) as e_cache:
+            _cache_stats['errors'] += 1
+            print(f"[LLM_CACHE] Write failed: {e_cache}")
+
+
+def get_or_fetch_response(cache_key, fetch_function, bypass_cache=False, is_cacheable=None, log_prefix="[LLM_CACHE]"):
+    """
+    The cached response text for cache_key, else fetch_function()'s (stored if is_cacheable
+    accepts it). Concurrent callers with the same key share one fetch. bypass_cache skips the
+    lookup and coalescing but still stores the fresh response.
+    """
+    if not LLM_CACHE_ENABLED:
+        return fetch_function()
+    if bypass_cache:
+        print(f"{log_prefix} Cache bypassed for this request.")
+    else:
+        cached_response_text = get_cached_response(cache_key)
+        if cached_response_text is not None:
+            print(f"{log_prefix} Served from the LLM response cache ({len(cached_response_text)} chars).")
+            return cached_response_text
+        with _inflight_lock:
+            inflight_future = _inflight_requests.get(cache_key)
+            if inflight_future is None:
+                inflight_future = _inflight_requests[cache_key] = concurrent.futures.Future()
+                is_leader = True
+            else:
+                is_leader = False
+        if not is_leader:
+            with _cache_lock:
+                _cache_stats['coalesced'] += 1
+            print(f"{log_prefix} Identical request already in flight; waiting for its response.")
+            return inflight_future.result()
+
+    try:
+        response_text = fetch_function()
+    except Exception as e_fetch:
+        if not bypass_cache:
+            _finish_inflight_request(cache_key, inflight_future, exception=e_fetch)
+        raise
+    if response_text and (is_cacheable is None or is_cacheable(response_text)):
+        store_response(cache_key, response_text)
+    if not bypass_cache:
+        _finish_inflight_request(cache_key, inflight_future, result=response_text)
+    return response_text
+
+
+def _finish_inflight_request(cache_key, inflight_future, result=None, exception=None):
+    with _inflight_lock:
+        _inflight_requests.pop(cache_key, None)
+    if exception is not None:
+        inflight_future.set_exception(exception)
+    else:
+        inflight_future.set_result(result)
+
+
+def get_cache_stats():
+    with _cache_lock:
+        return dict(_cache_stats)
+
+
+def clear_cache(cache_path=None):
+    cache_path = cache_path or LLM_CACHE_PATH
+    with _cache_lock:
+        with _open_cache(cache_path) as connection:
+            connection.execute("DELETE FROM llm_cache")
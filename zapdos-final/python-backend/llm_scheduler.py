@@ -0,0 +1,228 @@
+"""
+Process-wide scheduler for OpenAI calls.
+
+Every call waits for a slot: requests-per-minute and tokens-per-minute token buckets sized
+to the account's limits, plus a concurrency limit that adapts AIMD-style (it grows by one
+slot per window of fast, successful calls, and halves on a 429 or shrinks when calls get
+slow). Rate-limited and transient failures (connection errors, timeouts, 5xx) are retried
+with jittered exponential backoff that never undercuts the server's Retry-After.
+
+The bucket sizes come from the account's usage tier (OPENAI_USAGE_TIER, gpt-4o's published
+limits per tier) unless OPENAI_REQUESTS_PER_MINUTE / OPENAI_TOKENS_PER_MINUTE set them directly.
+"""
+import os
+import time
+import random
+import threading
+
+import openai
+
+import token_budget
+
+LLM_USAGE_TIER_LIMITS = { # tier -> (requests per minute, tokens per minute) for gpt-4o
+    1: (500, 30000),
+    2: (5000, 450000),
+    3: (5000, 800000),
+    4: (10000, 2000000),
+    5: (10000, 30000000),
+}
+LLM_USAGE_TIER = int(os.environ.get("OPENAI_USAGE_TIER", "2"))
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("OPENAI_REQUESTS_PER_MINUTE") or LLM_USAGE_TIER_LIMITS[LLM_USAGE_TIER][0])
+LLM_TOKENS_PER_MINUTE = int(os.environ.get("OPENAI_TOKENS_PER_MINUTE") or LLM_USAGE_TIER_LIMITS[LLM_USAGE_TIER][1])
+LLM_MIN_CONCURRENCY = 1
+LLM_MAX_CONCURRENCY = 8
+LLM_INITIAL_CONCURRENCY = 2
+LLM_LATENCY_TARGET_SECONDS = 120 # Calls slower than this count as congestion
+LLM_RATE_LIMIT_DECREASE_FACTOR = 0.5
+LLM_LATENCY_DECREASE_FACTOR = 0.75
+LLM_DECREASE_COOLDOWN_SECONDS = 10 # At most one decrease per this long, so one burst of 429s halves the limit once
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_BASE_SECONDS = 1.0
+LLM_BACKOFF_MAX_SECONDS = 60.0
+
+RETRYABLE_EXCEPTIONS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) # APITimeoutError is an APIConnectionError
+
+_llm_scheduler = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def estimate_tokens(prompt_text, model_name, expected_output_tokens=0):
+    """
+    Tokens to reserve for a call: the prompt's model tokens plus the output it is expected to
+    produce (the typical size, not the ceiling; the reservation is corrected from the real usage).
+    """
+    return token_budget.count_tokens(prompt_text, model_name) + expected_output_tokens
+
+
+def get_retry_after_seconds(exception):
+    """The Retry-After (or retry-after-ms) the server sent with a failed response, or None."""
+    response = getattr(exception, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class TokenBucket:
+    """Refills continuously at capacity per minute. Callers hold the scheduler's lock."""
+    def __init__(self, capacity_per_minute):
+        self.capacity = float(capacity_per_minute)
+        self.refill_per_second = self.capacity / 60
+        self.tokens = self.capacity
+        self.last_refill_time = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill_time) * self.refill_per_second)
+        self.last_refill_time = now
+
+    def seconds_until_available(self, amount):
+        # A request bigger than the whole bucket waits for a full bucket rather than forever
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.refill_per_second)
+
+    def consume(self, amount):
+        # May go negative (e.g. when real usage exceeded the estimate), which delays later calls
+        self._refill()
+        self.tokens -= amount
+
+
+class LLMCallScheduler:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, initial_concurrency=None):
+        self.request_bucket = TokenBucket(requests_per_minute or LLM_REQUESTS_PER_MINUTE)
+        self.token_bucket = TokenBucket(tokens_per_minute or LLM_TOKENS_PER_MINUTE)
+        self.concurrency_limit = float(initial_concurrency or LLM_INITIAL_CONCURRENCY)
+        self.in_flight_count = 0
+        self.queue_depth = 0
+        self.blocked_until = 0.0 # time.monotonic() before which no call starts (set from Retry-After)
+        self._last_decrease_time = 0.0
+        self._condition = threading.Condition()
+        self._stats = {'calls': 0, 'succeeded': 0, 'failed': 0, 'rate_limited': 0, 'retries': 0,
+                       'total_queue_wait_seconds': 0.0, 'max_queue_depth': 0}
+
+    def _acquire(self, estimated_tokens):
+        """
+        Blocks until a concurrency slot and both buckets allow one more call. Returns (seconds waited,
+        queue depth, concurrency limit), the last two as they were when the call was let through.
+        """
+        wait_start_time = time.monotonic()
+        with self._condition:
+            self.queue_depth += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self.queue_depth)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self.in_flight_count >= int(self.concurrency_limit):
+                        wait_seconds = None # Until a running call finishes
+                    elif now < self.blocked_until:
+                        wait_seconds = self.blocked_until - now
+                    else:
+                        wait_seconds = max(self.request_bucket.seconds_until_available(1),
+                                           self.token_bucket.seconds_until_available(estimated_tokens))
+                        if wait_seconds <= 0:
+                            self.request_bucket.consume(1)
+                            self.token_bucket.consume(estimated_tokens)
+                            self.in_flight_count += 1
+                            break
+                    self._condition.wait(wait_seconds)
+            finally:
+                self.queue_depth -= 1
+            queue_wait_seconds = time.monotonic() - wait_start_time
+            self._stats['total_queue_wait_seconds'] += queue_wait_seconds
+            return queue_wait_seconds, self.queue_depth, int(self.concurrency_limit)
+
+    def _release(self, latency_seconds=None, rate_limited=False, retry_after_seconds=None, counted_stats=()):
+        """Frees the call's slot, adapts the concurrency limit and adds one to each of counted_stats, all under the lock."""
+        with self._condition:
+            self.in_flight_count -= 1
+            for stat_name in counted_stats:
+                self._stats[stat_name] += 1
+            now = time.monotonic()
+            if rate_limited:
+                if retry_after_seconds:
+                    self.blocked_until = max(self.blocked_until, now + retry_after_seconds)
+                self._decrease_concurrency(LLM_RATE_LIMIT_DECREASE_FACTOR, now, "rate limited")
+            elif latency_seconds is not None:
+                if latency_seconds > LLM_LATENCY_TARGET_SECONDS:
+                    self._decrease_concurrency(LLM_LATENCY_DECREASE_FACTOR, now, f"slow call ({latency_seconds:.1f}s)")
+                else:
+                    # Additive increase: about one more slot per concurrency_limit fast successes
+                    self.concurrency_limit = min(LLM_MAX_CONCURRENCY, self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self._condition.notify_all()
+
+    def _decrease_concurrency(self, factor, now, reason):
+        if now - self._last_decrease_time < LLM_DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease_time = now
+        old_limit = int(self.concurrency_limit)
+        self.concurrency_limit = max(LLM_MIN_CONCURRENCY, self.concurrency_limit * factor)
+        print(f"[LLM_SCHEDULER] {reason.capitalize()}: concurrency limit {old_limit} -> {int(self.concurrency_limit)}.")
+
+    def _record_actual_usage(self, response, estimated_tokens):
+        usage = getattr(response, 'usage', None)
+        total_tokens = getattr(usage, 'total_tokens', None)
+        if isinstance(total_tokens, int):
+            with self._condition:
+                self.token_bucket.consume(total_tokens - estimated_tokens)
+
+    def run(self, request_function, estimated_tokens, log_prefix="[LLM_SCHEDULER]"):
+        """
+        Calls request_function() (one OpenAI request) once the scheduler allows it, retrying
+        rate-limit and transient errors up to LLM_MAX_RETRIES times. Returns its response or
+        raises its last exception.
+        """
+        with self._condition:
+            self._stats['calls'] += 1
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            queue_wait_seconds, queue_depth, concurrency_limit = self._acquire(estimated_tokens)
+            if queue_wait_seconds > 1:
+                print(f"{log_prefix} Waited {queue_wait_seconds:.1f}s for an LLM slot (queue depth {queue_depth}, concurrency limit {concurrency_limit}).")
+            call_start_time = time.monotonic()
+            try:
+                response = request_function()
+            except RETRYABLE_EXCEPTIONS as e_call:
+                is_rate_limited = isinstance(e_call, openai.RateLimitError)
+                retry_after_seconds = get_retry_after_seconds(e_call)
+                is_final_attempt = attempt == LLM_MAX_RETRIES or getattr(e_call, 'code', None) == "insufficient_quota"
+                counted_stats = (('rate_limited',) if is_rate_limited else ()) + (('failed',) if is_final_attempt else ('retries',))
+                self._release(rate_limited=is_rate_limited, retry_after_seconds=retry_after_seconds, counted_stats=counted_stats)
+                if is_final_attempt:
+                    raise
+                # Full jitter, but never sooner than the server asked for
+                backoff_seconds = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+                if retry_after_seconds:
+                    backoff_seconds = max(backoff_seconds, retry_after_seconds + random.uniform(0, LLM_BACKOFF_BASE_SECONDS))
+                print(f"{log_prefix} {type(e_call).__name__} on attempt {attempt + 1}; retrying in {backoff_seconds:.1f}s.")
+                time.sleep(backoff_seconds)
+                continue
+            except Exception:
+                self._release(counted_stats=('failed',))
+                raise
+            self._release(latency_seconds=time.monotonic() - call_start_time, counted_stats=('succeeded',))
+            self._record_actual_usage(response, estimated_tokens)
+            return response
+
+    def get_stats(self):
+        with self._condition:
+            scheduler_stats = dict(self._stats)
+            scheduler_stats.update({'queue_depth': self.queue_depth, 'in_flight': self.in_flight_count,
+                                    'concurrency_limit': int(self.concurrency_limit)})
+            return scheduler_stats
+
+
+def get_llm_scheduler():
+    """Returns the process-wide LLMCallScheduler, creating it on first use."""
+    global _llm_scheduler
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            _llm_scheduler = LLMCallScheduler()
+            print(f"[LLM_SCHEDULER] Started: {LLM_REQUESTS_PER_MINUTE} RPM, {LLM_TOKENS_PER_MINUTE} TPM, concurrency {LLM_INITIAL_CONCURRENCY}-{LLM_MAX_CONCURRENCY}.")
+        return _llm_scheduler
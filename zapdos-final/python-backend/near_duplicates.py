@@ -0,0 +1,114 @@
+"""
+Near-duplicate detection with MinHash signatures and LSH banding.
+
+Each text is normalized (lowercased, punctuation dropped, whitespace collapsed) and cut into
+character shingles. Its MinHash signature estimates Jaccard similarity between shingle sets;
+the signature is split into bands, and only texts that share a whole band with an earlier
+text become candidates. The bands and rows are chosen so pairs at about the threshold
+usually collide, and every candidate is confirmed with the exact Jaccard similarity of the
+shingle sets, so an n-item stream costs roughly O(n) instead of comparing all pairs.
+"""
+import re
+
+import numpy
+
+NEAR_DUPLICATE_THRESHOLD = 0.7 # Jaccard similarity of shingle sets at or above which two texts are near-duplicates
+MINHASH_NUM_PERMUTATIONS = 128
+SHINGLE_SIZE = 5 # Characters
+MINHASH_RANDOM_SEED = 1
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH_VALUE = (1 << 32) - 1
+
+_non_word_pattern = re.compile(r"[^\w\s]+")
+
+
+def normalize_text(text):
+    return " ".join(_non_word_pattern.sub(" ", text.lower()).split())
+
+
+def get_shingles(text, shingle_size=SHINGLE_SIZE):
+    normalized_text = normalize_text(text)
+    if len(normalized_text) <= shingle_size:
+        return {normalized_text}
+    return {normalized_text[start:start + shingle_size] for start in range(len(normalized_text) - shingle_size + 1)}
+
+
+def jaccard_similarity(first_shingles, second_shingles):
+    if not first_shingles and not second_shingles:
+        return 1.0
+    return len(first_shingles & second_shingles) / len(first_shingles | second_shingles)
+
+
+def choose_lsh_bands(threshold, num_permutations):
+    """
+    (bands, rows) with bands * rows <= num_permutations whose S-curve midpoint
+    (1 / bands) ** (1 / rows) is the closest at or below threshold, so pairs near the
+    threshold are rarely missed (extra candidates are weeded out by the exact check).
+    """
+    best_bands_and_rows = (num_permutations, 1)
+    best_midpoint = 0.0
+    for rows in range(1, num_permutations + 1):
+        bands = num_permutations // rows
+        midpoint = (1.0 / bands) ** (1.0 / rows)
+        if best_midpoint < midpoint <= threshold:
+            best_bands_and_rows, best_midpoint = (bands, rows), midpoint
+    return best_bands_and_rows
+
+
+class NearDuplicateIndex:
+    """
+    Incremental index: add(text) returns the cluster id of an earlier near-duplicate of text,
+    or a new cluster id if it has none. A text joins the cluster of the first near-duplicate
+    found and existing clusters are never merged, so a cluster id, once returned, stays valid:
+    A~B and B~C put C in A's cluster if they arrive in that order, but if A and C (not
+    near-duplicates) come first, B joins one of their clusters and the two stay apart.
+    """
+    def __init__(self, threshold=None, num_permutations=None, shingle_size=None):
+        self.threshold = threshold if threshold is not None else NEAR_DUPLICATE_THRESHOLD
+        self.num_permutations = num_permutations or MINHASH_NUM_PERMUTATIONS
+        self.shingle_size = shingle_size or SHINGLE_SIZE
+        self.bands, self.rows = choose_lsh_bands(self.threshold, self.num_permutations)
+        random_state = numpy.random.RandomState(MINHASH_RANDOM_SEED)
+        self._permutation_a = random_state.randint(1, MERSENNE_PRIME, size=self.num_permutations, dtype=numpy.uint64)
+        self._permutation_b = random_state.randint(0, MERSENNE_PRIME, size=self.num_permutations, dtype=numpy.uint64)
+        self._band_buckets = [{} for _ in range(self.bands)] # band key -> ids of the items that have it
+        self._item_shingles = []
+        self._item_cluster_ids = []
+        self.clusters_count = 0
+        self.candidate_checks_count = 0
+
+    def get_signature(self, shingles):
+        # hash() is salted per process, which is fine for an index that only lives in memory
+        shingle_hashes = numpy.array([hash(shingle) & MAX_HASH_VALUE for shingle in shingles], dtype=numpy.uint64)
+        # Universal hashing (a * x + b) mod p per permutation; uint64 products wrap, which only reshuffles the hash
+        permuted_hashes = (shingle_hashes[:, None] * self._permutation_a[None, :] + self._permutation_b[None, :]) % MERSENNE_PRIME
+        return (permuted_hashes & MAX_HASH_VALUE).min(axis=0)
+
+    def add(self, text):
+        shingles = get_shingles(text, self.shingle_size)
+        signature = self.get_signature(shingles)
+        band_keys = [signature[band_index * self.rows:(band_index + 1) * self.rows].tobytes() for band_index in range(self.bands)]
+
+        cluster_id = None
+        checked_item_ids = set()
+        for band_buckets, band_key in zip(self._band_buckets, band_keys):
+            for candidate_item_id in band_buckets.get(band_key, ()):
+                if candidate_item_id in checked_item_ids:
+                    continue
+                checked_item_ids.add(candidate_item_id)
+                self.candidate_checks_count += 1
+                if jaccard_similarity(shingles, self._item_shingles[candidate_item_id]) >= self.threshold:
+                    cluster_id = self._item_cluster_ids[candidate_item_id]
+                    break
+            if cluster_id is not None:
+                break
+        if cluster_id is None:
+            cluster_id = self.clusters_count
+            self.clusters_count += 1
+
+        item_id = len(self._item_shingles)
+        self._item_shingles.append(shingles)
+        self._item_cluster_ids.append(cluster_id)
+        for band_buckets, band_key in zip(self._band_buckets, band_keys):
+            band_buckets.setdefault(band_key, []).append(item_id)
+        return cluster_id
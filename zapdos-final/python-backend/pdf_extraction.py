@@ -0,0 +1,252 @@
+"""
+PDF text extraction, in parallel across page ranges.
+
+pdfplumber's layout analysis (page.extract_text()) is the slowest CPU stage for long PDFs.
+Documents of at least PDF_PARALLEL_MIN_PAGES pages are split into page ranges that are
+extracted on a module-wide process pool, each worker opening the file itself; the ranges are
+yielded back in page order as they finish, so the summarizer pipeline still consumes pages
+while later ranges are being extracted. Output is the same as the serial path's. Workers are
+spawned, not forked, because the pool is created lazily inside a multithreaded server and a
+forked child could inherit a lock (e.g. _pdfium_lock) held by another thread; a range that does
+not come back within PDF_RANGE_TIMEOUT_SECONDS is extracted in the calling process instead.
+
+When pypdfium2 is installed, pages without images are read with PDFium's much faster text
+layer instead, and pdfplumber is used only when that output looks degraded (no text, stray
+replacement characters, mostly non-letters, or words run together).
+"""
+import os
+import threading
+import multiprocessing
+import concurrent.futures
+
+import pdfplumber
+
+try:
+    import pypdfium2
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pypdfium2 = None
+    pdfium_c = None
+
+PDF_EXTRACTION_MAX_WORKERS = None # None: min(4, CPU count); 1 disables the process pool
+PDF_PARALLEL_MIN_PAGES = 24 # Shorter documents are extracted serially in the calling thread
+PDF_PAGES_PER_RANGE = 16 # Small enough that the first range comes back quickly and the pool stays balanced
+PDF_EXTRACTION_POOL_START_METHOD = "spawn" # Not fork: the pool is started from a multithreaded server
+PDF_RANGE_TIMEOUT_SECONDS = 120 # Waiting longer than this for a range recycles the pool and extracts the rest here
+PDF_FAST_BACKEND_ENABLED = True # Use pypdfium2 (when installed) for pages without images
+DEGRADED_MIN_LETTER_RATIO = 0.5 # Of non-space characters
+DEGRADED_MAX_REPLACEMENT_CHAR_RATIO = 0.01
+DEGRADED_MAX_AVERAGE_WORD_LENGTH = 20 # Longer "words" mean the spaces between them were lost
+
+_extraction_process_pool = None
+_extraction_process_pool_lock = threading.Lock()
+_pdfium_lock = threading.Lock() # PDFium is not thread-safe; worker processes each have their own
+
+
+def is_fast_backend_available():
+    return pypdfium2 is not None
+
+
+def use_fast_backend():
+    return PDF_FAST_BACKEND_ENABLED and pypdfium2 is not None
+
+
+def get_page_count(pdf_path):
+    if pypdfium2 is not None:
+        with _pdfium_lock:
+            pdfium_document = pypdfium2.PdfDocument(pdf_path)
+            try:
+                return len(pdfium_document)
+            finally:
+                pdfium_document.close()
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def looks_degraded(page_text):
+    """Whether fast-backend text is suspicious enough that pdfplumber should extract the page instead."""
+    non_space_chars = [c for c in page_text if not c.isspace()]
+    if not non_space_chars:
+        return True
+    if page_text.count("�") > DEGRADED_MAX_REPLACEMENT_CHAR_RATIO * len(non_space_chars):
+        return True
+    if sum(1 for c in non_space_chars if c.isalpha()) < DEGRADED_MIN_LETTER_RATIO * len(non_space_chars):
+        return True
+    words = page_text.split()
+    return len(non_space_chars) / len(words) > DEGRADED_MAX_AVERAGE_WORD_LENGTH
+
+
+def _extract_text_fast(pdfium_document, page_index):
+    """PDFium text of a page without images, or None if the page has images or the text looks degraded."""
+    pdfium_page = pdfium_document[page_index]
+    try:
+        if any(True for _ in pdfium_page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE], max_depth=2)):
+            return None
+        text_page = pdfium_page.get_textpage()
+        try:
+            page_text = text_page.get_text_range()
+        finally:
+            text_page.close()
+    finally:
+        pdfium_page.close()
+    page_text = page_text.replace("\r\n", "\n").replace("\r", "\n")
+    return None if looks_degraded(page_text) else page_text
+
+
+def iter_page_range_texts(pdf_path, first_page_num, last_page_num, fast_backend=False, backend_counts=None):
+    """
+    Yields (stripped_page_text, page_number) for pages first_page_num..last_page_num (1-based,
+    inclusive) that have text. Each pdfplumber page is closed right after extraction so its
+    parsed layout objects are dropped instead of cached for the whole range.
+    """
+    page_nums = list(range(first_page_num, last_page_num + 1))
+    pdfium_document = pypdfium2.PdfDocument(pdf_path) if fast_backend else None
+    pdf = None
+    try:
+        for page_num in page_nums:
+            page_text_content = None
+            if pdfium_document is not None:
+                with _pdfium_lock:
+                    page_text_content = _extract_text_fast(pdfium_document, page_num - 1)
+                if page_text_content is not None and backend_counts is not None:
+                    backend_counts['pypdfium2'] = backend_counts.get('pypdfium2', 0) + 1
+            if page_text_content is None:
+                if pdf is None:
+                    pdf = pdfplumber.open(pdf_path, pages=page_nums[page_nums.index(page_num):])
+                    pdfplumber_pages = iter(pdf.pages)
+                page_obj = next(page for page in pdfplumber_pages if page.page_number == page_num)
+                try:
+                    page_text_content = page_obj.extract_text()
+                finally:
+                    page_obj.close()
+                if backend_counts is not None:
+                    backend_counts['pdfplumber'] = backend_counts.get('pdfplumber', 0) + 1
+            if page_text_content and page_text_content.strip():
+                yield (page_text_content.strip(), page_num)
+    finally:
+        if pdf is not None:
+            pdf.close()
+        if pdfium_document is not None:
+            with _pdfium_lock:
+                pdfium_document.close()
+
+
+def _extract_page_range_in_worker(pdf_path, first_page_num, last_page_num, fast_backend):
+    backend_counts = {}
+    page_texts = list(iter_page_range_texts(pdf_path, first_page_num, last_page_num, fast_backend, backend_counts))
+    return page_texts, backend_counts
+
+
+def get_page_ranges(total_pages, pages_per_range=None):
+    pages_per_range = pages_per_range or PDF_PAGES_PER_RANGE
+    return [(first_page_num, min(total_pages, first_page_num + pages_per_range - 1))
+            for first_page_num in range(1, total_pages + 1, pages_per_range)]
+
+
+def get_extraction_max_workers():
+    return PDF_EXTRACTION_MAX_WORKERS or min(4, os.cpu_count() or 1)
+
+
+def get_extraction_process_pool():
+    """Returns the module-wide process pool used for parallel extraction, creating it on first use."""
+    global _extraction_process_pool
+    with _extraction_process_pool_lock:
+        if _extraction_process_pool is None:
+            max_workers = get_extraction_max_workers()
+            _extraction_process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context(PDF_EXTRACTION_POOL_START_METHOD))
+            print(f"[PDF_EXTRACTION] Started extraction process pool with {max_workers} workers ({PDF_EXTRACTION_POOL_START_METHOD} start method).")
+        return _extraction_process_pool
+
+
+def shutdown_extraction_process_pool():
+    global _extraction_process_pool
+    with _extraction_process_pool_lock:
+        if _extraction_process_pool is not None:
+            _extraction_process_pool.shutdown(wait=False, cancel_futures=True)
+            _extraction_process_pool = None
+
+
+def recycle_extraction_process_pool(stuck_pool):
+    """Replaces stuck_pool (the next caller gets a fresh pool) and terminates its workers, which may be hung on a page."""
+    global _extraction_process_pool
+    with _extraction_process_pool_lock:
+        if _extraction_process_pool is stuck_pool:
+            _extraction_process_pool = None
+    worker_processes = list((getattr(stuck_pool, "_processes", None) or {}).values())
+    stuck_pool.shutdown(wait=False, cancel_futures=True)
+    for worker_process in worker_processes:
+        if worker_process.is_alive():
+            worker_process.terminate()
+    print(f"[PDF_EXTRACTION] Replaced the extraction process pool and terminated its {len(worker_processes)} workers.")
+
+
+def _add_backend_counts(extraction_stats, backend_counts):
+    if extraction_stats is not None:
+        for backend_name, pages_count in backend_counts.items():
+            extraction_stats[f"pages_{backend_name}"] = extraction_stats.get(f"pages_{backend_name}", 0) + pages_count
+
+
+def iter_pdf_page_texts(pdf_path, total_pages=None, extraction_stats=None):
+    """
+    Yields (stripped_page_text, page_number) for every page of the PDF that has text, in page
+    order. Long documents are extracted in page ranges on the process pool; a range whose
+    worker fails, or is not back within PDF_RANGE_TIMEOUT_SECONDS of waiting for it, is
+    extracted in this process instead (after a timeout, so are all the remaining ranges).
+    """
+    if total_pages is None:
+        total_pages = get_page_count(pdf_path)
+    fast_backend = use_fast_backend()
+
+    def yield_page_texts(page_texts):
+        for page_text_item in page_texts:
+            if extraction_stats is not None:
+                extraction_stats["pages_with_text"] = extraction_stats.get("pages_with_text", 0) + 1
+            yield page_text_item
+
+    if total_pages < PDF_PARALLEL_MIN_PAGES or get_extraction_max_workers() <= 1:
+        backend_counts = {}
+        try:
+            yield from yield_page_texts(iter_page_range_texts(pdf_path, 1, total_pages, fast_backend, backend_counts))
+        finally:
+            _add_backend_counts(extraction_stats, backend_counts)
+        return
+
+    page_ranges = get_page_ranges(total_pages)
+    pool = None
+    try:
+        pool = get_extraction_process_pool()
+        range_futures = [pool.submit(_extract_page_range_in_worker, pdf_path, first_page_num, last_page_num, fast_backend)
+                         for first_page_num, last_page_num in page_ranges]
+    except (OSError, RuntimeError, concurrent.futures.process.BrokenProcessPool) as e_pool:
+        print(f"[PDF_EXTRACTION] Process pool unavailable ({e_pool}); extracting serially.")
+        shutdown_extraction_process_pool()
+        range_futures = [None] * len(page_ranges)
+    print(f"[PDF_EXTRACTION] Extracting {total_pages} pages in {len(page_ranges)} ranges (fast backend: {'pypdfium2' if fast_backend else 'off'}).")
+
+    pool_timed_out = False
+    try:
+        for (first_page_num, last_page_num), range_future in zip(page_ranges, range_futures):
+            page_texts = None
+            if range_future is not None and not pool_timed_out:
+                try:
+                    page_texts, backend_counts = range_future.result(timeout=PDF_RANGE_TIMEOUT_SECONDS)
+                except concurrent.futures.TimeoutError:
+                    print(f"[PDF_EXTRACTION] Pages {first_page_num}-{last_page_num} not extracted within {PDF_RANGE_TIMEOUT_SECONDS}s; "
+                          f"recycling the pool and extracting the remaining pages here.")
+                    recycle_extraction_process_pool(pool)
+                    pool_timed_out = True
+                except Exception as e_range:
+                    print(f"[PDF_EXTRACTION] Pages {first_page_num}-{last_page_num} failed in a worker ({type(e_range).__name__}: {e_range}); extracting them here.")
+                    if isinstance(e_range, concurrent.futures.process.BrokenProcessPool):
+                        shutdown_extraction_process_pool()
+            if page_texts is None:
+                backend_counts = {}
+                page_texts = list(iter_page_range_texts(pdf_path, first_page_num, last_page_num, fast_backend, backend_counts))
+            _add_backend_counts(extraction_stats, backend_counts)
+            yield from yield_page_texts(page_texts)
+    finally:
+        # The consumer stopped early (or failed): don't leave the remaining ranges running
+        for range_future in range_futures:
+            if range_future is not None:
+                range_future.cancel()
@@ -0,0 +1,75 @@
+"""
+Incremental parsing of a streamed {"questions": [...]} completion.
+
+The model's JSON arrives a few characters at a time. QuestionStreamParser tracks just enough
+state (nesting depth, whether it is inside a string, the last top-level key) to notice when an
+object inside the top-level "questions" array closes, and parses that object on its own, so
+each question can be used as soon as the model finishes writing it instead of after the whole
+completion. Text around the JSON object (e.g. a ```json fence) is ignored. Each character is
+looked at once, so a long completion costs no more than parsing it whole.
+"""
+import json
+
+
+class QuestionStreamParser:
+    """Feed it a completion's text deltas in order; each feed() returns the question objects completed by that delta."""
+    def __init__(self, array_key="questions"):
+        self.array_key = array_key
+        self.objects_parsed_count = 0
+        self.objects_failed_count = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key_chars = None # Characters of the top-level string being read (a key candidate)
+        self._last_key = None
+        self._array_state = None # None until the questions array opens, then "open", then "closed"
+        self._object_chars = None # Characters of the question object being read
+
+    def feed(self, text_delta):
+        completed_objects = []
+        for char in text_delta:
+            if self._object_chars is not None:
+                self._object_chars.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key_chars is not None:
+                        self._last_key = "".join(self._key_chars)
+                        self._key_chars = None
+                    continue
+                if self._key_chars is not None:
+                    self._key_chars.append(char)
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._key_chars = []
+            elif char == "{" or char == "[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._array_state is None and self._last_key == self.array_key:
+                    self._array_state = "open"
+                elif char == "{" and self._array_state == "open" and self._depth == 3 and self._object_chars is None:
+                    self._object_chars = ["{"]
+            elif char == "}" or char == "]":
+                self._depth -= 1
+                if self._object_chars is not None and self._depth == 2:
+                    question_object = self._parse_object("".join(self._object_chars))
+                    if question_object is not None:
+                        completed_objects.append(question_object)
+                    self._object_chars = None
+                elif self._array_state == "open" and self._depth < 2:
+                    self._array_state = "closed"
+        return completed_objects
+
+    def _parse_object(self, object_text):
+        try:
+            question_object = json.loads(object_text)
+        except ValueError:
+            self.objects_failed_count += 1
+            print(f"[QUESTION_STREAM] Skipping a streamed question object that is not valid JSON: {object_text[:200]}")
+            return None
+        self.objects_parsed_count += 1
+        return question_object
@@ -0,0 +1,122 @@
+"""
+Array-backed sentence store for one document.
+
+Sentences are split once (NLTK punkt, per page) and kept as one text buffer plus integer
+offset / length / page arrays, instead of a list of {"text", "page"} dicts and repeated
+re-splitting of the same text. Everything downstream (summarizers, page mapping, chunking)
+refers to sentences by their integer id, i.e. their position in the store.
+"""
+from array import array
+
+from nltk.tokenize import sent_tokenize
+
+SENTENCE_SEPARATOR = " "
+
+
+def normalize_sentence_text(sentence_text):
+    """Collapses the line breaks and runs of whitespace pdfplumber leaves inside a sentence."""
+    return " ".join(sentence_text.split())
+
+
+class SentenceStore:
+    def __init__(self):
+        self._parts = []
+        self._buffer = ""
+        self._buffer_length = 0
+        self.offsets = array('q')
+        self.lengths = array('l')
+        self.page_ids = array('l')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getstate__(self):
+        # Pickle (e.g. for the summarizer process pool) the joined buffer, not the pending parts
+        state = self.__dict__.copy()
+        state['_buffer'] = self.buffer
+        state['_parts'] = []
+        return state
+
+    def add_sentence(self, sentence_text, page_num):
+        sentence_text = normalize_sentence_text(sentence_text)
+        if not sentence_text:
+            return None
+        if self._buffer_length:
+            self._parts.append(SENTENCE_SEPARATOR)
+            self._buffer_length += len(SENTENCE_SEPARATOR)
+        self.offsets.append(self._buffer_length)
+        self.lengths.append(len(sentence_text))
+        self.page_ids.append(page_num)
+        self._parts.append(sentence_text)
+        self._buffer_length += len(sentence_text)
+        return len(self.offsets) - 1
+
+    def add_page(self, page_text, page_num):
+        """Sentence-splits one page and appends its sentences. Returns how many were added."""
+        added_count = 0
+        for sentence_text in sent_tokenize(page_text):
+            if self.add_sentence(sentence_text, page_num) is not None:
+                added_count += 1
+        return added_count
+
+    @property
+    def buffer(self):
+        """All sentences joined by SENTENCE_SEPARATOR; sentence i is buffer[offsets[i]:offsets[i] + lengths[i]]."""
+        if self._parts:
+            self._buffer = self._buffer + "".join(self._parts)
+            self._parts = []
+        return self._buffer
+
+    def sentence(self, sentence_id):
+        offset = self.offsets[sentence_id]
+        return self.buffer[offset:offset + self.lengths[sentence_id]]
+
+    def sentences(self, sentence_ids=None):
+        buffer = self.buffer
+        if sentence_ids is None:
+            sentence_ids = range(len(self))
+        for sentence_id in sentence_ids:
+            offset = self.offsets[sentence_id]
+            yield buffer[offset:offset + self.lengths[sentence_id]]
+
+    def page(self, sentence_id):
+        return self.page_ids[sentence_id]
+
+    def pages_for(self, sentence_ids):
+        """Sorted, de-duplicated page numbers the given sentences came from."""
+        page_ids = self.page_ids
+        return sorted(set(page_ids[sentence_id] for sentence_id in sentence_ids))
+
+    def page_numbers(self):
+        return sorted(set(self.page_ids))
+
+    def text(self, sentence_ids=None):
+        """The given sentences (all by default) joined by SENTENCE_SEPARATOR."""
+        if sentence_ids is None:
+            return self.buffer
+        return SENTENCE_SEPARATOR.join(self.sentences(sentence_ids))
+
+    def ids_for_pages(self, page_nums):
+        page_nums = set(page_nums)
+        return [sentence_id for sentence_id, page_num in enumerate(self.page_ids) if page_num in page_nums]
+
+    def to_dict(self):
+        """JSON-serializable form of the store (see from_dict), e.g. for upload_cache."""
+        return {'text': self.buffer, 'offsets': self.offsets.tolist(), 'lengths': self.lengths.tolist(), 'page_ids': self.page_ids.tolist()}
+
+    @classmethod
+    def from_dict(cls, store_dict):
+        sentence_store = cls()
+        sentence_store._buffer = store_dict['text']
+        sentence_store._buffer_length = len(store_dict['text'])
+        sentence_store.offsets = array('q', store_dict['offsets'])
+        sentence_store.lengths = array('l', store_dict['lengths'])
+        sentence_store.page_ids = array('l', store_dict['page_ids'])
+        return sentence_store
+
+    def subset(self, sentence_ids):
+        """A new store holding only the given sentences (ids are renumbered from 0)."""
+        sub_store = SentenceStore()
+        for sentence_id in sentence_ids:
+            sub_store.add_sentence(self.sentence(sentence_id), self.page_ids[sentence_id])
+        return sub_store
@@ -0,0 +1,169 @@
+"""
+Memory-bounded LSA sentence ranking with a truncated (randomized) SVD.
+
+Sumy's LsaSummarizer fills a dense |terms| x |sentences| matrix and takes its full SVD,
+which is cubic in time and quadratic in memory. Its smoothed term frequency turns every
+zero cell of a non-empty column into `smooth`, so the matrix is really
+
+    A = smooth * 1 * mask^T + (1 - smooth) * N
+
+with N the sparse max-normalized count matrix and mask marking non-empty sentences.
+Here A is only ever applied as that sparse-plus-rank-one operator, and just the top-k
+singular triplets are computed (randomized range finder, Halko et al. 2011). Sentences
+are then ranked like sumy does: sqrt(sum_i sigma_i^2 * v_ij^2) over the kept dimensions.
+
+How close this comes to sumy: when the full SVD fits, the matrix, decomposition and ranks are
+computed with sumy's own arithmetic, so for the same term order the ranks are bit-identical.
+With only the top k dimensions they are an approximation, and sentences whose ranks are close
+may swap places, changing a pick or two. (Sumy's term order comes from a frozenset, so it
+varies with string hashing between processes, and sumy itself can break near-ties differently
+from run to run.)
+"""
+import numpy
+
+try:
+    import scipy.sparse as scipy_sparse
+except ImportError:
+    scipy_sparse = None
+
+LSA_SMOOTH = 0.4
+LSA_MIN_DIMENSIONS = 3
+LSA_OVERSAMPLES = 10
+LSA_POWER_ITERATIONS = 4
+LSA_RANDOM_SEED = 0
+LSA_MEMORY_CEILING_BYTES = 256 * 1024 * 1024 # Working-set cap for one LSA run (per worker)
+FLOAT_BYTES = 8
+
+
+def is_available():
+    return scipy_sparse is not None
+
+
+class LsaMemoryError(MemoryError):
+    """Raised when even the smallest useful LSA decomposition would exceed the memory ceiling."""
+
+
+def build_normalized_term_matrix(sentence_stem_counts, dictionary_terms):
+    """
+    Sparse |terms| x |sentences| matrix of count / max-count-in-sentence, counting only
+    dictionary terms, plus the mask of sentences that contain any of them.
+    """
+    row_by_term = {term: i for i, term in enumerate(dictionary_terms)}
+    rows = []
+    cols = []
+    data = []
+    for col, stem_counts in enumerate(sentence_stem_counts):
+        for stem, count in stem_counts.items():
+            row = row_by_term.get(stem)
+            if row is not None:
+                rows.append(row)
+                cols.append(col)
+                data.append(count)
+    counts_matrix = scipy_sparse.csc_matrix(
+        (numpy.asarray(data, dtype=numpy.float64), (numpy.asarray(rows, dtype=numpy.int64), numpy.asarray(cols, dtype=numpy.int64))),
+        shape=(len(row_by_term), len(sentence_stem_counts)))
+    counts_matrix.sum_duplicates()
+    max_frequencies = counts_matrix.max(axis=0).toarray().ravel()
+    non_empty_mask = (max_frequencies != 0).astype(numpy.float64)
+    # count / max, divided like sumy does (multiplying by 1 / max rounds differently and can flip near-ties)
+    entry_columns = numpy.repeat(numpy.arange(counts_matrix.shape[1]), numpy.diff(counts_matrix.indptr))
+    counts_matrix.data = counts_matrix.data / max_frequencies[entry_columns]
+    return counts_matrix, non_empty_mask
+
+
+class _SmoothedTermMatrix:
+    """A = smooth * ones(terms) x mask^T + (1 - smooth) * N, applied without densifying."""
+    def __init__(self, normalized_matrix, non_empty_mask, smooth=LSA_SMOOTH):
+        self.normalized_matrix = normalized_matrix
+        self.normalized_matrix_t = normalized_matrix.T.tocsr()
+        self.non_empty_mask = non_empty_mask
+        self.smooth = smooth
+        self.shape = normalized_matrix.shape
+
+    def dot(self, block):
+        # A @ block, block is |sentences| x r
+        return self.smooth * numpy.outer(numpy.ones(self.shape[0]), self.non_empty_mask @ block) \
+            + (1.0 - self.smooth) * (self.normalized_matrix @ block)
+
+    def rdot(self, block):
+        # A.T @ block, block is |terms| x r
+        return self.smooth * numpy.outer(self.non_empty_mask, block.sum(axis=0)) \
+            + (1.0 - self.smooth) * (self.normalized_matrix_t @ block)
+
+    def to_dense(self):
+        dense = (1.0 - self.smooth) * self.normalized_matrix.toarray()
+        dense += self.smooth * self.non_empty_mask[numpy.newaxis, :]
+        return dense
+
+
+def estimate_dense_svd_bytes(terms_count, sentences_count):
+    # matrix + U + Vt of numpy's thin SVD, plus LAPACK workspace of about the same size
+    smaller_dim = min(terms_count, sentences_count)
+    return FLOAT_BYTES * (2 * terms_count * sentences_count + terms_count * smaller_dim + smaller_dim * sentences_count)
+
+
+def estimate_randomized_svd_bytes(terms_count, sentences_count, nnz, dimensions):
+    sketch_width = dimensions + LSA_OVERSAMPLES
+    # sparse N and its transpose (data + indices), then the two sketches and their QR copies
+    return 2 * nnz * (FLOAT_BYTES + 4) + FLOAT_BYTES * 3 * (terms_count + sentences_count) * sketch_width
+
+
+def choose_dimensions(terms_count, sentences_count, nnz, target_dimensions, memory_ceiling_bytes=LSA_MEMORY_CEILING_BYTES):
+    """Largest k <= target_dimensions whose randomized SVD fits under the memory ceiling."""
+    dimensions = max(LSA_MIN_DIMENSIONS, target_dimensions)
+    dimensions = min(dimensions, min(terms_count, sentences_count))
+    while dimensions >= 1 and estimate_randomized_svd_bytes(terms_count, sentences_count, nnz, dimensions) > memory_ceiling_bytes:
+        dimensions //= 2
+    if dimensions < 1:
+        raise LsaMemoryError(
+            f"LSA on a {terms_count}x{sentences_count} term matrix does not fit in {memory_ceiling_bytes // (1024 * 1024)} MB.")
+    return dimensions
+
+
+def randomized_svd(operator, dimensions, oversamples=LSA_OVERSAMPLES, power_iterations=LSA_POWER_ITERATIONS, seed=LSA_RANDOM_SEED):
+    """Top-`dimensions` singular values and right singular vectors (sigma, Vt) of the operator."""
+    terms_count, sentences_count = operator.shape
+    sketch_width = min(dimensions + oversamples, min(terms_count, sentences_count))
+    rng = numpy.random.default_rng(seed)
+    sketch = operator.dot(rng.standard_normal((sentences_count, sketch_width)))
+    basis, _ = numpy.linalg.qr(sketch)
+    for _ in range(power_iterations):
+        basis, _ = numpy.linalg.qr(operator.rdot(basis))
+        basis, _ = numpy.linalg.qr(operator.dot(basis))
+    projected = operator.rdot(basis).T # basis.T @ A, sketch_width x |sentences|
+    _, sigma, v_matrix = numpy.linalg.svd(projected, full_matrices=False)
+    return sigma[:dimensions], v_matrix[:dimensions]
+
+
+def rank_sentences(sigma, v_matrix):
+    """Sumy's LSA sentence rank: sqrt(sum_i sigma_i^2 * v_ij^2) per sentence j, over the given dimensions."""
+    # Summed one dimension at a time, in sumy's order, so equal inputs give bit-identical ranks.
+    # Squared with float_power: sumy squares numpy scalars, which goes through pow() and can round
+    # differently from the x * x that `array ** 2` uses.
+    squared_ranks = numpy.zeros(v_matrix.shape[1])
+    for sigma_value, v_row in zip(sigma, v_matrix):
+        squared_ranks += numpy.float_power(sigma_value, 2) * numpy.float_power(v_row, 2)
+    return numpy.sqrt(squared_ranks)
+
+
+def lsa_sentence_ranks(sentence_stem_counts, dictionary_terms, target_dimensions, memory_ceiling_bytes=LSA_MEMORY_CEILING_BYTES):
+    """
+    LSA rank per sentence using only the top-k singular vectors, k = target_dimensions
+    (shrunk to fit the memory ceiling). When k (plus oversampling) covers the full rank and
+    the dense matrix fits, this is sumy's exact SVD and, for terms in sumy's order, gives
+    bit-identical ranks; otherwise the ranks are approximate and near-ties may order differently.
+    Returns (ranks, dimensions_used).
+    """
+    normalized_matrix, non_empty_mask = build_normalized_term_matrix(sentence_stem_counts, dictionary_terms)
+    operator = _SmoothedTermMatrix(normalized_matrix, non_empty_mask)
+    terms_count, sentences_count = operator.shape
+    full_rank_dimensions = min(terms_count, sentences_count)
+
+    if target_dimensions + LSA_OVERSAMPLES >= full_rank_dimensions and \
+       estimate_dense_svd_bytes(terms_count, sentences_count) <= memory_ceiling_bytes:
+        _u, sigma, v_matrix = numpy.linalg.svd(operator.to_dense(), full_matrices=False)
+        return rank_sentences(sigma, v_matrix), len(sigma)
+
+    dimensions = choose_dimensions(terms_count, sentences_count, normalized_matrix.nnz, target_dimensions, memory_ceiling_bytes)
+    sigma, v_matrix = randomized_svd(operator, dimensions)
+    return rank_sentences(sigma, v_matrix), dimensions
@@ -1,7 +1,18 @@
 import nltk
 from nltk.tokenize import sent_tokenize
+import os
 import re
+import random
+import math
 import time
+import pickle
+import uuid
+import tempfile
+import threading
+import multiprocessing
+import concurrent.futures
+import numpy
+from warnings import warn
 
 # Sumy (imports remain the same)
 from sumy.parsers.plaintext import PlaintextParser
@@ -12,16 +23,68 @@ from sumy.summarizers.luhn import LuhnSummarizer
 from sumy.summarizers.text_rank import TextRankSummarizer
 from sumy.nlp.stemmers import Stemmer
 from sumy.utils import get_stop_words
+from sumy.models import TfDocumentModel
+from sumy.models.dom import ObjectDocumentModel, Paragraph, Sentence
+from collections import Counter
 
 from rouge_score import rouge_scorer
 import textstat
 
+import graph_ranking
+import sparse_lsa
+import fast_rouge
+from sentence_store import SentenceStore, SENTENCE_SEPARATOR
+import summary_cache
+import summary_metrics
+
 LANGUAGE = "english"
 # For the final "best summary" selected by metrics (this is what app.py might use if full text is too long)
 TARGET_SUMMARY_SENTENCE_COUNT_RATIO = 0.60 
 MIN_SENTENCES_FOR_SUMMARY = 10 
 MAX_SENTENCES_FOR_SUMMARY = 150 # Cap for the "best summary" if 60% is still too many sentences
 
+# How the candidate summarizers are evaluated: "parallel" (process pool) or "sequential"
+SUMMARIZER_EVALUATION_MODE = "parallel"
+SUMMARIZER_POOL_MAX_WORKERS = None # None -> min(4, CPU count)
+# Workers are spawned, not forked: the pool is created lazily, inside a server process that is already running threads
+SUMMARIZER_POOL_START_METHOD = "spawn"
+# Results of a method still running after this are dropped and the pool is replaced (its workers terminated)
+SUMMARIZER_METHOD_TIMEOUT_SECONDS = 120
+# Candidate summarizers, cheapest first, so the ones most likely to finish before a deadline run first
+SUMMARIZER_METHODS_CHEAPEST_FIRST = ['luhn', 'textrank', 'lexrank', 'lsa']
+# Time budget for summarizer evaluation in process_text_for_qna (counted once the pages are read, filtered and
+# split, so a slow lazy extraction does not use it up); when it runs out the best candidate finished so far is used.
+SUMMARIZER_PIPELINE_DEADLINE_SECONDS = None # Seconds, or None for no deadline
+# Backend for lexrank/textrank: "sparse" (vectorized graph_ranking, needs scipy) or "sumy" (pure-Python loops)
+GRAPH_RANKING_BACKEND = "sparse"
+# Backend for lsa: "truncated" (sparse matrix, top-k SVD, memory ceiling; needs scipy) or "sumy" (dense full SVD)
+LSA_BACKEND = "truncated"
+# ROUGE implementation: "fast" (fast_rouge, bit-parallel LCS, cached reference) or "rouge_score"
+ROUGE_ENGINE = "fast"
+# How candidate summaries are scored: "aggregated" (summary_metrics engine, per-sentence statistics computed
+# once and summed per candidate; needs ROUGE_ENGINE "fast") or "per_summary" (calculate_all_metrics on each summary text)
+SUMMARY_METRICS_MODE = "aggregated"
+
+_rouge_scorer_instance = None
+
+# How the winning summarizer is chosen: "full" (score every method on the whole text) or
+# "sampled" (score every method on a stratified page sample, then run only the winner on the whole text)
+SUMMARIZER_SELECTION_STRATEGY = "full"
+SAMPLED_SELECTION_MIN_PAGES = 20 # Smaller documents are always evaluated in full
+SAMPLED_SELECTION_PAGE_COUNT = 8
+SAMPLED_SELECTION_AUDIT_RATE = 0.1 # Fraction of sampled runs also evaluated in full to measure agreement
+SUMMARY_SCORE_WEIGHTS = { 'rougeL': 0.40, 'readability': 0.30, 'compression_effectiveness': 0.30 }
+
+# Persist pipeline results keyed on the filtered page text + configuration (see summary_cache.py)
+SUMMARY_CACHE_ENABLED = True
+PAGE_FILTER_VERSION = 1 # Bump when the boilerplate rules or sentence splitting change (upload_cache keeps filtered pages)
+
+_sampled_selection_agreement = {'audited_runs': 0, 'agreed_runs': 0}
+_summarizer_process_pool = None
+_summarizer_process_pool_lock = threading.Lock()
+# In each pool worker: payload path -> (sentence_store, parsed_document) of the request being evaluated
+_worker_payload_cache = {}
+
 try:
     nltk.data.find('tokenizers/punkt')
 except nltk.downloader.DownloadError:
@@ -78,31 +141,360 @@ def is_likely_boilerplate_page(page_text_content, page_number, total_pages):
             return True
     return False
 
+# --- Compiled, single-pass version of is_likely_boilerplate_page ---
+# The per-keyword heading check matches each BOILERPLATE_HEADINGS entry literally (re.escape),
+# so one alternation of the escaped entries, one named group each, finds them all at once.
+_HEADING_KEYWORD_GROUPS = {f"h{i}": keyword for i, keyword in enumerate(BOILERPLATE_HEADINGS)}
+HEADING_KEYWORD_LINE_PATTERN = re.compile(
+    r"^\s*(?:" + "|".join(f"(?P<{group}>{re.escape(keyword)})" for group, keyword in _HEADING_KEYWORD_GROUPS.items()) + r")\s*$",
+    re.IGNORECASE | re.MULTILINE)
+CONTEXT_DEPENDENT_HEADINGS = frozenset(["introduction", "executive summary", "abstract"])
+# Characters TOC_INDEX_LINE_PATTERN's [ivxlcdm\d] accepts under re.IGNORECASE (decimal digits,
+# the roman numeral letters in both cases, and the dotted/dotless i that IGNORECASE folds to i)
+TOC_NUMBER_LETTERS = frozenset("ivxlcdmIVXLCDM\u0130\u0131")
+# Plain substrings: a str `in` scan per keyword beats a regex alternation over them.
+EDGE_PAGE_KEYWORDS = ("index", "references", "bibliography", "about the author", "glossary", "contents", "figure captions", "table captions", "acknowledgements")
+TOP_OF_PAGE_KEYWORDS = ("preface", "foreword", "dedication", "author bio", "about the author", "notes to the reader", "copyright information", "isbn")
+
+
+def is_toc_index_line(line):
+    r"""
+    Same answer as TOC_INDEX_LINE_PATTERN.search(line) for a single line. The pattern's
+    "(.*?)\s*[._\s]+\s*" reduces to "one separator right before the trailing number", so
+    this just walks back over the trailing number instead of backtracking over the line.
+    """
+    stripped_line = line.rstrip()
+    number_start = len(stripped_line)
+    while number_start > 0 and (stripped_line[number_start - 1] in TOC_NUMBER_LETTERS or stripped_line[number_start - 1].isdecimal()):
+        number_start -= 1
+    if number_start == len(stripped_line) or number_start == 0:
+        return False
+    separator_char = stripped_line[number_start - 1]
+    return separator_char in "._" or separator_char.isspace()
+
+def extract_page_features(page_text_content):
+    """
+    Everything the boilerplate heuristics look at, computed from a single splitlines()/split()
+    of the page, with one compiled regex pass for all the heading keywords.
+    """
+    lines = page_text_content.splitlines()
+    first_few_lines = "\n".join(lines[:5])
+    heading_keywords_found = [_HEADING_KEYWORD_GROUPS[m.lastgroup] for m in HEADING_KEYWORD_LINE_PATTERN.finditer(first_few_lines)]
+    toc_index_line_matches = 0
+    if len(lines) > 4:
+        toc_index_line_matches = sum(1 for line in lines if is_toc_index_line(line))
+    return {
+        'lines_count': len(lines),
+        'word_count': len(page_text_content.split()),
+        'first_few_lines': first_few_lines,
+        'heading_keywords_found': heading_keywords_found,
+        'toc_index_line_matches': toc_index_line_matches,
+        'top_lines_lower': "\n".join(lines[:15]).lower(),
+    }
+
+def classify_page_features(page_features, page_text_content, page_number, total_pages):
+    """Applies the is_likely_boilerplate_page rules, in the same order, to precomputed features."""
+    word_count = page_features['word_count']
+    heading_keywords_found = page_features['heading_keywords_found']
+    if heading_keywords_found and HEADING_PATTERN.search(page_features['first_few_lines']):
+        is_mid_document_long_page = (page_number > total_pages * 0.10 and page_number < total_pages * 0.90) and word_count > 200
+        for heading_keyword in heading_keywords_found:
+            if heading_keyword.lower() in CONTEXT_DEPENDENT_HEADINGS and is_mid_document_long_page:
+                continue
+            return True
+    lines_count = page_features['lines_count']
+    if lines_count > 4 and page_features['toc_index_line_matches'] / lines_count > 0.4:
+        return True
+    if (page_number <= max(1, int(total_pages * 0.05)) or \
+        page_number >= total_pages - max(0, int(total_pages * 0.05)-1)) and \
+        word_count < 150 :
+        text_lower = page_text_content.lower()
+        if any(keyword in text_lower for keyword in EDGE_PAGE_KEYWORDS):
+            return True
+    top_lines_lower = page_features['top_lines_lower']
+    if any(keyword in top_lines_lower for keyword in TOP_OF_PAGE_KEYWORDS):
+        return True
+    return False
+
+def classify_boilerplate_pages(pages_text_with_nums, total_pages):
+    """
+    Batch version of is_likely_boilerplate_page: takes [(page_text, page_num), ...] and returns
+    one bool per page, identical to calling is_likely_boilerplate_page on each.
+    """
+    return [classify_page_features(extract_page_features(page_text), page_text, page_num, total_pages)
+            for page_text, page_num in pages_text_with_nums]
+
 def preprocess_text_for_sumy(text):
     text = re.sub(r'\n\s*\n', '\n', text) 
     text = re.sub(r'[ \t]+', ' ', text)    
     return text.strip()
 
-def get_sumy_summary(full_text, summarizer_type_str, target_sentence_count):
-    parser = PlaintextParser.from_string(full_text, SumyTokenizer(LANGUAGE))
-    stemmer = Stemmer(LANGUAGE)
-    if summarizer_type_str == 'lexrank': summarizer_instance = LexRankSummarizer(stemmer)
-    elif summarizer_type_str == 'luhn': summarizer_instance = LuhnSummarizer(stemmer)
-    elif summarizer_type_str == 'lsa': summarizer_instance = LsaSummarizer(stemmer)
-    elif summarizer_type_str == 'textrank': summarizer_instance = TextRankSummarizer(stemmer)
-    else: raise ValueError(f"Unsupported summarizer type: {summarizer_type_str}")
-    summarizer_instance.stop_words = get_stop_words(LANGUAGE)
+class CachedStemmer:
+    """Sumy-compatible stemmer that memoizes every stem it has computed."""
+    def __init__(self, language):
+        self._stemmer = Stemmer(language)
+        self._stems = {}
+
+    def __call__(self, word):
+        stem = self._stems.get(word)
+        if stem is None:
+            stem = self._stemmer(word)
+            self._stems[word] = stem
+        return stem
+
+
+class ParsedDocument:
+    """
+    Sentence-splits, word-tokenizes and stems a text exactly once, the same way
+    sumy would, and keeps the per-sentence stems and term-frequency data that
+    the lsa, lexrank, luhn and textrank summarizers all need.
+    Built from a SentenceStore, the store's sentences are used as-is (no re-splitting),
+    so sentence i of the document is sentence id i of the store.
+    """
+    def __init__(self, full_text=None, language=LANGUAGE, sentence_store=None):
+        self.language = language
+        tokenizer = SumyTokenizer(language)
+        if sentence_store is not None:
+            self.document = ObjectDocumentModel([Paragraph([Sentence(sentence_text, tokenizer) for sentence_text in sentence_store.sentences()])])
+        else:
+            self.document = PlaintextParser.from_string(full_text, tokenizer).document
+        self.sentences = self.document.sentences
+        self.stemmer = CachedStemmer(language)
+        self.stop_words = frozenset(w.lower() for w in get_stop_words(language))
+
+        # Stems of every word (stop words included), per sentence - what sumy's stem_word() yields.
+        self.sentence_all_stems = []
+        # Stems of the non-stop words, per sentence - what lexrank/textrank call _to_words_set().
+        self.sentence_content_stems = []
+        for sentence_obj in self.sentences:
+            all_stems, content_stems = self._stem_words(sentence_obj.words)
+            self.sentence_all_stems.append(all_stems)
+            self.sentence_content_stems.append(content_stems)
+        self.sentence_index_by_sentence = {s: i for i, s in enumerate(self.sentences)}
+        # Sentence objects compare by text, so ids are looked up by object identity instead.
+        self.sentence_id_by_object = {id(s): i for i, s in enumerate(self.sentences)}
+
+        # Document-level (headings included) non-stop-word stems, as sumy's document.words gives them.
+        _, self.document_content_stems = self._stem_words(self.document.words)
+
+        # Cached term-frequency data
+        self.sentence_term_counts = [Counter(stems) for stems in self.sentence_content_stems]
+        self.sentence_all_stem_counts = [Counter(stems) for stems in self.sentence_all_stems]
+        self.term_sentence_frequencies = Counter()
+        for term_counts in self.sentence_term_counts:
+            self.term_sentence_frequencies.update(term_counts.keys())
+        self.document_tf_model = TfDocumentModel(self.document_content_stems)
+
+    def __getstate__(self):
+        # Object ids do not survive pickling (the summarizer process pool gets pickled documents)
+        state = dict(self.__dict__)
+        del state['sentence_id_by_object']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.sentence_id_by_object = {id(s): i for i, s in enumerate(self.sentences)}
+
+    def _stem_words(self, words):
+        all_stems = []
+        content_stems = []
+        for word in words:
+            normalized_word = word.lower()
+            stem = self.stemmer(normalized_word)
+            all_stems.append(stem)
+            if normalized_word not in self.stop_words:
+                content_stems.append(stem)
+        return all_stems, content_stems
+
+    def all_stems_for(self, sentence_obj):
+        return self.sentence_all_stems[self.sentence_index_by_sentence[sentence_obj]]
+
+    def content_stems_for(self, sentence_obj):
+        return self.sentence_content_stems[self.sentence_index_by_sentence[sentence_obj]]
+
+    def sentence_ids_for(self, sentence_objects):
+        return [self.sentence_id_by_object[id(sentence_obj)] for sentence_obj in sentence_objects]
+
+
+class _ParsedDocumentMixin:
+    """Lets a sumy summarizer read stems from a ParsedDocument instead of re-stemming."""
+    def __init__(self, parsed_document):
+        super().__init__(parsed_document.stemmer)
+        self.parsed_document = parsed_document
+        self.stop_words = parsed_document.stop_words
+
+    def _to_words_set(self, sentence):
+        return self.parsed_document.content_stems_for(sentence)
+
+
+class SharedLsaSummarizer(_ParsedDocumentMixin, LsaSummarizer):
+    def _create_dictionary(self, document):
+        unique_words = frozenset(self.parsed_document.document_content_stems)
+        return {w: i for i, w in enumerate(unique_words)}
+
+    def _create_matrix(self, document, dictionary):
+        words_count = len(dictionary)
+        sentences_count = len(self.parsed_document.sentences)
+        if words_count < sentences_count:
+            warn("Number of words (%d) is lower than number of sentences (%d). LSA algorithm may not work properly." % (words_count, sentences_count))
+        matrix = numpy.zeros((words_count, sentences_count))
+        for col, stem_counts in enumerate(self.parsed_document.sentence_all_stem_counts):
+            for stem, count in stem_counts.items():
+                if stem in dictionary:
+                    matrix[dictionary[stem], col] = count
+        return matrix
+
+
+class SharedLexRankSummarizer(_ParsedDocumentMixin, LexRankSummarizer):
+    def __call__(self, document, sentences_count):
+        self._ensure_dependencies_installed()
+        sentences_words = self.parsed_document.sentence_content_stems
+        if not sentences_words:
+            return ()
+
+        tf_metrics = self._compute_tf(sentences_words)
+        idf_metrics = self._compute_idf(sentences_words)
+
+        matrix = self._create_matrix(sentences_words, self.threshold, tf_metrics, idf_metrics)
+        scores = self.power_method(matrix, self.epsilon)
+        ratings = dict(zip(document.sentences, scores))
+
+        return self._get_best_sentences(document.sentences, sentences_count, ratings)
+
+    def _compute_tf(self, sentences):
+        tf_metrics = []
+        for term_counts in self.parsed_document.sentence_term_counts:
+            max_tf = self._find_tf_max(term_counts)
+            tf_metrics.append({term: tf / max_tf for term, tf in term_counts.items()})
+        return tf_metrics
+
+    def _compute_idf(self, sentences):
+        sentences_count = len(sentences)
+        return {term: math.log(sentences_count / (1 + n_j))
+                for term, n_j in self.parsed_document.term_sentence_frequencies.items()}
+
+
+class SharedLuhnSummarizer(_ParsedDocumentMixin, LuhnSummarizer):
+    def _get_significant_words(self, words):
+        model = self.parsed_document.document_tf_model
+        best_words_count = int(len(self.parsed_document.document_content_stems) * self.significant_percentage)
+        words = model.most_frequent_terms(best_words_count)
+        return frozenset(t for t in words if model.term_frequency(t) > 1)
+
+    def rate_sentence(self, sentence, significant_stems):
+        ratings = self._get_stem_chunk_ratings(self.parsed_document.all_stems_for(sentence), significant_stems)
+        return max(ratings) if ratings else 0
+
+    def _get_stem_chunk_ratings(self, sentence_stems, significant_stems):
+        # Same as LuhnSummarizer._get_chunk_ratings, but over pre-computed stems
+        chunks = []
+        NONSIGNIFICANT_CHUNK = [0]*self.max_gap_size
+        in_chunk = False
+        for stem in sentence_stems:
+            if stem in significant_stems and not in_chunk:
+                in_chunk = True
+                chunks.append([1])
+            elif in_chunk:
+                chunks[-1].append(int(stem in significant_stems))
+            if chunks and chunks[-1][-self.max_gap_size:] == NONSIGNIFICANT_CHUNK:
+                in_chunk = False
+        return tuple(map(self._get_chunk_rating, chunks))
+
+
+class SharedTextRankSummarizer(_ParsedDocumentMixin, TextRankSummarizer):
+    pass
+
+
+class SparseLexRankSummarizer(SharedLexRankSummarizer):
+    """LexRank with the similarity graph and power iteration vectorized in graph_ranking."""
+    def __call__(self, document, sentences_count):
+        if not self.parsed_document.sentences:
+            return ()
+        scores = graph_ranking.lexrank_scores(self.parsed_document.sentence_term_counts, self.threshold, self.epsilon)
+        ratings = dict(zip(document.sentences, scores))
+        return self._get_best_sentences(document.sentences, sentences_count, ratings)
+
+
+class SparseTextRankSummarizer(SharedTextRankSummarizer):
+    """TextRank with the similarity graph and power iteration vectorized in graph_ranking."""
+    def rate_sentences(self, document):
+        ranks = graph_ranking.textrank_scores(self.parsed_document.sentence_term_counts, self.damping, self.epsilon)
+        return {sent: rank for sent, rank in zip(document.sentences, ranks)}
+
+
+class TruncatedLsaSummarizer(SharedLsaSummarizer):
+    """
+    LSA on a sparse term matrix with only the top-k singular vectors (k = requested
+    sentence count), bounded by sparse_lsa.LSA_MEMORY_CEILING_BYTES. Picks the same
+    sentences as sumy when k covers the full rank, otherwise approximately the same.
+    """
+    def __call__(self, document, sentences_count):
+        dictionary = self._create_dictionary(document)
+        if not dictionary:
+            return ()
+        ranks, dimensions_used = sparse_lsa.lsa_sentence_ranks(
+            self.parsed_document.sentence_all_stem_counts, list(dictionary), sentences_count)
+        print(f"  [LSA] Ranked {len(ranks)} sentences on {dimensions_used} singular dimensions ({len(dictionary)} terms).")
+        ranks_iter = iter(ranks)
+        return self._get_best_sentences(document.sentences, sentences_count, lambda s: next(ranks_iter))
+
+
+SHARED_SUMMARIZER_CLASSES = {
+    'lsa': SharedLsaSummarizer,
+    'lexrank': SharedLexRankSummarizer,
+    'luhn': SharedLuhnSummarizer,
+    'textrank': SharedTextRankSummarizer,
+}
+SPARSE_SUMMARIZER_CLASSES = {
+    'lsa': TruncatedLsaSummarizer,
+    'lexrank': SparseLexRankSummarizer,
+    'textrank': SparseTextRankSummarizer,
+}
+
+def get_summarizer_class(summarizer_type_str):
+    if summarizer_type_str not in SHARED_SUMMARIZER_CLASSES:
+        raise ValueError(f"Unsupported summarizer type: {summarizer_type_str}")
+    if summarizer_type_str == 'lsa':
+        if LSA_BACKEND == "truncated" and sparse_lsa.is_available():
+            return SPARSE_SUMMARIZER_CLASSES['lsa']
+    elif GRAPH_RANKING_BACKEND == "sparse" and graph_ranking.is_available() and summarizer_type_str in SPARSE_SUMMARIZER_CLASSES:
+        return SPARSE_SUMMARIZER_CLASSES[summarizer_type_str]
+    return SHARED_SUMMARIZER_CLASSES[summarizer_type_str]
+
+def get_summary_sentence_ids(parsed_document, summarizer_type_str, target_sentence_count):
+    """Runs one sumy summarizer and returns the ids (document positions) of the sentences it picked, in document order."""
+    summarizer_class = get_summarizer_class(summarizer_type_str)
+    summarizer_instance = summarizer_class(parsed_document)
     actual_target_count = max(1, target_sentence_count)
-    summary_sentence_objects = summarizer_instance(parser.document, actual_target_count)
-    return [str(s).strip() for s in summary_sentence_objects if str(s).strip()]
+    summary_sentence_objects = summarizer_instance(parsed_document.document, actual_target_count)
+    return parsed_document.sentence_ids_for(s for s in summary_sentence_objects if str(s).strip())
+
+def get_sumy_summary(full_text, summarizer_type_str, target_sentence_count, parsed_document=None):
+    """
+    Runs one sumy summarizer. Pass a ParsedDocument built from full_text to reuse
+    its tokenization and stems across several summarizer types.
+    """
+    if parsed_document is None:
+        parsed_document = ParsedDocument(full_text)
+    summary_sentence_ids = get_summary_sentence_ids(parsed_document, summarizer_type_str, target_sentence_count)
+    return [str(parsed_document.sentences[i]).strip() for i in summary_sentence_ids]
 
 def calculate_rouge_scores(hypothesis_str, reference_str):
     if not hypothesis_str.strip() or not reference_str.strip(): return {'rouge1': 0, 'rouge2': 0, 'rougeL': 0}
-    scorer_obj = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
+    if ROUGE_ENGINE == "fast":
+        # Reference tokens/stems/LCS bitmasks are built once and reused for every candidate
+        return fast_rouge.get_reference(reference_str).score(hypothesis_str)
+    scorer_obj = _get_rouge_scorer()
     scores_val = scorer_obj.score(reference_str, hypothesis_str)
     return {'rouge1': scores_val['rouge1'].fmeasure, 'rouge2': scores_val['rouge2'].fmeasure, 'rougeL': scores_val['rougeL'].fmeasure}
 
-def calculate_all_metrics(summary_text_str, original_full_text_str):
+def _get_rouge_scorer():
+    global _rouge_scorer_instance
+    if _rouge_scorer_instance is None:
+        _rouge_scorer_instance = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
+    return _rouge_scorer_instance
+
+def calculate_all_metrics(summary_text_str, original_full_text_str, summary_sentence_count=None):
     if not summary_text_str.strip():
         return {'rouge_scores': {'rouge1': 0, 'rouge2': 0, 'rougeL': 0}, 'compression_ratio': 1.0, 'readability_score': 0, 'f1_score_rougeL': 0, 'summary_sentence_count': 0}
     if not original_full_text_str.strip(): original_full_text_str = "." 
@@ -113,116 +505,257 @@ def calculate_all_metrics(summary_text_str, original_full_text_str):
     try: readability_score_val = textstat.flesch_reading_ease(summary_text_str)
     except: readability_score_val = 0 
     f1_score_val = rouge_scores_val['rougeL']
-    summary_sentence_count_val = len(sent_tokenize(summary_text_str))
+    # Callers that already know the summary's sentences (sentence ids) pass the count instead of re-splitting
+    summary_sentence_count_val = summary_sentence_count if summary_sentence_count is not None else len(sent_tokenize(summary_text_str))
     return {'rouge_scores': rouge_scores_val, 'compression_ratio': compression_ratio_val, 'readability_score': readability_score_val, 'f1_score_rougeL': f1_score_val, 'summary_sentence_count': summary_sentence_count_val}
 
-def map_summary_sentences_to_pages(summary_sentences_list, original_sentences_with_pages_metadata):
-    summary_page_numbers_found = set()
-    original_sents_lookup = {s_meta['text'].lower().strip(): s_meta['page'] for s_meta in original_sentences_with_pages_metadata}
-    for summ_sent_str in summary_sentences_list:
-        clean_summ_sent = summ_sent_str.strip().lower()
-        if clean_summ_sent in original_sents_lookup:
-            summary_page_numbers_found.add(original_sents_lookup[clean_summ_sent])
-        # else:
-            # print(f"[PAGE_MAP_DEBUG] Summary sentence not directly mapped: '{summ_sent_str[:30]}...'")
-    return sorted(list(summary_page_numbers_found))
-
-def process_text_for_qna(pdf_text_by_page_raw, total_pages_in_pdf):
-    pipeline_start_time = time.time()
-    print("\n[SUMMARIZER_PIPELINE] Initializing: Boilerplate removal & Multi-Summarizer Evaluation...")
+def map_summary_sentences_to_pages(summary_sentence_ids, sentence_store):
+    """Pages the summary came from, read straight off the store's page array."""
+    return sentence_store.pages_for(summary_sentence_ids)
 
-    if not pdf_text_by_page_raw:
-        print("[SUMMARIZER_PIPELINE] No raw text provided from PDF.")
-        return "", [], "N/A", None, "", [] 
+def uses_aggregated_summary_metrics():
+    """True when every candidate is scored from one SummaryMetricsEngine rather than with calculate_all_metrics."""
+    return SUMMARY_METRICS_MODE == "aggregated" and ROUGE_ENGINE == "fast"
 
-    content_text_with_pages = [] 
-    print("[SUMMARIZER_PIPELINE] Filtering boilerplate content (REAL)...")
-    for raw_page_text, page_num in pdf_text_by_page_raw:
-        if is_likely_boilerplate_page(raw_page_text, page_num, total_pages_in_pdf):
-            continue
-        content_text_with_pages.append((raw_page_text, page_num))
-    
-    if not content_text_with_pages:
-        print("[SUMMARIZER_PIPELINE] All pages filtered as boilerplate. Using first raw page as fallback.")
-        if pdf_text_by_page_raw: 
-            first_page_text, first_page_num = pdf_text_by_page_raw[0]
-            # Create metadata for this single fallback page
-            sents_meta = [{"text": s.strip(), "page": first_page_num} for s in sent_tokenize(first_page_text) if s.strip()]
-            return first_page_text, [first_page_num], "Fallback (First Page Raw)", {}, first_page_text, [first_page_num]
-        else:
-            return "", [], "N/A", None, "", []
-
-    original_sentences_metadata_filtered = [] 
-    full_filtered_text_concatenated = ""
-    pages_in_full_filtered_text = set()
-
-    for text_content_item, page_num_item in content_text_with_pages:
-        page_sents_list = sent_tokenize(text_content_item)
-        for sent_str_item in page_sents_list:
-            clean_sent_item = sent_str_item.strip()
-            if clean_sent_item: 
-                original_sentences_metadata_filtered.append({"text": clean_sent_item, "page": page_num_item})
-        full_filtered_text_concatenated += text_content_item + "\n"
-        pages_in_full_filtered_text.add(page_num_item)
-    
-    full_filtered_text_concatenated = preprocess_text_for_sumy(full_filtered_text_concatenated)
-    final_pages_for_full_filtered_text = sorted(list(pages_in_full_filtered_text))
+def get_summary_metrics_engine(sentence_store):
+    """A SummaryMetricsEngine for the store, or None when candidates are scored one by one with calculate_all_metrics."""
+    if not uses_aggregated_summary_metrics():
+        return None
+    engine_start_time = time.time()
+    try:
+        metrics_engine = summary_metrics.SummaryMetricsEngine(sentence_store)
+    except Exception as e_engine:
+        print(f"[SUMMARIZER_PIPELINE] Could not build metrics engine ({e_engine}). Scoring each summary separately.")
+        return None
+    print(f"[SUMMARIZER_PIPELINE] Precomputed per-sentence metric statistics for {len(sentence_store)} sentences in {time.time() - engine_start_time:.2f}s.")
+    return metrics_engine
 
-    if not original_sentences_metadata_filtered or not full_filtered_text_concatenated.strip():
-        print("[SUMMARIZER_PIPELINE] No valid sentences after filtering for summarization.")
-        # Still return the (empty) full_filtered_text and its pages
-        return "", [], "N/A (No sentences post-filter)", None, full_filtered_text_concatenated, final_pages_for_full_filtered_text
+def calculate_summary_metrics(summary_sentence_ids, sentence_store, metrics_engine=None):
+    """calculate_all_metrics for the summary made of the given sentence ids, aggregated by the metrics engine when there is one."""
+    if metrics_engine is not None:
+        return metrics_engine.metrics_for(summary_sentence_ids)
+    return calculate_all_metrics(sentence_store.text(summary_sentence_ids), sentence_store.text(), summary_sentence_count=len(summary_sentence_ids))
 
-    original_total_sentences_count = len(original_sentences_metadata_filtered)
-    # Target for each of the 4 evaluated summaries
-    target_sents_for_evaluation_summaries = max(MIN_SENTENCES_FOR_SUMMARY, 
-                                      min(MAX_SENTENCES_FOR_SUMMARY, # Use the higher cap here
-                                          int(original_total_sentences_count * TARGET_SUMMARY_SENTENCE_COUNT_RATIO)))
-    
-    print(f"[SUMMARIZER_PIPELINE] Filtered content: {original_total_sentences_count} sentences ({len(full_filtered_text_concatenated)} chars). Target for each evaluated summary: {target_sents_for_evaluation_summaries} sentences (aiming for ~60% of original).")
+def print_summary_evaluation(summary_data, seconds_taken):
+    metrics_data = summary_data['metrics']
+    print(f"  {summary_data['method'].upper()} generated summary (length: {len(summary_data['summary_text'])} chars) and metrics in {seconds_taken:.2f}s. ROUGE-L F1: {metrics_data['f1_score_rougeL']:.3f}, Readability: {metrics_data['readability_score']:.1f}, Pages: {summary_data['page_numbers']}")
 
-    summarizer_methods_to_eval = ['lsa', 'lexrank', 'luhn', 'textrank']
-    all_summaries_data = []
-    all_methods_metrics_log = {}
+def evaluate_summarizer_method(method_name_str, sentence_store, target_sentence_count, fallback_page_num, parsed_document=None, metrics_engine=None, with_metrics=True):
+    """
+    Runs one summarizer over the store's sentences and scores it. Returns the summary data dict used by process_text_for_qna.
+    With with_metrics=False the 'metrics' entry is left as None for the caller to fill in (see add_summary_metrics).
+    Safe to run in a worker process: everything it takes and returns is picklable.
+    """
+    method_start_time = time.time()
+    print(f"[SUMMARIZER_PIPELINE] Evaluating: {method_name_str.upper()}")
+    try:
+        if parsed_document is None:
+            parsed_document = ParsedDocument(sentence_store=sentence_store)
+        summary_sentence_ids = get_summary_sentence_ids(parsed_document, method_name_str, target_sentence_count)
+        current_summary_text = sentence_store.text(summary_sentence_ids)
+
+        summary_pages_found = []
+        if current_summary_text.strip():
+            summary_pages_found = map_summary_sentences_to_pages(summary_sentence_ids, sentence_store)
+            if not summary_pages_found and fallback_page_num is not None:
+                summary_pages_found = [fallback_page_num]
+        summary_data = {
+            'method': method_name_str,
+            'summary_text': current_summary_text,
+            'sentence_ids': summary_sentence_ids,
+            'page_numbers': summary_pages_found,
+            'metrics': None
+        }
+        if not with_metrics:
+            print(f"  {method_name_str.upper()} selected {len(summary_sentence_ids)} sentences in {time.time() - method_start_time:.2f}s.")
+            return summary_data
 
-    for method_name_str in summarizer_methods_to_eval:
-        method_start_time = time.time()
-        print(f"[SUMMARIZER_PIPELINE] Evaluating: {method_name_str.upper()}")
+        summary_data['metrics'] = calculate_summary_metrics(summary_sentence_ids, sentence_store, metrics_engine)
+        print_summary_evaluation(summary_data, time.time() - method_start_time)
+        return summary_data
+    except Exception as e_sum:
+        print(f"  Error during {method_name_str} summarization/metrics: {e_sum}")
+        metrics_placeholder = calculate_all_metrics("", "")
+        return {'method': method_name_str, 'summary_text': "", 'sentence_ids': [], 'page_numbers': [], 'metrics': metrics_placeholder, 'overall_score': -float('inf')}
+
+def add_summary_metrics(summaries_data, sentence_store, metrics_engine=None):
+    """Fills in 'metrics' for summaries evaluated with with_metrics=False."""
+    for summary_data in summaries_data:
+        if summary_data['metrics'] is None:
+            metrics_start_time = time.time()
+            summary_data['metrics'] = calculate_summary_metrics(summary_data['sentence_ids'], sentence_store, metrics_engine)
+            print_summary_evaluation(summary_data, time.time() - metrics_start_time)
+    return summaries_data
+
+def write_summarizer_payload(sentence_store, parsed_document):
+    """Pickles the store and its parsed document to a temp file once per request; the workers read it from there."""
+    payload_path = os.path.join(tempfile.gettempdir(), f"zapdos_summarizer_payload_{uuid.uuid4().hex}.pickle")
+    with open(payload_path, "wb") as payload_file:
+        pickle.dump((sentence_store, parsed_document), payload_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return payload_path
+
+def load_summarizer_payload(payload_path):
+    """(sentence_store, parsed_document) from write_summarizer_payload, unpickled once per worker process."""
+    payload = _worker_payload_cache.get(payload_path)
+    if payload is None:
+        with open(payload_path, "rb") as payload_file:
+            payload = pickle.load(payload_file)
+        _worker_payload_cache.clear() # Only the latest request's document is kept
+        _worker_payload_cache[payload_path] = payload
+    return payload
+
+def remove_summarizer_payload(payload_path):
+    if payload_path is None:
+        return
+    try:
+        os.remove(payload_path)
+    except OSError as e_remove:
+        print(f"[SUMMARIZER_PIPELINE] Could not remove summarizer payload {payload_path}: {e_remove}")
+
+def _evaluate_summarizer_method_in_worker(method_name_str, payload_path, target_sentence_count, fallback_page_num, with_metrics):
+    # Tasks only carry the payload path, so the document is pickled once and each worker unpickles it once.
+    # Metrics are left to the parent when it aggregates every candidate from one SummaryMetricsEngine.
+    sentence_store, parsed_document = load_summarizer_payload(payload_path)
+    return evaluate_summarizer_method(method_name_str, sentence_store, target_sentence_count, fallback_page_num,
+                                      parsed_document=parsed_document, with_metrics=with_metrics)
+
+def get_summarizer_process_pool():
+    """Returns the module-wide process pool used for parallel summarizer evaluation, creating it on first use."""
+    global _summarizer_process_pool
+    with _summarizer_process_pool_lock:
+        if _summarizer_process_pool is None:
+            max_workers = SUMMARIZER_POOL_MAX_WORKERS or min(4, os.cpu_count() or 1)
+            _summarizer_process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context(SUMMARIZER_POOL_START_METHOD))
+            print(f"[SUMMARIZER_PIPELINE] Started summarizer process pool with {max_workers} workers ({SUMMARIZER_POOL_START_METHOD} start method).")
+        return _summarizer_process_pool
+
+def shutdown_summarizer_process_pool():
+    global _summarizer_process_pool
+    with _summarizer_process_pool_lock:
+        if _summarizer_process_pool is not None:
+            _summarizer_process_pool.shutdown(wait=False, cancel_futures=True)
+            _summarizer_process_pool = None
+
+def recycle_summarizer_process_pool(stuck_pool):
+    """
+    Replaces stuck_pool (the next caller gets a fresh pool) and terminates its workers.
+    A running task cannot be cancelled, so this is the only way to stop a timed-out method
+    from holding a worker. Other requests' tasks on stuck_pool fail with BrokenProcessPool,
+    which evaluate_summarizer_methods_in_parallel handles by evaluating in-process.
+    """
+    global _summarizer_process_pool
+    with _summarizer_process_pool_lock:
+        if _summarizer_process_pool is stuck_pool:
+            _summarizer_process_pool = None
+    worker_processes = list((getattr(stuck_pool, "_processes", None) or {}).values())
+    stuck_pool.shutdown(wait=False, cancel_futures=True)
+    for worker_process in worker_processes:
+        if worker_process.is_alive():
+            worker_process.terminate()
+    print(f"[SUMMARIZER_PIPELINE] Replaced the summarizer process pool and terminated its {len(worker_processes)} workers.")
+
+def evaluate_summarizer_methods_in_parallel(method_names, sentence_store, target_sentence_count, fallback_page_num, method_timeout_seconds=None, deadline=None):
+    """
+    Evaluates the summarizer methods concurrently on the shared process pool, from one parsed
+    document. A method that has not finished within method_timeout_seconds of submission, or by
+    the deadline (a time.time() value), is dropped from the results, and the pool is recycled so
+    it does not keep running. Falls back to sequential evaluation if the pool cannot be used.
+    Without an aggregated metrics engine (SUMMARY_METRICS_MODE "per_summary"), the workers score
+    their own candidates too.
+    """
+    if method_timeout_seconds is None:
+        method_timeout_seconds = SUMMARIZER_METHOD_TIMEOUT_SECONDS
+    metrics_in_workers = not uses_aggregated_summary_metrics()
+    payload_path = None
+    try:
+        parse_start_time = time.time()
+        parsed_document = ParsedDocument(sentence_store=sentence_store)
+        payload_path = write_summarizer_payload(sentence_store, parsed_document)
+        print(f"[SUMMARIZER_PIPELINE] Parsed shared document ({len(parsed_document.sentences)} sumy sentences, "
+              f"{os.path.getsize(payload_path) / 1024:.0f} KB pickled) in {time.time() - parse_start_time:.2f}s.")
+        pool = get_summarizer_process_pool()
+        submitted_at = time.time()
+        future_by_method = {
+            method_name_str: pool.submit(_evaluate_summarizer_method_in_worker, method_name_str, payload_path,
+                                         target_sentence_count, fallback_page_num, metrics_in_workers)
+            for method_name_str in method_names
+        }
+    except Exception as e_pool:
+        print(f"[SUMMARIZER_PIPELINE] Process pool unavailable ({e_pool}). Evaluating sequentially.")
+        remove_summarizer_payload(payload_path)
+        shutdown_summarizer_process_pool()
+        return evaluate_summarizer_methods_sequentially(method_names, sentence_store, target_sentence_count, fallback_page_num, deadline)
+
+    # Built while the workers summarize
+    metrics_engine = get_summary_metrics_engine(sentence_store)
+    wait_until = submitted_at + method_timeout_seconds
+    if deadline is not None:
+        wait_until = min(wait_until, deadline)
+    summaries_data = []
+    timed_out_methods = []
+    for method_name_str, future in future_by_method.items():
+        remaining_seconds = max(0, wait_until - time.time())
         try:
-            summary_sentences_list_val = get_sumy_summary(full_filtered_text_concatenated, method_name_str, target_sents_for_evaluation_summaries)
-            current_summary_text = " ".join(summary_sentences_list_val)
-
-            metrics_data = calculate_all_metrics(current_summary_text, full_filtered_text_concatenated)
-            summary_pages_found = []
-            if current_summary_text.strip():
-                summary_pages_found = map_summary_sentences_to_pages(summary_sentences_list_val, original_sentences_metadata_filtered)
-                if not summary_pages_found and content_text_with_pages: 
-                    summary_pages_found = [content_text_with_pages[0][1]] 
-            
-            all_methods_metrics_log[method_name_str] = metrics_data
-            all_summaries_data.append({
-                'method': method_name_str,
-                'summary_text': current_summary_text,
-                'page_numbers': summary_pages_found,
-                'metrics': metrics_data
-            })
-            method_time_taken = time.time() - method_start_time
-            print(f"  {method_name_str.upper()} generated summary (length: {len(current_summary_text)} chars) and metrics in {method_time_taken:.2f}s. ROUGE-L F1: {metrics_data['f1_score_rougeL']:.3f}, Readability: {metrics_data['readability_score']:.1f}, Pages: {summary_pages_found}")
-
-        except Exception as e_sum:
-            print(f"  Error during {method_name_str} summarization/metrics: {e_sum}")
-            metrics_placeholder = calculate_all_metrics("", full_filtered_text_concatenated)
-            all_methods_metrics_log[method_name_str] = metrics_placeholder
-            all_summaries_data.append({'method': method_name_str, 'summary_text': "", 'page_numbers': [], 'metrics': metrics_placeholder, 'overall_score': -float('inf')})
-
-    if not any(s_data['summary_text'] for s_data in all_summaries_data):
-        print("[SUMMARIZER_PIPELINE] No summaries were generated by any method. Returning full filtered text.")
-        return full_filtered_text_concatenated, final_pages_for_full_filtered_text, "Fallback (Full Filtered)", all_methods_metrics_log, full_filtered_text_concatenated, final_pages_for_full_filtered_text
+            summaries_data.append(future.result(timeout=remaining_seconds))
+        except concurrent.futures.TimeoutError:
+            timed_out_methods.append(method_name_str)
+            print(f"  {method_name_str.upper()} did not finish within {wait_until - submitted_at:.1f}s (method timeout / pipeline deadline). Dropping its result.")
+        except concurrent.futures.process.BrokenProcessPool as e_broken:
+            print(f"  Summarizer process pool broke while running {method_name_str.upper()}: {e_broken}")
+            shutdown_summarizer_process_pool()
+            summaries_data.append(evaluate_summarizer_method(method_name_str, sentence_store, target_sentence_count, fallback_page_num,
+                                                             parsed_document=parsed_document, metrics_engine=metrics_engine))
+    if timed_out_methods:
+        recycle_summarizer_process_pool(pool)
+    remove_summarizer_payload(payload_path) # Every task has finished or been terminated by now
+    add_summary_metrics(summaries_data, sentence_store, metrics_engine)
+    print(f"[SUMMARIZER_PIPELINE] Parallel evaluation finished in {time.time() - submitted_at:.2f}s ({len(summaries_data)}/{len(method_names)} methods returned).")
+    return summaries_data
 
-    score_weights = { 'rougeL': 0.40, 'readability': 0.30, 'compression_effectiveness': 0.30 } 
+def get_target_summary_sentence_count(original_sentence_count):
+    return max(MIN_SENTENCES_FOR_SUMMARY,
+               min(MAX_SENTENCES_FOR_SUMMARY, # Use the higher cap here
+                   int(original_sentence_count * TARGET_SUMMARY_SENTENCE_COUNT_RATIO)))
+
+def evaluate_summarizer_methods(method_names, sentence_store, target_sentence_count, fallback_page_num, deadline=None):
+    """
+    Summarizes and scores the store's sentences with every method, in parallel or sequentially per
+    SUMMARIZER_EVALUATION_MODE. Only methods that finish before the deadline (a time.time() value,
+    None for no deadline) are returned.
+    """
+    if SUMMARIZER_EVALUATION_MODE == "parallel":
+        return evaluate_summarizer_methods_in_parallel(
+            method_names, sentence_store, target_sentence_count, fallback_page_num, deadline=deadline)
+    return evaluate_summarizer_methods_sequentially(method_names, sentence_store, target_sentence_count, fallback_page_num, deadline)
+
+def evaluate_summarizer_methods_sequentially(method_names, sentence_store, target_sentence_count, fallback_page_num, deadline=None):
+    # Tokenize and stem the sentences once; every summarizer below reads from it.
+    parse_start_time = time.time()
+    try:
+        shared_parsed_document = ParsedDocument(sentence_store=sentence_store)
+        print(f"[SUMMARIZER_PIPELINE] Parsed shared document ({len(shared_parsed_document.sentences)} sumy sentences) in {time.time() - parse_start_time:.2f}s.")
+    except Exception as e_parse:
+        print(f"[SUMMARIZER_PIPELINE] Could not build shared parsed document ({e_parse}). Each summarizer will parse on its own.")
+        shared_parsed_document = None
+    metrics_engine = get_summary_metrics_engine(sentence_store)
+    summaries_data = []
+    for method_name_str in method_names:
+        # A running method cannot be interrupted, so the deadline is checked before starting each one
+        if deadline is not None and time.time() >= deadline:
+            print(f"  Pipeline deadline reached. Not starting {method_name_str.upper()}.")
+            continue
+        summaries_data.append(evaluate_summarizer_method(method_name_str, sentence_store, target_sentence_count,
+                                                         fallback_page_num, parsed_document=shared_parsed_document, metrics_engine=metrics_engine))
+    return summaries_data
 
+def score_summary_candidates(all_summaries_data, all_methods_metrics_log, score_weights=None):
+    """
+    Sets 'overall_score' (weighted ROUGE-L / readability / compression) on every candidate and
+    its metrics log entry. Returns the best-scoring candidate with a non-empty summary, or None.
+    """
+    score_weights = score_weights or SUMMARY_SCORE_WEIGHTS
     for summary_obj in all_summaries_data:
-        # ... (scoring logic remains same) ...
         if 'overall_score' in summary_obj and summary_obj['overall_score'] == -float('inf'): continue
         if not summary_obj['summary_text']:
             summary_obj['overall_score'] = -float('inf')
@@ -236,26 +769,251 @@ def process_text_for_qna(pdf_text_by_page_raw, total_pages_in_pdf):
         summary_obj['overall_score'] = calculated_score
         if summary_obj['method'] in all_methods_metrics_log: all_methods_metrics_log[summary_obj['method']]['overall_score'] = calculated_score
         print(f"  Overall Score for {summary_obj['method'].upper()}: {calculated_score:.4f}")
-        
-    valid_summaries_for_show = [s for s in all_summaries_data if 'overall_score' in s and s['overall_score'] > -float('inf') and s['summary_text']]
+
+    valid_summaries = [s for s in all_summaries_data if 'overall_score' in s and s['overall_score'] > -float('inf') and s['summary_text']]
+    if not valid_summaries:
+        return None
+    return max(valid_summaries, key=lambda item: item['overall_score'])
+
+def select_stratified_sample_pages(content_page_nums, sample_page_count=None):
+    """
+    Picks sample_page_count pages spread evenly over the document: the content pages are split
+    into that many equal strata and the middle page of each stratum is taken.
+    """
+    sample_page_count = sample_page_count or SAMPLED_SELECTION_PAGE_COUNT
+    pages_count = len(content_page_nums)
+    if pages_count <= sample_page_count:
+        return list(content_page_nums)
+    stratum_size = pages_count / sample_page_count
+    return [content_page_nums[int(stratum_size * (i + 0.5))] for i in range(sample_page_count)]
+
+def evaluate_with_sampled_selection(method_names, content_page_nums, sentence_store, target_sentence_count, fallback_page_num, deadline=None):
+    """
+    Scores every method on a stratified page sample, then summarizes the full text with the
+    winner only. A fraction (SAMPLED_SELECTION_AUDIT_RATE) of runs also evaluates every
+    method on the full text and records whether both evaluations picked the same method.
+    Returns (summaries data for the full text, sample selection log).
+    """
+    sample_start_time = time.time()
+    sample_page_nums = select_stratified_sample_pages(content_page_nums)
+    sample_store = sentence_store.subset(sentence_store.ids_for_pages(sample_page_nums))
+    sample_target_count = get_target_summary_sentence_count(len(sample_store))
+    print(f"[SUMMARIZER_PIPELINE] Sampled selection: scoring {len(method_names)} methods on {len(sample_page_nums)} of {len(content_page_nums)} pages {sample_page_nums}.")
+
+    sample_metrics_log = {}
+    sample_summaries_data = evaluate_summarizer_methods(method_names, sample_store, sample_target_count, sample_page_nums[0], deadline)
+    for summary_obj in sample_summaries_data:
+        sample_metrics_log[summary_obj['method']] = summary_obj['metrics']
+    sample_winner = score_summary_candidates(sample_summaries_data, sample_metrics_log)
+    selection_log = {
+        'sample_pages': sorted(sample_page_nums),
+        'sample_scores': {method: metrics.get('overall_score') for method, metrics in sample_metrics_log.items()},
+        'sample_winner': sample_winner['method'] if sample_winner else None,
+        'sample_selection_seconds': time.time() - sample_start_time,
+    }
+    if sample_winner is None:
+        print("[SUMMARIZER_PIPELINE] Sampled selection found no usable summary. Evaluating every method on the full text.")
+        return evaluate_summarizer_methods(method_names, sentence_store, target_sentence_count, fallback_page_num, deadline), selection_log
+    print(f"[SUMMARIZER_PIPELINE] Sample winner: {sample_winner['method'].upper()} (chosen in {selection_log['sample_selection_seconds']:.2f}s).")
+
+    if random.random() < SAMPLED_SELECTION_AUDIT_RATE:
+        full_summaries_data = evaluate_summarizer_methods(method_names, sentence_store, target_sentence_count, fallback_page_num, deadline)
+        full_winner = score_summary_candidates([dict(s) for s in full_summaries_data], {})
+        agreed = full_winner is not None and full_winner['method'] == sample_winner['method']
+        _sampled_selection_agreement['audited_runs'] += 1
+        _sampled_selection_agreement['agreed_runs'] += int(agreed)
+        selection_log['audit_full_winner'] = full_winner['method'] if full_winner else None
+        selection_log['audit_agreed'] = agreed
+        print(f"[SUMMARIZER_PIPELINE] Sampled-selection audit: full evaluation picked {selection_log['audit_full_winner']}, sample picked {sample_winner['method']}. "
+              f"Agreement so far: {_sampled_selection_agreement['agreed_runs']}/{_sampled_selection_agreement['audited_runs']} audited runs.")
+        return full_summaries_data, selection_log
+
+    if deadline is not None and time.time() >= deadline:
+        print(f"[SUMMARIZER_PIPELINE] Pipeline deadline reached before running {sample_winner['method'].upper()} on the full text.")
+        return [], selection_log
+    return [evaluate_summarizer_method(sample_winner['method'], sentence_store, target_sentence_count, fallback_page_num)], selection_log
+
+def get_summary_cache_config(method_names, selection_strategy):
+    """Every setting that changes process_text_for_qna's result for the same filtered pages."""
+    return {
+        'methods': list(method_names),
+        'selection_strategy': selection_strategy,
+        'sampled_selection': [SAMPLED_SELECTION_MIN_PAGES, SAMPLED_SELECTION_PAGE_COUNT] if selection_strategy == "sampled" else None,
+        'target_summary': [TARGET_SUMMARY_SENTENCE_COUNT_RATIO, MIN_SENTENCES_FOR_SUMMARY, MAX_SENTENCES_FOR_SUMMARY],
+        'backends': [GRAPH_RANKING_BACKEND, LSA_BACKEND, ROUGE_ENGINE],
+        'score_weights': SUMMARY_SCORE_WEIGHTS,
+    }
+
+def get_page_filter_config():
+    """Every setting that changes filter_and_split_pages' result for the same pages (see upload_cache's filtered pages)."""
+    return {
+        'version': PAGE_FILTER_VERSION,
+        'boilerplate_headings': BOILERPLATE_HEADINGS,
+        'context_dependent_headings': sorted(CONTEXT_DEPENDENT_HEADINGS),
+        'edge_page_keywords': list(EDGE_PAGE_KEYWORDS),
+        'top_of_page_keywords': list(TOP_OF_PAGE_KEYWORDS),
+        'sentence_separator': SENTENCE_SEPARATOR,
+    }
+
+def filter_and_split_pages(pdf_text_by_page_raw, total_pages_in_pdf):
+    """
+    Drops boilerplate pages and sentence-splits the rest into a SentenceStore, page by page.
+    Returns (content_page_nums, sentence_store, page_digest, first_raw_page), what
+    process_text_for_qna works from: page_digest identifies the content pages for the summary
+    cache, first_raw_page ((page_text, page_num) or None) is the all-boilerplate fallback.
+    """
+    # Pages are consumed one at a time, so pdf_text_by_page_raw can be a lazy iterator (see
+    # pdf_extraction.iter_pdf_page_texts): boilerplate pages are dropped as soon as they are classified and
+    # only the first raw page is kept around for the all-boilerplate fallback.
+    # Content pages are sentence-split once, into the SentenceStore every later step reads by sentence id.
+    content_page_nums = []
+    sentence_store = SentenceStore()
+    page_hasher = summary_cache.PageTextHasher()
+    first_raw_page = None
+    print("[SUMMARIZER_PIPELINE] Filtering boilerplate content (REAL)...")
+    for raw_page_text, page_num in pdf_text_by_page_raw:
+        if first_raw_page is None:
+            first_raw_page = (raw_page_text, page_num)
+        if classify_page_features(extract_page_features(raw_page_text), raw_page_text, page_num, total_pages_in_pdf):
+            continue
+        content_page_nums.append(page_num)
+        page_hasher.update(raw_page_text, page_num)
+        sentence_store.add_page(raw_page_text, page_num)
+    return content_page_nums, sentence_store, page_hasher.page_digest(), first_raw_page
+
+def process_text_for_qna(pdf_text_by_page_raw, total_pages_in_pdf, selection_strategy=None, deadline_seconds=None, filtered_pages=None):
+    """
+    Filters boilerplate pages, summarizes the rest with every candidate method and picks the best.
+    filtered_pages (filter_and_split_pages' result, e.g. from upload_cache) skips the filtering;
+    pdf_text_by_page_raw is then not read.
+    deadline_seconds (default SUMMARIZER_PIPELINE_DEADLINE_SECONDS) bounds summarizer evaluation,
+    starting once every page has been read (pdf_text_by_page_raw may extract lazily), filtered
+    and split: methods not finished by then are skipped and the best candidate finished so far is returned.
+    Returns (text_for_llm, pages_for_llm, method_chosen, metrics_log, full_filtered_text,
+    full_filtered_pages, qna_sentences, selection_log). full_filtered_text is the kept sentences
+    joined by single spaces (the SentenceStore's text): the same words as the content pages, but
+    without the page and line breaks the newline-joined, preprocess_text_for_sumy text used to keep.
+    metrics_log maps each evaluated method to its metrics; selection_log says how the method was
+    picked ('selection_strategy', 'skipped_methods' and, for sampled selection, 'sample_selection').
+    """
+    pipeline_start_time = time.time()
+    deadline_seconds = deadline_seconds if deadline_seconds is not None else SUMMARIZER_PIPELINE_DEADLINE_SECONDS
+    print("\n[SUMMARIZER_PIPELINE] Initializing: Boilerplate removal & Multi-Summarizer Evaluation...")
+
+    if filtered_pages is None:
+        filtered_pages = filter_and_split_pages(pdf_text_by_page_raw, total_pages_in_pdf)
+    else:
+        print("[SUMMARIZER_PIPELINE] Using already filtered and split pages.")
+    content_page_nums, sentence_store, page_digest, first_raw_page = filtered_pages
+    # Extraction (when the pages come from a lazy iterator) happens while filtering, so the
+    # summarizer deadline only starts now
+    summarization_start_time = time.time()
+    deadline = summarization_start_time + deadline_seconds if deadline_seconds is not None else None
+    print(f"[SUMMARIZER_PIPELINE] Page extraction, filtering & sentence splitting took {summarization_start_time - pipeline_start_time:.2f}s.")
+
+    if first_raw_page is None:
+        print("[SUMMARIZER_PIPELINE] No raw text provided from PDF.")
+        return "", [], "N/A", None, "", [], None, None
+    
+    if not content_page_nums:
+        print("[SUMMARIZER_PIPELINE] All pages filtered as boilerplate. Using first raw page as fallback.")
+        first_page_text, first_page_num = first_raw_page
+        return first_page_text, [first_page_num], "Fallback (First Page Raw)", {}, first_page_text, [first_page_num], None, {}
+
+    # The store's buffer already is the filtered text: every sentence, single-space separated (no page or
+    # line breaks; callers that need page boundaries read them from the store by sentence id)
+    full_filtered_text_concatenated = sentence_store.text()
+    final_pages_for_full_filtered_text = sorted(set(content_page_nums))
+
+    if not len(sentence_store):
+        print("[SUMMARIZER_PIPELINE] No valid sentences after filtering for summarization.")
+        # Still return the (empty) full_filtered_text and its pages
+        return "", [], "N/A (No sentences post-filter)", None, full_filtered_text_concatenated, final_pages_for_full_filtered_text, None, None
+
+    original_total_sentences_count = len(sentence_store)
+    # Target for each of the 4 evaluated summaries
+    target_sents_for_evaluation_summaries = get_target_summary_sentence_count(original_total_sentences_count)
+    
+    print(f"[SUMMARIZER_PIPELINE] Filtered content: {original_total_sentences_count} sentences ({len(full_filtered_text_concatenated)} chars). Target for each evaluated summary: {target_sents_for_evaluation_summaries} sentences (aiming for ~60% of original).")
+
+    summarizer_methods_to_eval = list(SUMMARIZER_METHODS_CHEAPEST_FIRST)
+    fallback_page_num = content_page_nums[0]
+    all_methods_metrics_log = {}
+    selection_strategy = selection_strategy or SUMMARIZER_SELECTION_STRATEGY
+    selection_log = {'selection_strategy': "full", 'skipped_methods': []} # The strategy actually used
+
+    # Sentence ids of whatever text is returned for the LLM (None = all of them), so app.py can chunk by id
+    qna_sentences = {'sentence_store': sentence_store, 'summary_sentence_ids': None}
+
+    cache_key = None
+    if SUMMARY_CACHE_ENABLED:
+        cache_key = summary_cache.get_cache_key(page_digest, get_summary_cache_config(summarizer_methods_to_eval, selection_strategy))
+        cached_result = summary_cache.get_cached_result(cache_key)
+        cached_sentence_ids = cached_result['summary_sentence_ids'] if cached_result else None
+        if cached_result and (not cached_sentence_ids or max(cached_sentence_ids) < len(sentence_store)):
+            print(f"[SUMMARIZER_PIPELINE] Cache hit ({cached_result['method_chosen']}), skipping summarizer evaluation. Cache stats: {summary_cache.get_cache_stats()}")
+            qna_sentences['summary_sentence_ids'] = cached_sentence_ids
+            text_for_llm = sentence_store.text(cached_sentence_ids) if cached_sentence_ids is not None else full_filtered_text_concatenated
+            print(f"[SUMMARIZER_PIPELINE] Summarization pipeline completed in {time.time() - pipeline_start_time:.2f} seconds.")
+            return (text_for_llm, cached_result['pages_for_llm'], cached_result['method_chosen'], cached_result['metrics_log'],
+                    full_filtered_text_concatenated, final_pages_for_full_filtered_text, qna_sentences, cached_result['selection_log'])
+
+    if selection_strategy == "sampled" and len(content_page_nums) >= SAMPLED_SELECTION_MIN_PAGES:
+        all_summaries_data, sample_selection_log = evaluate_with_sampled_selection(
+            summarizer_methods_to_eval, content_page_nums, sentence_store,
+            target_sents_for_evaluation_summaries, fallback_page_num, deadline)
+        selection_log['selection_strategy'] = "sampled"
+        selection_log['sample_selection'] = sample_selection_log
+        evaluated_methods = set(sample_selection_log['sample_scores'])
+    else:
+        all_summaries_data = evaluate_summarizer_methods(
+            summarizer_methods_to_eval, sentence_store, target_sents_for_evaluation_summaries, fallback_page_num, deadline)
+        evaluated_methods = set()
+
+    for summary_obj in all_summaries_data:
+        all_methods_metrics_log[summary_obj['method']] = summary_obj['metrics']
+    evaluated_methods.update(s_data['method'] for s_data in all_summaries_data)
+    skipped_methods = [m for m in summarizer_methods_to_eval if m not in evaluated_methods]
+    if skipped_methods:
+        print(f"[SUMMARIZER_PIPELINE] Skipped methods (pipeline deadline {deadline_seconds}s / method timeout): {skipped_methods}")
+        selection_log['skipped_methods'] = skipped_methods
 
     best_summary_object_for_show = None
-    if valid_summaries_for_show:
-        best_summary_object_for_show = max(valid_summaries_for_show, key=lambda item: item['overall_score'])
+    any_summary_generated = any(s_data['summary_text'] for s_data in all_summaries_data)
+    if not any_summary_generated:
+        print("[SUMMARIZER_PIPELINE] No summaries were generated by any method. Returning full filtered text.")
+    else:
+        best_summary_object_for_show = score_summary_candidates(all_summaries_data, all_methods_metrics_log)
     
     pipeline_time_taken = time.time() - pipeline_start_time
+    print(f"[SUMMARIZER_PIPELINE] Summarizer evaluation took {time.time() - summarization_start_time:.2f}s.")
     
     # Determine the text and pages to be returned for LLM processing
     if best_summary_object_for_show:
         text_for_llm = best_summary_object_for_show['summary_text']
         pages_for_llm = best_summary_object_for_show['page_numbers']
         method_chosen = best_summary_object_for_show['method']
+        qna_sentences['summary_sentence_ids'] = best_summary_object_for_show['sentence_ids']
         print(f"[SUMMARIZER_PIPELINE] Best method (for LLM input): {method_chosen.upper()} with score {best_summary_object_for_show['overall_score']:.4f}.")
+    elif not any_summary_generated:
+        text_for_llm = full_filtered_text_concatenated
+        pages_for_llm = final_pages_for_full_filtered_text
+        method_chosen = "Fallback (Full Filtered)"
     else: # Fallback if no valid summary was chosen by metrics
         print("[SUMMARIZER_PIPELINE] No valid 'best' summary found. Using full filtered text for LLM.")
         text_for_llm = full_filtered_text_concatenated
         pages_for_llm = final_pages_for_full_filtered_text
         method_chosen = "Fallback (Full Filtered Text)"
+
+    # A deadline-truncated result is not cached: the next run may have time for every method
+    if cache_key is not None and all_summaries_data and not skipped_methods:
+        summary_cache.store_result(cache_key, {
+            'method_chosen': method_chosen,
+            'summary_sentence_ids': qna_sentences['summary_sentence_ids'],
+            'pages_for_llm': pages_for_llm,
+            'metrics_log': all_methods_metrics_log,
+            'selection_log': selection_log,
+        })
         
     print(f"[SUMMARIZER_PIPELINE] Summarization pipeline completed in {pipeline_time_taken:.2f} seconds.")
     
@@ -264,5 +1022,7 @@ def process_text_for_qna(pdf_text_by_page_raw, total_pages_in_pdf):
             method_chosen, # This is the method whose summary is being returned for LLM
             all_methods_metrics_log, # This contains metrics for all evaluated methods
             full_filtered_text_concatenated, # Always return this for app.py to potentially use
-            final_pages_for_full_filtered_text # And its pages
-           )
\ No newline at end of file
+            final_pages_for_full_filtered_text, # And its pages
+            qna_sentences, # {'sentence_store', 'summary_sentence_ids'} for chunking by sentence id, or None
+            selection_log # How method_chosen was picked, kept out of the per-method metrics log
+           )
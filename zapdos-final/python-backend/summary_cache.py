@@ -0,0 +1,128 @@
+"""
+Persistent, content-addressed cache of summarizer pipeline results.
+
+Entries live in a local SQLite file, keyed on a hash of the filtered page text and the
+summarizer configuration, so re-uploading the same document (e.g. with another question
+type) skips the multi-summarizer evaluation. Values are small JSON documents (chosen
+method, summary sentence ids, pages, metrics). When the stored values exceed
+SUMMARY_CACHE_MAX_BYTES, the least recently used entries are evicted.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import contextlib
+
+SUMMARY_CACHE_PATH = os.path.join(tempfile.gettempdir(), "zapdos_summary_cache.sqlite3")
+SUMMARY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SUMMARY_CACHE_VERSION = 2 # Bump when the cached value layout or the pipeline's output changes
+
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'errors': 0}
+
+
+class PageTextHasher:
+    """Incrementally hashes (page_num, page_text) pairs as the pipeline streams over content pages."""
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def update(self, page_text, page_num):
+        self._hash.update(f"{page_num}\0{len(page_text)}\0".encode("utf-8"))
+        self._hash.update(page_text.encode("utf-8"))
+
+    def page_digest(self):
+        """Hash of the pages so far, which can be kept (e.g. by upload_cache) in place of the hasher."""
+        return self._hash.hexdigest()
+
+    def cache_key(self, config):
+        return get_cache_key(self.page_digest(), config)
+
+
+def get_cache_key(page_digest, config):
+    """Final key: the content pages' digest combined with the (JSON-serializable) configuration."""
+    key_hash = hashlib.sha256(page_digest.encode("utf-8"))
+    key_hash.update(json.dumps({'version': SUMMARY_CACHE_VERSION, 'config': config}, sort_keys=True).encode("utf-8"))
+    return key_hash.hexdigest()
+
+
+def _connect(cache_path):
+    connection = sqlite3.connect(cache_path, timeout=10)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS summary_cache ("
+        " cache_key TEXT PRIMARY KEY, value TEXT NOT NULL, size_bytes INTEGER NOT NULL, last_access REAL NOT NULL)")
+    return connection
+
+
+@contextlib.contextmanager
+def _open_cache(cache_path):
+    # One short-lived connection per call (commits on success), so the cache is usable from any thread
+    connection = _connect(cache_path)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def get_cached_result(cache_key, cache_path=None):
+    """Returns the cached value for cache_key (and marks it recently used), or None."""
+    cache_path = cache_path or SUMMARY_CACHE_PATH
+    with _cache_lock:
+        try:
+            with _open_cache(cache_path) as connection:
+                row = connection.execute("SELECT value FROM summary_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+                if row is not None:
+                    connection.execute("UPDATE summary_cache SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+        except (sqlite3.Error, OSError) as e_cache:
+            _cache_stats['errors'] += 1
+            print(f"[SUMMARY_CACHE] Lookup failed: {e_cache}")
+            return None
+        if row is None:
+            _cache_stats['misses'] += 1
+            return None
+        _cache_stats['hits'] += 1
+    return json.loads(row[0])
+
+
+def store_result(cache_key, value, cache_path=None, max_bytes=None):
+    """Stores value under cache_key, then evicts least recently used entries beyond max_bytes."""
+    cache_path = cache_path or SUMMARY_CACHE_PATH
+    max_bytes = max_bytes or SUMMARY_CACHE_MAX_BYTES
+    value_json = json.dumps(value)
+    with _cache_lock:
+        try:
+            with _open_cache(cache_path) as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO summary_cache (cache_key, value, size_bytes, last_access) VALUES (?, ?, ?, ?)",
+                    (cache_key, value_json, len(value_json), time.time()))
+                _cache_stats['writes'] += 1
+                total_bytes = connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM summary_cache").fetchone()[0]
+                if total_bytes > max_bytes:
+                    evicted_count = 0
+                    for evict_key, size_bytes in connection.execute(
+                            "SELECT cache_key, size_bytes FROM summary_cache ORDER BY last_access ASC").fetchall():
+                        if total_bytes <= max_bytes:
+                            break
+                        connection.execute("DELETE FROM summary_cache WHERE cache_key = ?", (evict_key,))
+                        total_bytes -= size_bytes
+                        evicted_count += 1
+                    _cache_stats['evictions'] += evicted_count
+                    print(f"[SUMMARY_CACHE] Evicted {evicted_count} least recently used entries ({total_bytes} bytes kept).")
+        except (sqlite3.Error, OSError) as e_cache:
+            _cache_stats['errors'] += 1
+            print(f"[SUMMARY_CACHE] Write failed: {e_cache}")
+
+
+def get_cache_stats():
+    with _cache_lock:
+        return dict(_cache_stats)
+
+
+def clear_cache(cache_path=None):
+    cache_path = cache_path or SUMMARY_CACHE_PATH
+    with _cache_lock:
+        with _open_cache(cache_path) as connection:
+            connection.execute("DELETE FROM summary_cache")
@@ -0,0 +1,141 @@
+"""
+Summary metrics computed from per-sentence statistics.
+
+Every candidate summary is a subset of the SentenceStore's sentences, joined by single
+spaces, and the reference is the whole store. ROUGE tokens, textstat word and syllable
+counts and textstat's sentence fragments are all additive over space-joined sentences, so
+SummaryMetricsEngine computes them once per sentence and then derives each candidate's
+metrics by aggregating over its sentence ids. The results equal calculate_all_metrics on
+the joined summary text (same ROUGE tokenizer, same textstat counting and rounding).
+"""
+import re
+import math
+
+import textstat
+
+import fast_rouge
+
+# textstat's English Flesch Reading Ease constants
+FLESCH_BASE = 206.835
+FLESCH_SENTENCE_LENGTH_WEIGHT = 1.015
+FLESCH_SYLLABLES_PER_WORD_WEIGHT = 84.6
+TEXTSTAT_SENTENCE_PATTERN = re.compile(r'\b[^.!?]+[.!?]*', re.UNICODE) # textstat.sentence_count's pattern
+TERMINAL_PUNCTUATION = frozenset(".!?")
+MIN_WORDS_FOR_TEXTSTAT_SENTENCE = 3 # textstat ignores "sentences" of two words or fewer
+
+
+def _textstat_round(number, points):
+    # textstat's (legacy) output rounding: half away from zero
+    p = 10 ** points
+    return float(math.floor((number * p) + math.copysign(0.5, number))) / p
+
+def _lexicon_count(text):
+    return len(textstat.remove_punctuation(text).split())
+
+def _syllable_count(text):
+    return sum(len(textstat.pyphen.positions(word)) + 1 for word in textstat.remove_punctuation(text.lower()).split())
+
+
+class SentenceFragments:
+    """
+    How textstat.sentence_count's regex splits one sentence, plus what it needs to know to
+    merge the sentence with its neighbours: a fragment that does not end in . ! or ? runs on
+    into the next sentence until that sentence's first terminal punctuation.
+    """
+    def __init__(self, sentence_text):
+        matches = list(TEXTSTAT_SENTENCE_PATTERN.finditer(sentence_text))
+        self.fragment_texts = [m.group(0) for m in matches]
+        self.fragment_word_counts = [_lexicon_count(text) for text in self.fragment_texts]
+        # Text a run-on fragment from the previous sentence absorbs: everything up to the end of the first fragment
+        if matches:
+            self.head_text = sentence_text[:matches[0].end()]
+            self.head_closed_early = any(c in TERMINAL_PUNCTUATION for c in sentence_text[:matches[0].start()])
+            self.trailing_open = not matches[-1].group(0)[-1] in TERMINAL_PUNCTUATION
+        else:
+            self.head_text = sentence_text
+            self.head_closed_early = any(c in TERMINAL_PUNCTUATION for c in sentence_text)
+            self.trailing_open = not self.head_closed_early
+
+
+class SummaryMetricsEngine:
+    """Per-sentence statistics of one SentenceStore, aggregated per candidate summary."""
+    def __init__(self, sentence_store):
+        self.sentence_store = sentence_store
+        self.reference_length = len(sentence_store.buffer)
+        self.sentence_lengths = sentence_store.lengths
+        self.sentence_tokens = []
+        self.sentence_word_counts = []
+        self.sentence_syllable_counts = []
+        self.sentence_fragments = []
+        for sentence_text in sentence_store.sentences():
+            self.sentence_tokens.append(fast_rouge.tokenize(sentence_text))
+            self.sentence_word_counts.append(_lexicon_count(sentence_text))
+            self.sentence_syllable_counts.append(_syllable_count(sentence_text))
+            self.sentence_fragments.append(SentenceFragments(sentence_text))
+        reference_tokens = [token for tokens in self.sentence_tokens for token in tokens]
+        self.rouge_reference = fast_rouge.RougeReference(sentence_store.buffer, tokens=reference_tokens)
+
+    def textstat_sentence_count(self, sentence_ids):
+        """textstat.sentence_count of the space-joined sentences, walked fragment by fragment."""
+        counted_count = 0
+        ignored_count = 0
+        open_fragment_text = None # A fragment of the previous sentence still running on
+
+        def close_fragment(word_count):
+            nonlocal counted_count, ignored_count
+            counted_count += 1
+            if word_count < MIN_WORDS_FOR_TEXTSTAT_SENTENCE:
+                ignored_count += 1
+
+        for sentence_id in sentence_ids:
+            fragments = self.sentence_fragments[sentence_id]
+            word_counts = fragments.fragment_word_counts
+            first_own_fragment = 0
+            if open_fragment_text is not None:
+                if fragments.head_closed_early:
+                    close_fragment(_lexicon_count(open_fragment_text))
+                    open_fragment_text = None
+                elif word_counts:
+                    open_fragment_text = open_fragment_text + " " + fragments.head_text
+                    first_own_fragment = 1
+                    if len(word_counts) > 1 or not fragments.trailing_open:
+                        close_fragment(_lexicon_count(open_fragment_text))
+                        open_fragment_text = None
+                else:
+                    # Nothing but non-word, non-terminal characters: the run-on fragment continues through it
+                    open_fragment_text = open_fragment_text + " " + fragments.head_text
+                    continue
+            last_fragment = len(word_counts) - 1
+            for fragment_index in range(first_own_fragment, len(word_counts)):
+                if fragment_index == last_fragment and fragments.trailing_open:
+                    open_fragment_text = fragments.fragment_texts[fragment_index]
+                else:
+                    close_fragment(word_counts[fragment_index])
+        if open_fragment_text is not None:
+            close_fragment(_lexicon_count(open_fragment_text))
+        return max(1, counted_count - ignored_count)
+
+    def readability_score(self, sentence_ids):
+        """textstat.flesch_reading_ease of the space-joined sentences."""
+        word_count = sum(self.sentence_word_counts[i] for i in sentence_ids)
+        if not word_count:
+            sentence_length = syllables_per_word = 0.0
+        else:
+            sentence_length = _textstat_round(float(word_count / self.textstat_sentence_count(sentence_ids)), 1)
+            syllables_per_word = _textstat_round(float(sum(self.sentence_syllable_counts[i] for i in sentence_ids)) / float(word_count), 1)
+        flesch = FLESCH_BASE - float(FLESCH_SENTENCE_LENGTH_WEIGHT * sentence_length) - float(FLESCH_SYLLABLES_PER_WORD_WEIGHT * syllables_per_word)
+        return _textstat_round(flesch, 2)
+
+    def metrics_for(self, sentence_ids):
+        """Same dict as summarizer.calculate_all_metrics(store.text(sentence_ids), store.text())."""
+        sentence_ids = list(sentence_ids)
+        if not sentence_ids:
+            return {'rouge_scores': {'rouge1': 0, 'rouge2': 0, 'rougeL': 0}, 'compression_ratio': 1.0, 'readability_score': 0, 'f1_score_rougeL': 0, 'summary_sentence_count': 0}
+        hypothesis_tokens = [token for i in sentence_ids for token in self.sentence_tokens[i]]
+        rouge_scores_val = self.rouge_reference.score_tokens(hypothesis_tokens)
+        summary_length = sum(self.sentence_lengths[i] for i in sentence_ids) + len(sentence_ids) - 1
+        compression_ratio_val = summary_length / self.reference_length if self.reference_length > 0 else 1.0
+        try: readability_score_val = self.readability_score(sentence_ids)
+        except Exception: readability_score_val = 0
+        return {'rouge_scores': rouge_scores_val, 'compression_ratio': compression_ratio_val, 'readability_score': readability_score_val,
+                'f1_score_rougeL': rouge_scores_val['rougeL'], 'summary_sentence_count': len(sentence_ids)}
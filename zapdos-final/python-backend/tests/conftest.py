@@ -0,0 +1,12 @@
+"""
+Shared setup for the backend tests. Run from zapdos-final/python-backend:
+    python -m pytest tests
+The backend modules are flat (imported by name, as app.py does), and the synthetic study
+material from benchmarks/ is reused for test documents.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
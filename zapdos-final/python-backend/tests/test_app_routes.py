@@ -0,0 +1,178 @@
+import io
+import json
+import random
+import re
+import threading
+import types
+
+import pytest
+
+import app
+import flashcard_jobs
+import llm_cache
+import summarizer
+import synthetic_documents
+import upload_cache
+
+
+class FakeCompletions:
+    """Stands in for openai_client.chat.completions: a few questions per call, built from the prompt's own text."""
+    def __init__(self):
+        self.calls_count = 0
+        self._lock = threading.Lock()
+
+    def make_response_text(self, messages):
+        prompt = messages[-1]["content"]
+        question_type = re.search(r'Generate questions of type: "([^"]+)"', prompt).group(1)
+        text_content = prompt.split("---\n")[1]
+        sentences = [sentence for sentence in text_content.split(". ") if len(sentence.split()) > 4][:3]
+        questions = [{"question_type": question_type, "question": f"Explain: {sentence.strip()}?", "answer": sentence.split()[0],
+                      "options": [sentence.split()[0], "None", "All", "Neither"] if question_type == "MCQs" else None, "source_page": "1"}
+                     for sentence in sentences]
+        return json.dumps({"questions": questions}, indent=2)
+
+    def create(self, model, messages, stream=False, **request_options):
+        with self._lock:
+            self.calls_count += 1
+        response_text = self.make_response_text(messages)
+        if stream:
+            return FakeStream(response_text)
+        message = types.SimpleNamespace(content=response_text)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+class FakeStream:
+    def __init__(self, response_text):
+        self.response_text = response_text
+
+    def __iter__(self):
+        for start in range(0, len(self.response_text), 40):
+            delta = types.SimpleNamespace(content=self.response_text[start:start + 40])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+        yield types.SimpleNamespace(choices=[], usage=types.SimpleNamespace(total_tokens=100))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_completions(tmp_path, monkeypatch):
+    fake_completions = FakeCompletions()
+    monkeypatch.setattr(app, "openai_client", types.SimpleNamespace(chat=types.SimpleNamespace(completions=fake_completions)))
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(upload_cache, "UPLOAD_CACHE_PATH", str(tmp_path / "upload_cache.sqlite3"))
+    monkeypatch.setattr(summarizer, "SUMMARY_CACHE_ENABLED", False)
+    monkeypatch.setattr(summarizer, "SUMMARIZER_EVALUATION_MODE", "sequential")
+    return fake_completions
+
+
+@pytest.fixture(scope="module")
+def pdf_bytes(tmp_path_factory):
+    rng = random.Random(0)
+    pages = [(synthetic_documents.make_content_page(rng, page_num, sentences_count=12), page_num) for page_num in range(1, 7)]
+    pdf_path = tmp_path_factory.mktemp("upload") / "handout.pdf"
+    synthetic_documents.write_synthetic_pdf(pages, str(pdf_path))
+    return pdf_path.read_bytes()
+
+
+def post_upload(client, route, pdf_bytes, question_types, **post_options):
+    form_data = {'file': (io.BytesIO(pdf_bytes), "handout.pdf"), 'question_type': question_types}
+    return client.post(route, data=form_data, content_type='multipart/form-data', **post_options)
+
+
+def test_sync_route_does_not_wait_for_the_job_pool(fake_completions, pdf_bytes):
+    release_jobs = threading.Event()
+    upload_workers_count = flashcard_jobs.FLASHCARD_JOB_MAX_WORKERS_BY_KIND['upload']
+    blocking_jobs = [flashcard_jobs.submit_job(lambda report_progress: release_jobs.wait(30)) for _ in range(upload_workers_count)]
+    try:
+        submitted_before = flashcard_jobs.get_job_stats()['submitted']
+        response = post_upload(app.app.test_client(), '/api/generate-flashcards', pdf_bytes, "MCQs")
+        assert response.status_code == 200
+        assert response.get_json()["questions"]
+        assert flashcard_jobs.get_job_stats()['submitted'] == submitted_before
+    finally:
+        release_jobs.set()
+    assert all(blocking_job.wait(5) for blocking_job in blocking_jobs)
+
+
+def test_sync_route_reports_request_errors(fake_completions):
+    response = app.app.test_client().post('/api/generate-flashcards', data={'question_type': "MCQs"}, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "No file part"}
+
+
+def test_single_question_type_keeps_the_questions_shape(fake_completions, pdf_bytes):
+    response = post_upload(app.app.test_client(), '/api/generate-flashcards', pdf_bytes, "MCQs")
+    assert response.status_code == 200
+    response_json = response.get_json()
+    assert list(response_json) == ["questions"]
+    assert response_json["questions"] and all(question["question_type"] == "MCQs" for question in response_json["questions"])
+
+
+def test_several_question_types_come_back_by_type(fake_completions, pdf_bytes):
+    # Repeated fields and comma-separated lists both work; repeats are dropped
+    response = post_upload(app.app.test_client(), '/api/generate-flashcards', pdf_bytes, ["MCQs, Short Answer", "MCQs"])
+    assert response.status_code == 200
+    response_json = response.get_json()
+    assert list(response_json) == ["questions_by_type"]
+    questions_by_type = response_json["questions_by_type"]
+    assert sorted(questions_by_type) == ["MCQs", "Short Answer"]
+    for question_type, questions in questions_by_type.items():
+        assert questions and all(question["question_type"] == question_type for question in questions)
+    assert fake_completions.calls_count == 2 # One call per type for the single chunk
+
+
+def test_repeat_upload_reuses_the_filtered_pages(fake_completions, pdf_bytes, monkeypatch):
+    client = app.app.test_client()
+    first_response = post_upload(client, '/api/generate-flashcards', pdf_bytes, "MCQs")
+    filtered_hits_before = upload_cache.get_cache_stats()['filtered_hits']
+
+    def fail_to_open_pages(*args, **kwargs):
+        raise AssertionError("The pages should not be read again")
+
+    monkeypatch.setattr(upload_cache, "open_pdf_page_texts", fail_to_open_pages)
+    second_response = post_upload(client, '/api/generate-flashcards', pdf_bytes, "MCQs")
+    assert second_response.status_code == 200
+    assert upload_cache.get_cache_stats()['filtered_hits'] == filtered_hits_before + 1
+    assert ([question["question"] for question in second_response.get_json()["questions"]]
+            == [question["question"] for question in first_response.get_json()["questions"]])
+
+
+def read_stream_events(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line.strip()]
+
+
+def test_stream_route_sends_events_in_order_and_ends_with_done(fake_completions, pdf_bytes, monkeypatch):
+    monkeypatch.setattr(app, "STREAM_PROGRESS_MIN_INTERVAL_SECONDS", 60)
+    response = post_upload(app.app.test_client(), '/api/generate-flashcards/stream', pdf_bytes, "MCQs,Short Answer")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    events = read_stream_events(response)
+
+    assert events[0]["event"] == "job"
+    assert events[-1] == {"event": "done", "questions_total": sum(len(event["questions"]) for event in events if event["event"] == "questions")}
+    assert [event["event"] for event in events].count("done") == 1
+    assert {event["event"] for event in events[1:-1]} == {"progress", "questions"}
+    # Throttled: one event per stage (the PDF has a progress update per page)
+    progress_stages = [event["stage"] for event in events if event["event"] == "progress"]
+    assert progress_stages == ["extraction_and_summarization", "chunking", "question_generation"]
+    first_questions_index = next(index for index, event in enumerate(events) if event["event"] == "questions")
+    assert events.index({"event": "progress", "stage": "question_generation", "calls_done": 0, "calls_total": 2}) < first_questions_index
+    assert flashcard_jobs.get_job(events[0]["job_id"]) is None
+
+
+def test_stream_route_cancels_the_job_when_the_client_leaves(fake_completions, pdf_bytes):
+    release_calls = threading.Event()
+    make_response_text = fake_completions.make_response_text
+    fake_completions.make_response_text = lambda messages: release_calls.wait(10) and make_response_text(messages)
+    response = post_upload(app.app.test_client(), '/api/generate-flashcards/stream', pdf_bytes, "MCQs", buffered=False)
+    job_event = json.loads(next(response.response))
+    job = flashcard_jobs.get_job(job_event["job_id"])
+    cancelled_before = flashcard_jobs.get_job_stats()['cancelled']
+
+    response.close() # What the server does when the client disconnects
+    assert flashcard_jobs.get_job(job.job_id) is None
+    release_calls.set()
+    assert job.wait(10)
+    assert job.status == flashcard_jobs.JOB_STATUS_CANCELLED
+    assert flashcard_jobs.get_job_stats()['cancelled'] == cancelled_before + 1
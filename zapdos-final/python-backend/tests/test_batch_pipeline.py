@@ -0,0 +1,60 @@
+import threading
+import time
+
+import batch_pipeline
+
+
+def test_results_come_back_in_item_order_and_failures_stay_per_item():
+    def prepare_function(item):
+        if item == "bad upload":
+            raise ValueError("no text")
+        time.sleep(0.01 * (5 - len(item) % 5)) # Finish out of order
+        return item.upper()
+
+    def generate_function(item, prepared):
+        if item == "rate limited":
+            raise RuntimeError("429")
+        return f"questions for {prepared}"
+
+    items = ["a.pdf", "bad upload", "b.png", "rate limited", "c.pdf"]
+    results = batch_pipeline.run_staged_batch(items, prepare_function, generate_function)
+    assert [result for result, _ in results] == ["questions for A.PDF", None, "questions for B.PNG", None, "questions for C.PDF"]
+    assert [type(exception).__name__ if exception else None for _, exception in results] == [None, "ValueError", None, "RuntimeError", None]
+
+
+def test_every_item_is_reported_before_the_batch_returns():
+    finished_items = {}
+
+    def on_item_finished(item_index, result, exception):
+        time.sleep(0.01)
+        finished_items[item_index] = (result, exception)
+
+    results = batch_pipeline.run_staged_batch(list(range(6)), lambda item: item, lambda item, prepared: prepared * 10, on_item_finished)
+    assert finished_items == dict(enumerate(results))
+
+
+def test_a_failing_callback_does_not_lose_results():
+    def on_item_finished(item_index, result, exception):
+        raise RuntimeError("callback bug")
+
+    results = batch_pipeline.run_staged_batch([1, 2], lambda item: item, lambda item, prepared: prepared + 1, on_item_finished)
+    assert results == [(2, None), (3, None)]
+
+
+def test_items_start_generating_before_the_whole_batch_is_prepared():
+    first_item_generating = threading.Event()
+    overlap_seen = []
+
+    def prepare_function(item):
+        if item == batch_pipeline.BATCH_PREPARATION_MAX_WORKERS: # Only gets a slot once an earlier item is prepared
+            overlap_seen.append(first_item_generating.wait(5))
+        return item
+
+    def generate_function(item, prepared):
+        if item == 0:
+            first_item_generating.set()
+        return prepared
+
+    items = list(range(batch_pipeline.BATCH_PREPARATION_MAX_WORKERS + 1))
+    assert batch_pipeline.run_staged_batch(items, prepare_function, generate_function) == [(item, None) for item in items]
+    assert overlap_seen == [True]
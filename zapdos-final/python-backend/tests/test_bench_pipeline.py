@@ -0,0 +1,21 @@
+import app
+import bench_pipeline
+import summarizer
+
+
+def test_small_benchmark_runs_every_stage_and_agrees_with_the_pipeline(monkeypatch):
+    # run_single_benchmark stubs these module-wide; monkeypatch puts them back afterwards
+    monkeypatch.setattr(app, "openai_client", app.openai_client)
+    monkeypatch.setattr(app.llm_cache, "LLM_CACHE_ENABLED", app.llm_cache.LLM_CACHE_ENABLED)
+    for setting_name in ("SUMMARY_CACHE_ENABLED", "SUMMARIZER_EVALUATION_MODE", "SUMMARIZER_PIPELINE_DEADLINE_SECONDS"):
+        monkeypatch.setattr(summarizer, setting_name, getattr(summarizer, setting_name))
+
+    benchmark_result = bench_pipeline.run_single_benchmark(10)
+    expected_stages = (['extraction', 'boilerplate_filter', 'sentence_split', 'parse']
+                       + [f'summarizer_{method_name}' for method_name in bench_pipeline.SUMMARIZER_METHODS]
+                       + ['metrics_engine_build', 'metrics_candidates', 'metrics_per_summary_reference', 'chunking', 'llm_stub', 'pipeline_end_to_end'])
+    assert list(benchmark_result['stages']) == expected_stages
+    assert not [stage_name for stage_name, stage_result in benchmark_result['stages'].items() if 'error' in stage_result]
+    assert benchmark_result['content_pages'] < benchmark_result['pages'] # The synthetic front and back matter is filtered out
+    assert benchmark_result['pipeline_method'] in bench_pipeline.SUMMARIZER_METHODS
+    assert benchmark_result['pipeline_matches_stages']
@@ -0,0 +1,37 @@
+import random
+
+import pytest
+
+import summarizer
+import synthetic_documents
+
+
+def classify_each_page(pages, total_pages):
+    return [summarizer.is_likely_boilerplate_page(page_text, page_num, total_pages) for page_text, page_num in pages]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_compiled_classifier_agrees_with_the_per_page_rules(seed):
+    pages = synthetic_documents.make_synthetic_pages(120, seed=seed)
+    flags = summarizer.classify_boilerplate_pages(pages, len(pages))
+    assert flags == classify_each_page(pages, len(pages))
+    assert 0 < sum(flags) < len(pages)
+
+
+def test_compiled_classifier_agrees_on_edge_cases():
+    rng = random.Random(0)
+    long_body = synthetic_documents.make_content_page(rng, 50, sentences_count=30)
+    pages = [
+        ("Introduction\n" + long_body, 50), # A long "Introduction" chapter mid-document is content...
+        ("Introduction\nA short opening note.", 2), # ...a short one near the front is not
+        ("CONTENTS (iv)\nCells ..... 1\nTissues ..... 9", 3),
+        ("Chapter one .... 1\nChapter two .... 7\nChapter three .... 15\nChapter four .... 21\nAppendix .... 30", 4),
+        ("Some closing words.\nSee the index for terms.", 99),
+        ("Printed in 2020.\nISBN 978-0-00-000000-0\n" + long_body, 60),
+        ("  references  \n[1] A. Author, A Book.", 70),
+        (long_body, 40),
+        ("", 41),
+    ]
+    flags = summarizer.classify_boilerplate_pages(pages, 100)
+    assert flags == classify_each_page(pages, 100)
+    assert flags == [False, True, True, True, True, True, True, False, False]
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+from rouge_score import rouge_scorer
+
+import fast_rouge
+import synthetic_documents
+
+ROUGE_TYPES = ['rouge1', 'rouge2', 'rougeL']
+
+
+def get_rouge_score_scores(reference_text, hypothesis_text):
+    scores = rouge_scorer.RougeScorer(ROUGE_TYPES, use_stemmer=True).score(reference_text, hypothesis_text)
+    return {rouge_type: scores[rouge_type].fmeasure for rouge_type in ROUGE_TYPES}
+
+
+def get_lcs_length_by_table(first_tokens, second_tokens):
+    previous_row = [0] * (len(second_tokens) + 1)
+    for first_token in first_tokens:
+        current_row = [0]
+        for j, second_token in enumerate(second_tokens):
+            current_row.append(previous_row[j] + 1 if first_token == second_token else max(previous_row[j + 1], current_row[j]))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_bit_parallel_lcs_matches_the_dynamic_programming_table(seed):
+    rng = random.Random(seed)
+    alphabet = "abcde"[:rng.randint(1, 5)]
+    reference_tokens = [rng.choice(alphabet) for _ in range(rng.randint(0, 120))]
+    hypothesis_tokens = [rng.choice(alphabet + "z") for _ in range(rng.randint(0, 60))]
+    reference = fast_rouge.RougeReference(" ".join(reference_tokens), tokens=reference_tokens)
+    assert reference.lcs_length(hypothesis_tokens) == get_lcs_length_by_table(reference_tokens, hypothesis_tokens)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_scores_match_rouge_score_on_summaries(seed):
+    rng = random.Random(seed)
+    reference_sentences = [synthetic_documents.make_synthetic_text(1, seed=seed * 100 + i) for i in range(40)]
+    reference_text = " ".join(reference_sentences)
+    hypothesis_text = " ".join(rng.sample(reference_sentences, 8))
+    fast_scores = fast_rouge.RougeReference(reference_text).score(hypothesis_text)
+    assert fast_scores == pytest.approx(get_rouge_score_scores(reference_text, hypothesis_text), abs=1e-12)
+
+
+@pytest.mark.parametrize("reference_text, hypothesis_text", [
+    ("The cells' mitochondria (powerhouses!) produce ATP; ATP fuels cells.", "Mitochondria produce ATP for the cell."),
+    ("Running runners ran quickly; they were running.", "The runner runs."),
+    ("Café naïve résumé — 3.14 and 2nd-order terms", "cafe resume 3 14 order"),
+    ("a an the of to", "a the"),
+    ("Photosynthesis converts light energy.", ""),
+    ("", "Anything at all."),
+])
+def test_scores_match_rouge_score_on_edge_cases(reference_text, hypothesis_text):
+    fast_scores = fast_rouge.RougeReference(reference_text).score(hypothesis_text)
+    assert fast_scores == pytest.approx(get_rouge_score_scores(reference_text, hypothesis_text), abs=1e-12)
+
+
+def test_reference_is_reused_for_the_same_text():
+    reference_text = synthetic_documents.make_synthetic_text(10, seed=1)
+    assert fast_rouge.get_reference(reference_text) is fast_rouge.get_reference(reference_text)
+    assert fast_rouge.get_reference(reference_text + " More.") is not fast_rouge.get_reference(reference_text)
@@ -0,0 +1,105 @@
+import threading
+
+import flashcard_jobs
+
+
+def test_job_records_its_stages_and_result():
+    release_job = threading.Event()
+
+    def job_function(report_progress):
+        report_progress("extracting", pages_total=3)
+        report_progress("generating", chunks_total=2, chunks_done=0)
+        report_progress("generating", chunks_done=1)
+        release_job.wait(5)
+        return {"questions": ["Q1"]}
+
+    job = flashcard_jobs.submit_job(job_function, description={"filename": "notes.pdf"})
+    assert flashcard_jobs.get_job(job.job_id) is job
+    release_job.set()
+    assert job.wait(5)
+
+    job_dict = job.to_dict()
+    assert job_dict['status'] == flashcard_jobs.JOB_STATUS_SUCCEEDED
+    assert job_dict['filename'] == "notes.pdf"
+    assert job_dict['result'] == {"questions": ["Q1"]}
+    assert job_dict['current_stage'] is None
+    assert [stage['name'] for stage in job_dict['stages']] == ["extracting", "generating"]
+    assert all(stage['status'] == "done" and stage['seconds'] is not None for stage in job_dict['stages'])
+    assert job_dict['stages'][1]['chunks_done'] == 1 and job_dict['stages'][1]['chunks_total'] == 2
+    assert 'result' not in job.to_dict(include_result=False)
+
+
+def test_failed_job_uses_the_error_handler():
+    def job_function(report_progress):
+        report_progress("extracting")
+        raise ValueError("no text")
+
+    job = flashcard_jobs.submit_job(job_function, error_handler=lambda e: (f"Bad upload: {e}", 422))
+    assert job.wait(5)
+    job_dict = job.to_dict()
+    assert job_dict['status'] == flashcard_jobs.JOB_STATUS_FAILED
+    assert job_dict['error'] == "Bad upload: no text"
+    assert 'result' not in job_dict
+    assert job.error_status_code == 422
+    assert job_dict['stages'][-1]['status'] == flashcard_jobs.JOB_STATUS_FAILED
+
+
+def test_finished_jobs_expire_and_can_be_discarded(monkeypatch):
+    finished_job = flashcard_jobs.submit_job(lambda report_progress: "done")
+    discarded_job = flashcard_jobs.submit_job(lambda report_progress: "done")
+    assert finished_job.wait(5) and discarded_job.wait(5)
+
+    flashcard_jobs.discard_job(discarded_job.job_id)
+    assert flashcard_jobs.get_job(discarded_job.job_id) is None
+
+    expired_before = flashcard_jobs.get_job_stats()['expired']
+    monkeypatch.setattr(flashcard_jobs, "FLASHCARD_JOB_TTL_SECONDS", -1)
+    assert flashcard_jobs.cleanup_expired_jobs(force=True) >= 1
+    assert flashcard_jobs.get_job(finished_job.job_id) is None
+    job_stats = flashcard_jobs.get_job_stats()
+    assert job_stats['expired'] > expired_before
+    assert job_stats['stored'] == 0
+
+
+def test_running_batch_jobs_do_not_hold_up_upload_jobs():
+    release_batches = threading.Event()
+    batch_jobs = [flashcard_jobs.submit_job(lambda report_progress: release_batches.wait(5), job_kind="batch")
+                  for _ in range(flashcard_jobs.FLASHCARD_JOB_MAX_WORKERS_BY_KIND['batch'] + 1)]
+    try:
+        upload_job = flashcard_jobs.submit_job(lambda report_progress: "done")
+        assert upload_job.wait(5) and upload_job.result == "done"
+        assert batch_jobs[-1].status == flashcard_jobs.JOB_STATUS_QUEUED # Waits for a batch worker, not an upload one
+    finally:
+        release_batches.set()
+    assert all(batch_job.wait(5) for batch_job in batch_jobs)
+
+
+def test_submitting_starts_the_background_sweep():
+    assert flashcard_jobs.submit_job(lambda report_progress: "done").wait(5)
+    assert flashcard_jobs._cleanup_thread.is_alive() and flashcard_jobs._cleanup_thread.daemon
+
+
+def test_cancelled_job_stops_at_its_next_progress_report():
+    job_started = threading.Event()
+    release_job = threading.Event()
+    stages_reached = []
+
+    def job_function(report_progress):
+        report_progress("extracting")
+        stages_reached.append("extracting")
+        job_started.set()
+        release_job.wait(5)
+        report_progress("generating")
+        stages_reached.append("generating")
+        return "done"
+
+    job = flashcard_jobs.submit_job(job_function)
+    assert job_started.wait(5)
+    job.cancel()
+    release_job.set()
+    assert job.wait(5)
+    assert stages_reached == ["extracting"]
+    job_dict = job.to_dict()
+    assert job_dict['status'] == flashcard_jobs.JOB_STATUS_CANCELLED
+    assert job_dict['error'] and 'result' not in job_dict
+    assert job_dict['stages'][-1]['status'] == flashcard_jobs.JOB_STATUS_CANCELLED
@@ -0,0 +1,62 @@
+import random
+
+import numpy
+import pytest
+
+import summarizer
+import graph_ranking
+import synthetic_documents
+from sentence_store import SentenceStore
+
+pytestmark = pytest.mark.skipif(not graph_ranking.is_available(), reason="graph_ranking needs scipy")
+
+
+def make_parsed_document(seed, pages_count=4):
+    rng = random.Random(seed)
+    sentence_store = SentenceStore()
+    for page_num in range(1, pages_count + 1):
+        sentence_store.add_page(synthetic_documents.make_content_page(rng, page_num, sentences_count=20), page_num)
+    return summarizer.ParsedDocument(sentence_store=sentence_store)
+
+
+def get_sumy_lexrank_scores(parsed_document):
+    sumy_lexrank = summarizer.SharedLexRankSummarizer(parsed_document)
+    sentences_words = parsed_document.sentence_content_stems
+    matrix = sumy_lexrank._create_matrix(sentences_words, sumy_lexrank.threshold,
+                                         sumy_lexrank._compute_tf(sentences_words), sumy_lexrank._compute_idf(sentences_words))
+    return numpy.asarray(sumy_lexrank.power_method(matrix, sumy_lexrank.epsilon))
+
+
+def get_sumy_textrank_scores(parsed_document):
+    sentence_ratings = summarizer.SharedTextRankSummarizer(parsed_document).rate_sentences(parsed_document.document)
+    return numpy.array([sentence_ratings[sentence] for sentence in parsed_document.sentences])
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_lexrank_scores_match_sumy(seed):
+    parsed_document = make_parsed_document(seed)
+    scores = graph_ranking.lexrank_scores(parsed_document.sentence_term_counts)
+    numpy.testing.assert_allclose(scores, get_sumy_lexrank_scores(parsed_document), rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_textrank_scores_match_sumy(seed):
+    parsed_document = make_parsed_document(seed)
+    scores = graph_ranking.textrank_scores(parsed_document.sentence_term_counts)
+    numpy.testing.assert_allclose(scores, get_sumy_textrank_scores(parsed_document), rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("summarizer_type_str", ["lexrank", "textrank"])
+def test_sparse_backend_picks_the_same_sentences(monkeypatch, summarizer_type_str):
+    parsed_document = make_parsed_document(7, pages_count=6)
+    monkeypatch.setattr(summarizer, "GRAPH_RANKING_BACKEND", "sparse")
+    sparse_ids = summarizer.get_summary_sentence_ids(parsed_document, summarizer_type_str, 12)
+    monkeypatch.setattr(summarizer, "GRAPH_RANKING_BACKEND", "sumy")
+    assert sparse_ids == summarizer.get_summary_sentence_ids(parsed_document, summarizer_type_str, 12)
+
+
+def test_similarity_blocks_do_not_change_the_scores(monkeypatch):
+    parsed_document = make_parsed_document(2)
+    whole_scores = graph_ranking.textrank_scores(parsed_document.sentence_term_counts)
+    monkeypatch.setattr(graph_ranking, "SIMILARITY_BLOCK_ROWS", 7)
+    numpy.testing.assert_allclose(graph_ranking.textrank_scores(parsed_document.sentence_term_counts), whole_scores, rtol=1e-12)
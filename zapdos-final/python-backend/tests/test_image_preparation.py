@@ -0,0 +1,58 @@
+import io
+import base64
+
+import pytest
+from PIL import Image
+
+import app
+import image_preparation
+
+
+def make_image_bytes(size, image_format, mode="RGB"):
+    image_buffer = io.BytesIO()
+    Image.new(mode, size, "white").save(image_buffer, format=image_format)
+    return image_buffer.getvalue()
+
+
+def test_target_size_fits_the_vision_limits_without_upscaling():
+    assert image_preparation.get_target_size(4000, 3000) == (1024, 768)
+    assert image_preparation.get_target_size(600, 400) == (600, 400)
+
+
+def test_large_photo_is_scaled_down_to_jpeg():
+    prepared_image = image_preparation.prepare_image_bytes(make_image_bytes((4000, 3000), "BMP"))
+    assert prepared_image.mime_type == "image/jpeg"
+    with Image.open(io.BytesIO(prepared_image.image_bytes)) as prepared:
+        assert prepared.size == (1024, 768)
+
+
+def test_small_png_is_sent_unchanged():
+    original_bytes = make_image_bytes((64, 64), "PNG")
+    assert image_preparation.prepare_image_bytes(original_bytes) == image_preparation.PreparedImage(original_bytes, "image/png")
+
+
+def test_decompression_bomb_is_rejected(tmp_path, monkeypatch):
+    image_path = tmp_path / "bomb.png"
+    image_path.write_bytes(make_image_bytes((200, 200), "PNG"))
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000) # 200 x 200 is over twice that, so PIL refuses it
+
+    with pytest.raises(app.FlashcardRequestError) as raised:
+        app.image_to_base64_data_url(str(image_path))
+    assert raised.value.status_code == 413
+
+
+def test_undecodable_image_falls_back_to_the_original_file(tmp_path):
+    image_path = tmp_path / "scan.png"
+    original_bytes = b"not really a png" * 10
+    image_path.write_bytes(original_bytes)
+    data_url = app.image_to_base64_data_url(str(image_path))
+    assert data_url == "data:image/png;base64," + base64.b64encode(original_bytes).decode("utf-8")
+
+
+def test_oversized_undecodable_image_is_rejected(tmp_path, monkeypatch):
+    image_path = tmp_path / "scan.png"
+    image_path.write_bytes(b"not really a png" * 10)
+    monkeypatch.setattr(app, "OPENAI_VISION_MAX_IMAGE_BYTES", 100)
+    with pytest.raises(app.FlashcardRequestError) as raised:
+        app.image_to_base64_data_url(str(image_path))
+    assert raised.value.status_code == 413
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+import llm_cache
+
+MESSAGES = [{"role": "system", "content": "Write questions."}, {"role": "user", "content": "Cells divide."}]
+
+
+@pytest.fixture(autouse=True)
+def temporary_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+
+
+def test_key_depends_on_every_part_of_the_request():
+    cache_key = llm_cache.make_cache_key("gpt-x", MESSAGES, 1, temperature=0.2, max_tokens=500, top_p=1)
+    assert cache_key == llm_cache.make_cache_key("gpt-x", [dict(m) for m in MESSAGES], 1, temperature=0.2, top_p=1, max_tokens=500)
+    assert cache_key != llm_cache.make_cache_key("gpt-y", MESSAGES, 1, temperature=0.2, max_tokens=500, top_p=1)
+    assert cache_key != llm_cache.make_cache_key("gpt-x", MESSAGES[:1], 1, temperature=0.2, max_tokens=500, top_p=1)
+    assert cache_key != llm_cache.make_cache_key("gpt-x", MESSAGES, 2, temperature=0.2, max_tokens=500, top_p=1)
+    assert cache_key != llm_cache.make_cache_key("gpt-x", MESSAGES, 1, temperature=0.7, max_tokens=500, top_p=1)
+    assert cache_key != llm_cache.make_cache_key("gpt-x", MESSAGES, 1, temperature=0.2, max_tokens=400, top_p=1)
+
+
+def test_entries_expire_after_the_ttl():
+    llm_cache.store_response("k", "cached text")
+    assert llm_cache.get_cached_response("k") == "cached text"
+    assert llm_cache.get_cached_response("k", ttl_seconds=1e-9) is None
+    assert llm_cache.get_cached_response("k") is None # The expired entry was deleted
+
+
+def test_fetch_results_are_stored_only_when_cacheable():
+    assert llm_cache.get_or_fetch_response("good", lambda: '{"questions": []}', is_cacheable=lambda text: text.startswith("{")) == '{"questions": []}'
+    assert llm_cache.get_or_fetch_response("bad", lambda: "not json", is_cacheable=lambda text: text.startswith("{")) == "not json"
+    assert llm_cache.get_or_fetch_response("good", lambda: pytest.fail("should be cached")) == '{"questions": []}'
+    assert llm_cache.get_cached_response("bad") is None
+
+
+def test_bypass_skips_the_lookup_but_refreshes_the_entry():
+    llm_cache.store_response("k", "old")
+    assert llm_cache.get_or_fetch_response("k", lambda: "new", bypass_cache=True) == "new"
+    assert llm_cache.get_cached_response("k") == "new"
+
+
+def test_concurrent_identical_requests_share_one_fetch():
+    fetch_started = threading.Event()
+    release_fetch = threading.Event()
+    fetch_calls = []
+
+    def fetch_function():
+        fetch_calls.append(1)
+        fetch_started.set()
+        release_fetch.wait(5)
+        return "shared response"
+
+    coalesced_before = llm_cache.get_cache_stats()['coalesced']
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(llm_cache.get_or_fetch_response("k", fetch_function))) for _ in range(4)]
+    threads[0].start()
+    assert fetch_started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while llm_cache.get_cache_stats()['coalesced'] < coalesced_before + 3:
+        time.sleep(0.01)
+    release_fetch.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["shared response"] * 4
+    assert len(fetch_calls) == 1
+
+
+def test_a_failed_fetch_is_not_cached_and_clears_the_inflight_entry():
+    def failing_fetch():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        llm_cache.get_or_fetch_response("k", failing_fetch)
+    assert llm_cache._inflight_requests == {}
+    assert llm_cache.get_or_fetch_response("k", lambda: "recovered") == "recovered"
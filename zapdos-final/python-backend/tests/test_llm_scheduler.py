@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+
+import openai
+import pytest
+
+import llm_scheduler
+
+
+def make_rate_limit_error():
+    # Built without an HTTP response (the scheduler only reads its Retry-After headers, if any)
+    rate_limit_error = openai.RateLimitError.__new__(openai.RateLimitError)
+    Exception.__init__(rate_limit_error, "Rate limit reached")
+    return rate_limit_error
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "LLM_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(llm_scheduler, "LLM_DECREASE_COOLDOWN_SECONDS", 0)
+
+
+def test_concurrent_calls_respect_the_limit_and_count_exactly():
+    scheduler = llm_scheduler.LLMCallScheduler(requests_per_minute=10000, tokens_per_minute=10 ** 7, initial_concurrency=2)
+    running = {'now': 0, 'peak': 0}
+    running_lock = threading.Lock()
+
+    def request_function():
+        with running_lock:
+            running['now'] += 1
+            running['peak'] = max(running['peak'], running['now'])
+        time.sleep(0.01)
+        with running_lock:
+            running['now'] -= 1
+        return "ok"
+
+    threads = [threading.Thread(target=scheduler.run, args=(request_function, 10)) for _ in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    scheduler_stats = scheduler.get_stats()
+    assert (scheduler_stats['calls'], scheduler_stats['succeeded'], scheduler_stats['failed']) == (40, 40, 0)
+    assert scheduler_stats['in_flight'] == 0 and scheduler_stats['queue_depth'] == 0
+    assert scheduler_stats['total_queue_wait_seconds'] > 0
+    assert 2 < scheduler_stats['concurrency_limit'] <= llm_scheduler.LLM_MAX_CONCURRENCY # Fast successes raised it
+    assert running['peak'] <= llm_scheduler.LLM_MAX_CONCURRENCY
+
+
+def test_rate_limit_halves_the_limit_and_is_retried():
+    scheduler = llm_scheduler.LLMCallScheduler(requests_per_minute=10000, tokens_per_minute=10 ** 7, initial_concurrency=4)
+    attempts = []
+
+    def request_function():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise make_rate_limit_error()
+        return "ok"
+
+    assert scheduler.run(request_function, 10) == "ok"
+    scheduler_stats = scheduler.get_stats()
+    assert (scheduler_stats['rate_limited'], scheduler_stats['retries'], scheduler_stats['succeeded']) == (1, 1, 1)
+    assert scheduler_stats['concurrency_limit'] == 2
+
+
+def test_non_retryable_error_is_raised_and_counted_once():
+    scheduler = llm_scheduler.LLMCallScheduler(requests_per_minute=10000, tokens_per_minute=10 ** 7)
+
+    def request_function():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.run(request_function, 10)
+    scheduler_stats = scheduler.get_stats()
+    assert (scheduler_stats['calls'], scheduler_stats['failed'], scheduler_stats['retries'], scheduler_stats['in_flight']) == (1, 1, 0, 0)
+
+
+@pytest.mark.parametrize("environment, expected_limits", [
+    ({}, (5000, 450000)),
+    ({"OPENAI_USAGE_TIER": "1"}, (500, 30000)),
+    ({"OPENAI_USAGE_TIER": "1", "OPENAI_TOKENS_PER_MINUTE": "90000"}, (500, 90000)),
+])
+def test_bucket_sizes_come_from_the_environment(monkeypatch, environment, expected_limits):
+    for variable_name in ("OPENAI_USAGE_TIER", "OPENAI_REQUESTS_PER_MINUTE", "OPENAI_TOKENS_PER_MINUTE"):
+        monkeypatch.delenv(variable_name, raising=False)
+    for variable_name, value in environment.items():
+        monkeypatch.setenv(variable_name, value)
+    # A fresh interpreter, since the limits are read when the module is imported
+    limits_output = subprocess.run([sys.executable, "-c", "import llm_scheduler; print(llm_scheduler.LLM_REQUESTS_PER_MINUTE, llm_scheduler.LLM_TOKENS_PER_MINUTE)"],
+                                   cwd=os.path.dirname(os.path.abspath(llm_scheduler.__file__)), capture_output=True, text=True, check=True).stdout
+    assert tuple(map(int, limits_output.split())) == expected_limits
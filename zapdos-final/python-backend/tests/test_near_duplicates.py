@@ -0,0 +1,122 @@
+import random
+
+import app
+import near_duplicates
+import synthetic_documents
+
+
+def make_variant(rng, text):
+    """text with one word dropped, as a paraphrasing model might."""
+    words = text.split()
+    del words[rng.randrange(len(words))]
+    return " ".join(words)
+
+
+def test_band_choice_puts_the_s_curve_midpoint_at_or_below_the_threshold():
+    assert near_duplicates.choose_lsh_bands(0.7, 128) == (18, 7)
+    for threshold in (0.3, 0.5, 0.7, 0.9):
+        bands, rows = near_duplicates.choose_lsh_bands(threshold, 128)
+        assert bands * rows <= 128
+        assert (1.0 / bands) ** (1.0 / rows) <= threshold
+
+
+def test_normalization_ignores_case_punctuation_and_spacing():
+    near_duplicate_index = near_duplicates.NearDuplicateIndex(1.0)
+    first_cluster_id = near_duplicate_index.add("What does the mitochondrion produce? ATP")
+    assert near_duplicate_index.add("what does the  Mitochondrion produce ATP!") == first_cluster_id
+    assert near_duplicate_index.add("What does the chloroplast produce? Glucose") != first_cluster_id
+
+
+def test_near_identical_texts_cluster_and_distinct_ones_do_not():
+    rng = random.Random(0)
+    texts = [synthetic_documents.make_synthetic_text(3, seed=seed) for seed in range(40)]
+    near_duplicate_index = near_duplicates.NearDuplicateIndex()
+    cluster_ids = [near_duplicate_index.add(text) for text in texts]
+    assert cluster_ids == list(range(len(texts)))
+
+    for text, cluster_id in zip(texts, cluster_ids):
+        variant_text = make_variant(rng, text)
+        similarity = near_duplicates.jaccard_similarity(near_duplicates.get_shingles(text), near_duplicates.get_shingles(variant_text))
+        if similarity >= 0.9: # Far enough above the threshold that LSH all but never misses the pair
+            assert near_duplicate_index.add(variant_text) == cluster_id
+
+
+def test_candidates_below_the_threshold_are_not_merged():
+    near_duplicate_index = near_duplicates.NearDuplicateIndex(0.7)
+    # One-row bands make almost every overlapping pair a candidate, so the exact check has to reject them
+    near_duplicate_index.bands, near_duplicate_index.rows = near_duplicate_index.num_permutations, 1
+    near_duplicate_index._band_buckets = [{} for _ in range(near_duplicate_index.bands)]
+    first_text = "Mitochondria produce ATP through cellular respiration in the inner membrane."
+    second_text = "Mitochondria produce ATP through fermentation in the cytoplasm of yeast cells."
+    similarity = near_duplicates.jaccard_similarity(near_duplicates.get_shingles(first_text), near_duplicates.get_shingles(second_text))
+    assert 0.2 < similarity < 0.7
+    first_cluster_id = near_duplicate_index.add(first_text)
+    assert near_duplicate_index.add(second_text) != first_cluster_id
+    assert near_duplicate_index.candidate_checks_count == 1
+
+
+def test_collector_keeps_the_best_formed_near_duplicate_of_a_response():
+    sent_batches = []
+    question_collector = app.QuestionCollector("MCQs", lambda batch, source_info, question_type: sent_batches.append(batch))
+    question_collector.add_raw_questions([
+        {"question": "What does the mitochondrion produce?", "answer": "ATP", "options": ["ATP", "DNA"]},
+        {"question": "Which organelle holds chlorophyll?", "answer": "Chloroplast", "options": ["Chloroplast", "Nucleus", "Ribosome"]},
+        {"question": "What does the mitochondrion produce ?", "answer": "ATP", "options": ["ATP", "DNA", "RNA"], "source_page": 2},
+    ])
+    assert question_collector.raw_questions_count == 3
+    assert question_collector.near_duplicates_count == 1
+    assert [question["options"] for question in question_collector.questions] == [["ATP", "DNA", "RNA"], ["Chloroplast", "Nucleus", "Ribosome"]]
+    assert sent_batches == [question_collector.questions]
+
+
+def test_collector_keeps_questions_already_sent():
+    sent_batches = []
+    question_collector = app.QuestionCollector("MCQs", lambda batch, source_info, question_type: sent_batches.append(list(batch)))
+    question_collector.add_raw_questions([{"question": "What does the mitochondrion produce?", "answer": "ATP", "options": ["ATP", "DNA"]}])
+    assert question_collector.add_raw_questions([
+        {"question": "What does the mitochondrion produce ?", "answer": "ATP", "options": ["ATP", "DNA", "RNA"], "source_page": 2},
+    ]) == []
+    assert question_collector.near_duplicates_count == 1
+    assert question_collector.questions == sent_batches[0] # Streamed clients already have this one
+    assert question_collector.questions[0]["options"] == ["ATP", "DNA"]
+
+
+def test_collector_skips_malformed_items():
+    question_collector = app.QuestionCollector("Short Answer")
+    new_questions = question_collector.add_raw_questions([
+        "What does the mitochondrion produce?",
+        {"question": ["What does the mitochondrion produce?"], "answer": "ATP"},
+        {"question": "   ", "answer": "ATP"},
+        {"question": "What does the ribosome make?", "answer": {"text": "Protein"}},
+        {"question": "What does the ribosome make?"},
+        {"question": "Which organelle holds chlorophyll?", "answer": "Chloroplast", "source_page": [3, 4]},
+    ])
+    assert [question["question"] for question in new_questions] == ["Which organelle holds chlorophyll?"]
+    assert new_questions[0]["source_page"] == "3, 4"
+    assert question_collector.raw_questions_count == 6
+
+
+def test_chained_near_duplicates_follow_arrival_order():
+    words = "mitochondria produce energy for the cell through respiration using oxygen and glucose as inputs daily".split()
+    first_text, middle_text, last_text = " ".join(words[0:13]), " ".join(words[1:14]), " ".join(words[2:15])
+    get_similarity = lambda text, other_text: near_duplicates.jaccard_similarity(near_duplicates.get_shingles(text), near_duplicates.get_shingles(other_text))
+    assert get_similarity(first_text, middle_text) >= 0.7 and get_similarity(middle_text, last_text) >= 0.7
+    assert get_similarity(first_text, last_text) < 0.7
+
+    def make_index():
+        near_duplicate_index = near_duplicates.NearDuplicateIndex(0.7)
+        # One-row bands: every overlapping pair is a candidate, so no near-duplicate is missed by chance
+        near_duplicate_index.bands, near_duplicate_index.rows = near_duplicate_index.num_permutations, 1
+        near_duplicate_index._band_buckets = [{} for _ in range(near_duplicate_index.bands)]
+        return near_duplicate_index
+
+    chain_index = make_index()
+    first_cluster_id = chain_index.add(first_text)
+    assert chain_index.add(middle_text) == first_cluster_id
+    assert chain_index.add(last_text) == first_cluster_id # Via the middle text
+
+    bridge_index = make_index()
+    first_cluster_id, last_cluster_id = bridge_index.add(first_text), bridge_index.add(last_text)
+    assert first_cluster_id != last_cluster_id
+    assert bridge_index.add(middle_text) in (first_cluster_id, last_cluster_id)
+    assert bridge_index.clusters_count == 2 # Not merged
@@ -0,0 +1,76 @@
+import pytest
+
+import pdf_extraction
+import summarizer
+import synthetic_documents
+
+
+@pytest.fixture(scope="module")
+def textbook_pdf(tmp_path_factory):
+    pages = synthetic_documents.make_synthetic_pages(24, seed=3) # Front matter, TOC, content, references, index
+    pdf_path = str(tmp_path_factory.mktemp("pdf") / "textbook.pdf")
+    synthetic_documents.write_synthetic_pdf(pages, pdf_path)
+    return pdf_path, len(pages)
+
+
+@pytest.fixture
+def uncached_pipeline(monkeypatch):
+    monkeypatch.setattr(summarizer, "SUMMARY_CACHE_ENABLED", False)
+    monkeypatch.setattr(summarizer, "SUMMARIZER_EVALUATION_MODE", "sequential")
+
+
+def iter_counting_pages(pages_iter, pulled_pages):
+    for page_item in pages_iter:
+        pulled_pages.append(page_item[1])
+        yield page_item
+
+
+def test_streamed_pages_give_the_same_result_as_a_page_list(textbook_pdf, uncached_pipeline):
+    pdf_path, pages_count = textbook_pdf
+    page_list = list(pdf_extraction.iter_pdf_page_texts(pdf_path))
+    pulled_pages = []
+    streamed_result = summarizer.process_text_for_qna(iter_counting_pages(pdf_extraction.iter_pdf_page_texts(pdf_path), pulled_pages), pages_count)
+    listed_result = summarizer.process_text_for_qna(page_list, pages_count)
+
+    assert pulled_pages == [page_num for _, page_num in page_list]
+    assert streamed_result[:6] == listed_result[:6] # Text and pages for the LLM, method, metrics, filtered text and pages
+    assert streamed_result[6]['summary_sentence_ids'] == listed_result[6]['summary_sentence_ids']
+    assert streamed_result[6]['sentence_store'].text() == listed_result[6]['sentence_store'].text()
+    assert streamed_result[7] == listed_result[7]
+    assert set(streamed_result[5]) < set(range(1, pages_count + 1)) # Boilerplate pages were dropped on the way
+
+
+def test_each_page_is_split_before_the_next_is_pulled(uncached_pipeline, monkeypatch):
+    pages = synthetic_documents.make_synthetic_pages(12, seed=3)
+    pipeline_events = []
+    add_page = summarizer.SentenceStore.add_page
+
+    def recording_add_page(sentence_store, page_text, page_num):
+        pipeline_events.append(("split", page_num))
+        return add_page(sentence_store, page_text, page_num)
+
+    def iter_recorded_pages():
+        for page_text, page_num in pages:
+            pipeline_events.append(("pull", page_num))
+            yield page_text, page_num
+
+    monkeypatch.setattr(summarizer.SentenceStore, "add_page", recording_add_page)
+    summarizer.process_text_for_qna(iter_recorded_pages(), len(pages))
+
+    split_page_nums = [page_num for event, page_num in pipeline_events if event == "split"]
+    assert 0 < len(split_page_nums) < len(pages)
+    for page_num in split_page_nums: # Content pages are split right after being pulled; boilerplate pages never are
+        pull_index = pipeline_events.index(("pull", page_num))
+        assert pipeline_events[pull_index + 1] == ("split", page_num)
+
+
+
+def test_full_filtered_text_is_the_content_pages_single_spaced(uncached_pipeline):
+    pages = synthetic_documents.make_synthetic_pages(12, seed=3)
+    result = summarizer.process_text_for_qna(iter(pages), len(pages))
+    full_filtered_text, full_filtered_pages, qna_sentences = result[4], result[5], result[6]
+
+    content_text = "\n".join(page_text for page_text, page_num in pages if page_num in full_filtered_pages)
+    assert full_filtered_text == qna_sentences['sentence_store'].text()
+    assert "\n" not in full_filtered_text
+    assert full_filtered_text.split() == summarizer.preprocess_text_for_sumy(content_text).split()
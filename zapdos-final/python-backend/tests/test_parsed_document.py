@@ -0,0 +1,46 @@
+import pytest
+from sumy.nlp.stemmers import Stemmer
+from sumy.nlp.tokenizers import Tokenizer as SumyTokenizer
+from sumy.parsers.plaintext import PlaintextParser
+from sumy.summarizers.lex_rank import LexRankSummarizer
+from sumy.summarizers.lsa import LsaSummarizer
+from sumy.summarizers.luhn import LuhnSummarizer
+from sumy.summarizers.text_rank import TextRankSummarizer
+from sumy.utils import get_stop_words
+
+import summarizer
+import synthetic_documents
+
+SUMY_SUMMARIZER_CLASSES = {'lsa': LsaSummarizer, 'lexrank': LexRankSummarizer, 'luhn': LuhnSummarizer, 'textrank': TextRankSummarizer}
+
+
+def get_plain_sumy_summary(full_text, summarizer_type_str, target_sentence_count):
+    document = PlaintextParser.from_string(full_text, SumyTokenizer(summarizer.LANGUAGE)).document
+    sumy_summarizer = SUMY_SUMMARIZER_CLASSES[summarizer_type_str](Stemmer(summarizer.LANGUAGE))
+    sumy_summarizer.stop_words = get_stop_words(summarizer.LANGUAGE)
+    return [str(sentence).strip() for sentence in sumy_summarizer(document, target_sentence_count)]
+
+
+@pytest.fixture
+def sumy_backends(monkeypatch):
+    # The shared summarizers reimplement sumy's own loops; the sparse backends are tested separately
+    monkeypatch.setattr(summarizer, "GRAPH_RANKING_BACKEND", "sumy")
+    monkeypatch.setattr(summarizer, "LSA_BACKEND", "sumy")
+
+
+@pytest.mark.parametrize("summarizer_type_str", sorted(SUMY_SUMMARIZER_CLASSES))
+def test_shared_parse_picks_the_same_sentences_as_sumy(sumy_backends, summarizer_type_str):
+    full_text = synthetic_documents.make_synthetic_text(60, seed=3)
+    parsed_document = summarizer.ParsedDocument(full_text)
+    assert (summarizer.get_sumy_summary(full_text, summarizer_type_str, 8, parsed_document)
+            == get_plain_sumy_summary(full_text, summarizer_type_str, 8))
+
+
+def test_one_parse_serves_every_summarizer(sumy_backends):
+    full_text = synthetic_documents.make_synthetic_text(40, seed=5)
+    parsed_document = summarizer.ParsedDocument(full_text)
+    stemmed_words_count = len(parsed_document.stemmer._stems)
+    for summarizer_type_str in SUMY_SUMMARIZER_CLASSES:
+        summarizer.get_sumy_summary(full_text, summarizer_type_str, 5, parsed_document)
+    # Every stem the summarizers asked for was already computed while parsing
+    assert len(parsed_document.stemmer._stems) == stemmed_words_count
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+import pdf_extraction
+import synthetic_documents
+
+
+@pytest.fixture(scope="module")
+def synthetic_pdf_path(tmp_path_factory):
+    rng = random.Random(0)
+    pages = [(synthetic_documents.make_content_page(rng, page_num, sentences_count=6), page_num) for page_num in range(1, 31)]
+    pages[6] = ("", 7) # A page without text is skipped by both paths
+    pdf_path = str(tmp_path_factory.mktemp("pdf") / "synthetic.pdf")
+    synthetic_documents.write_synthetic_pdf(pages, pdf_path)
+    return pdf_path
+
+
+@pytest.fixture
+def parallel_extraction(monkeypatch):
+    monkeypatch.setattr(pdf_extraction, "PDF_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(pdf_extraction, "PDF_PAGES_PER_RANGE", 4)
+    monkeypatch.setattr(pdf_extraction, "PDF_EXTRACTION_MAX_WORKERS", 2)
+    pdf_extraction.shutdown_extraction_process_pool()
+    yield
+    pdf_extraction.shutdown_extraction_process_pool()
+
+
+def extract_serially(pdf_path, monkeypatch):
+    with monkeypatch.context() as serial_patch:
+        serial_patch.setattr(pdf_extraction, "PDF_EXTRACTION_MAX_WORKERS", 1)
+        return list(pdf_extraction.iter_pdf_page_texts(pdf_path))
+
+
+@pytest.mark.parametrize("fast_backend_enabled", [False, True])
+def test_parallel_extraction_matches_serial(synthetic_pdf_path, parallel_extraction, monkeypatch, fast_backend_enabled):
+    monkeypatch.setattr(pdf_extraction, "PDF_FAST_BACKEND_ENABLED", fast_backend_enabled)
+    serial_page_texts = extract_serially(synthetic_pdf_path, monkeypatch)
+    extraction_stats = {}
+    parallel_page_texts = list(pdf_extraction.iter_pdf_page_texts(synthetic_pdf_path, extraction_stats=extraction_stats))
+    assert parallel_page_texts == serial_page_texts
+    assert [page_num for _, page_num in parallel_page_texts] == [page_num for page_num in range(1, 31) if page_num != 7]
+    assert extraction_stats["pages_with_text"] == 29
+    assert pdf_extraction.get_extraction_process_pool()._mp_context.get_start_method() == "spawn"
+
+
+def test_ranges_not_back_in_time_are_extracted_here(synthetic_pdf_path, parallel_extraction, monkeypatch, capsys):
+    serial_page_texts = extract_serially(synthetic_pdf_path, monkeypatch)
+    monkeypatch.setattr(pdf_extraction, "PDF_RANGE_TIMEOUT_SECONDS", 0)
+    stuck_pool = pdf_extraction.get_extraction_process_pool()
+    assert list(pdf_extraction.iter_pdf_page_texts(synthetic_pdf_path)) == serial_page_texts
+    assert "recycling the pool" in capsys.readouterr().out
+    assert pdf_extraction.get_extraction_process_pool() is not stuck_pool
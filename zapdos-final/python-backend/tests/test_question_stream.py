@@ -0,0 +1,84 @@
+import json
+
+import app
+import question_stream
+
+QUESTION_OBJECTS = [
+    {"id": "q1", "question": "What does the mitochondrion produce for the cell?", "answer": "ATP", "source_page": 1},
+    {"id": "q2", "question": "Which organelle holds a plant cell's chlorophyll?", "answer": "The chloroplast", "source_page": 2},
+    {"id": "q3", "question": "Name the process that copies DNA before division.", "answer": "Replication", "source_page": 3},
+]
+
+
+def feed_in_pieces(question_parser, text, piece_length):
+    completed_objects = []
+    for start in range(0, len(text), piece_length):
+        completed_objects.extend(question_parser.feed(text[start:start + piece_length]))
+    return completed_objects
+
+
+def test_parser_yields_every_object_whatever_the_delta_size():
+    response_text = json.dumps({"questions": QUESTION_OBJECTS}, indent=2)
+    for piece_length in (1, 3, 17, len(response_text)):
+        assert feed_in_pieces(question_stream.QuestionStreamParser(), response_text, piece_length) == QUESTION_OBJECTS
+
+
+def test_parser_ignores_braces_and_quotes_inside_strings():
+    tricky_objects = [
+        {"id": "q1", "question": "What does {x} mean in \"f-strings\"?", "answer": "A replacement field: } and ] are literal here"},
+        {"id": "q2", "question": "Is \\ a backslash?", "answer": "Yes \\\" still"},
+    ]
+    response_text = "```json\n" + json.dumps({"note": "[{not questions}]", "questions": tricky_objects}) + "\n```"
+    assert feed_in_pieces(question_stream.QuestionStreamParser(), response_text, 1) == tricky_objects
+
+
+def test_parser_only_reads_the_questions_array():
+    response_text = json.dumps({"examples": [{"id": "e1"}], "questions": QUESTION_OBJECTS[:1], "extra": [{"id": "x1"}]})
+    assert feed_in_pieces(question_stream.QuestionStreamParser(), response_text, 5) == QUESTION_OBJECTS[:1]
+
+
+def test_truncated_response_yields_only_closed_objects():
+    response_text = json.dumps({"questions": QUESTION_OBJECTS})
+    truncated_text = response_text[:response_text.index('"id": "q3"') + 12]
+    question_parser = question_stream.QuestionStreamParser()
+    assert feed_in_pieces(question_parser, truncated_text, 4) == QUESTION_OBJECTS[:2]
+    assert question_parser.objects_failed_count == 0
+
+
+def copies(question_objects):
+    # Every parse hands over fresh dicts, which QuestionCollector then normalizes in place
+    return [dict(question_object) for question_object in question_objects]
+
+
+def run_calls(call_function):
+    question_collector = app.QuestionCollector("Short Answer")
+    app.run_question_generation_calls([("Short Answer", "chunk 1", call_function)], {"Short Answer": question_collector}, None, "[TEST]")
+    return question_collector
+
+
+def test_objects_the_stream_missed_are_recovered_from_the_full_response():
+    def call_function(on_question_objects):
+        # The stream parser only managed the first two objects (e.g. the third never closed in time)
+        on_question_objects(copies(QUESTION_OBJECTS[:2]))
+        return json.dumps({"questions": QUESTION_OBJECTS})
+
+    question_collector = run_calls(call_function)
+    assert question_collector.raw_questions_count == 3
+    assert [q["question"] for q in question_collector.questions] == [q["question"] for q in QUESTION_OBJECTS]
+
+
+def test_objects_re_streamed_by_a_retry_are_not_added_again():
+    def call_function(on_question_objects):
+        on_question_objects(copies(QUESTION_OBJECTS[:2])) # First attempt fails midway...
+        on_question_objects(copies(QUESTION_OBJECTS[:1])) # ...and the scheduler's retry streams from the start
+        on_question_objects(copies(QUESTION_OBJECTS[1:]))
+        return json.dumps({"questions": QUESTION_OBJECTS})
+
+    question_collector = run_calls(call_function)
+    assert question_collector.raw_questions_count == 3
+    assert len(question_collector.questions) == 3
+
+
+def test_unstreamed_response_is_added_whole():
+    question_collector = run_calls(lambda on_question_objects: "```json\n" + json.dumps({"questions": QUESTION_OBJECTS}) + "\n```")
+    assert question_collector.raw_questions_count == 3
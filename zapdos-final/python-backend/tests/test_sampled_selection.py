@@ -0,0 +1,35 @@
+import random
+
+import summarizer
+import synthetic_documents
+
+
+def test_sampled_winner_is_rerun_on_the_full_text(monkeypatch):
+    monkeypatch.setattr(summarizer, "SUMMARY_CACHE_ENABLED", False)
+    monkeypatch.setattr(summarizer, "SUMMARIZER_EVALUATION_MODE", "sequential")
+    monkeypatch.setattr(summarizer, "SAMPLED_SELECTION_AUDIT_RATE", 0)
+    evaluated_store_sizes = []
+    evaluate_summarizer_method = summarizer.evaluate_summarizer_method
+
+    def recording_evaluate_summarizer_method(method_name_str, sentence_store, *args, **kwargs):
+        evaluated_store_sizes.append((method_name_str, len(sentence_store)))
+        return evaluate_summarizer_method(method_name_str, sentence_store, *args, **kwargs)
+
+    monkeypatch.setattr(summarizer, "evaluate_summarizer_method", recording_evaluate_summarizer_method)
+    rng = random.Random(0)
+    pages_count = summarizer.SAMPLED_SELECTION_MIN_PAGES
+    pages = [(synthetic_documents.make_content_page(rng, page_num, sentences_count=8), page_num) for page_num in range(1, pages_count + 1)]
+    result = summarizer.process_text_for_qna(iter(pages), pages_count, selection_strategy="sampled")
+    text_for_llm, _pages_for_llm, method_chosen, metrics_log, _full_text, _full_pages, qna_sentences, selection_log = result
+
+    sample_selection = selection_log['sample_selection']
+    assert selection_log['selection_strategy'] == "sampled"
+    assert len(sample_selection['sample_pages']) == summarizer.SAMPLED_SELECTION_PAGE_COUNT
+    assert sorted(sample_selection['sample_scores']) == sorted(summarizer.SUMMARIZER_METHODS_CHEAPEST_FIRST)
+    assert method_chosen == sample_selection['sample_winner']
+    # Every method on the sample, then only the winner on the full text
+    full_store_size = len(qna_sentences['sentence_store'])
+    assert [method for method, store_size in evaluated_store_sizes if store_size < full_store_size] == summarizer.SUMMARIZER_METHODS_CHEAPEST_FIRST
+    assert [method for method, store_size in evaluated_store_sizes if store_size == full_store_size] == [method_chosen]
+    assert list(metrics_log) == [method_chosen] # Per-method metrics only
+    assert text_for_llm == qna_sentences['sentence_store'].text(qna_sentences['summary_sentence_ids'])
@@ -0,0 +1,56 @@
+import pickle
+
+from nltk.tokenize import sent_tokenize
+
+from sentence_store import SentenceStore, normalize_sentence_text
+
+PAGES = [
+    ("Cells are the unit of life.  Each cell has a\nmembrane. Ribosomes make proteins!", 3),
+    ("   \n  ", 4),
+    ("Mitochondria make ATP. Is the nucleus\n\nan organelle? Yes.", 7),
+]
+
+
+def make_store():
+    sentence_store = SentenceStore()
+    for page_text, page_num in PAGES:
+        sentence_store.add_page(page_text, page_num)
+    return sentence_store
+
+
+def test_sentences_round_trip_in_order_with_their_pages():
+    sentence_store = make_store()
+    expected_sentences = [(normalize_sentence_text(sentence_text), page_num)
+                          for page_text, page_num in PAGES for sentence_text in sent_tokenize(page_text)]
+    assert [(sentence_store.sentence(i), sentence_store.page(i)) for i in range(len(sentence_store))] == expected_sentences
+    assert list(sentence_store.sentences()) == [sentence_text for sentence_text, _ in expected_sentences]
+    assert sentence_store.text() == " ".join(sentence_text for sentence_text, _ in expected_sentences)
+    assert sentence_store.page_numbers() == [3, 7]
+
+
+def test_lookups_by_id_and_page():
+    sentence_store = make_store()
+    page_7_ids = sentence_store.ids_for_pages([7])
+    assert [sentence_store.page(i) for i in page_7_ids] == [7] * len(page_7_ids)
+    assert sentence_store.pages_for([page_7_ids[-1], 0, 1]) == [3, 7]
+    assert sentence_store.text([0, page_7_ids[0]]) == "Cells are the unit of life. Mitochondria make ATP."
+
+
+def test_adding_after_reading_keeps_the_buffer_consistent():
+    sentence_store = make_store()
+    _ = sentence_store.buffer
+    new_id = sentence_store.add_sentence("  One   more\nsentence. ", 9)
+    assert sentence_store.sentence(new_id) == "One more sentence."
+    assert sentence_store.text().endswith("? Yes. One more sentence.")
+    assert sentence_store.add_sentence(" \n ", 9) is None
+
+
+def test_subset_and_pickle_keep_the_sentences():
+    sentence_store = make_store()
+    sub_store = sentence_store.subset([1, 3])
+    assert list(sub_store.sentences()) == [sentence_store.sentence(1), sentence_store.sentence(3)]
+    assert [sub_store.page(0), sub_store.page(1)] == [sentence_store.page(1), sentence_store.page(3)]
+
+    unpickled_store = pickle.loads(pickle.dumps(sentence_store))
+    assert list(unpickled_store.sentences()) == list(sentence_store.sentences())
+    assert list(unpickled_store.page_ids) == list(sentence_store.page_ids)
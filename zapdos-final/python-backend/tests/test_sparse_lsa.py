@@ -0,0 +1,62 @@
+import random
+
+import numpy
+import pytest
+
+import summarizer
+import sparse_lsa
+import synthetic_documents
+from sentence_store import SentenceStore
+
+pytestmark = pytest.mark.skipif(not sparse_lsa.is_available(), reason="sparse_lsa needs scipy")
+
+
+def make_parsed_document(seed, pages_count=4, sentences_count=20):
+    rng = random.Random(seed)
+    sentence_store = SentenceStore()
+    for page_num in range(1, pages_count + 1):
+        sentence_store.add_page(synthetic_documents.make_content_page(rng, page_num, sentences_count=sentences_count), page_num)
+    return summarizer.ParsedDocument(sentence_store=sentence_store)
+
+
+def get_sumy_ranks(parsed_document):
+    sumy_lsa = summarizer.SharedLsaSummarizer(parsed_document)
+    dictionary = sumy_lsa._create_dictionary(parsed_document.document)
+    matrix = sumy_lsa._compute_term_frequency(sumy_lsa._create_matrix(parsed_document.document, dictionary))
+    _u, sigma, v_matrix = numpy.linalg.svd(matrix, full_matrices=False)
+    return list(dictionary), numpy.array(sumy_lsa._compute_ranks(sigma, v_matrix))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_full_rank_ranks_are_bit_identical_to_sumy(seed):
+    parsed_document = make_parsed_document(seed)
+    dictionary_terms, sumy_ranks = get_sumy_ranks(parsed_document)
+    ranks, dimensions_used = sparse_lsa.lsa_sentence_ranks(parsed_document.sentence_all_stem_counts, dictionary_terms, len(dictionary_terms))
+    assert dimensions_used == min(len(dictionary_terms), len(parsed_document.sentences))
+    assert numpy.array_equal(ranks, sumy_ranks)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_truncated_picks_mostly_agree_with_sumy(monkeypatch, seed):
+    parsed_document = make_parsed_document(seed, pages_count=5)
+    monkeypatch.setattr(summarizer, "LSA_BACKEND", "truncated")
+    truncated_ids = summarizer.get_summary_sentence_ids(parsed_document, "lsa", 10)
+    monkeypatch.setattr(summarizer, "LSA_BACKEND", "sumy")
+    sumy_ids = summarizer.get_summary_sentence_ids(parsed_document, "lsa", 10)
+    # Top-10 dimensions only approximate sumy's full SVD, so a near-tie may swap a pick
+    assert len(set(truncated_ids) & set(sumy_ids)) >= 8
+
+
+def test_memory_ceiling_shrinks_the_dimensions():
+    parsed_document = make_parsed_document(0, pages_count=8)
+    dictionary_terms, _sumy_ranks = get_sumy_ranks(parsed_document)
+    normalized_matrix, _non_empty_mask = sparse_lsa.build_normalized_term_matrix(parsed_document.sentence_all_stem_counts, dictionary_terms)
+    terms_count, sentences_count = normalized_matrix.shape
+    memory_ceiling_bytes = sparse_lsa.estimate_randomized_svd_bytes(terms_count, sentences_count, normalized_matrix.nnz, 5)
+    assert memory_ceiling_bytes < sparse_lsa.estimate_dense_svd_bytes(terms_count, sentences_count)
+
+    _ranks, dimensions_used = sparse_lsa.lsa_sentence_ranks(
+        parsed_document.sentence_all_stem_counts, dictionary_terms, 20, memory_ceiling_bytes=memory_ceiling_bytes)
+    assert dimensions_used == 5 # 20 halved until it fits
+    with pytest.raises(sparse_lsa.LsaMemoryError):
+        sparse_lsa.lsa_sentence_ranks(parsed_document.sentence_all_stem_counts, dictionary_terms, 20, memory_ceiling_bytes=1024)
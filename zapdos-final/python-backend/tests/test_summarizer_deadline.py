@@ -0,0 +1,57 @@
+import time
+import random
+
+import summarizer
+import synthetic_documents
+
+
+def iter_slow_pages(pages, seconds_per_page):
+    # Like pdf_extraction.iter_pdf_page_texts on a slow document: each page takes a while to come out
+    for page_text, page_num in pages:
+        time.sleep(seconds_per_page)
+        yield page_text, page_num
+
+
+def test_slow_page_iterator_does_not_use_up_the_summarizer_deadline(monkeypatch):
+    monkeypatch.setattr(summarizer, "SUMMARY_CACHE_ENABLED", False)
+    monkeypatch.setattr(summarizer, "SUMMARIZER_EVALUATION_MODE", "sequential")
+    rng = random.Random(0)
+    pages = [(synthetic_documents.make_content_page(rng, page_num, sentences_count=15), page_num) for page_num in range(1, 5)]
+
+    # Reading the pages takes longer than the whole deadline
+    result = summarizer.process_text_for_qna(iter_slow_pages(pages, 0.5), len(pages), selection_strategy="full", deadline_seconds=1.5)
+    _text_for_llm, _pages_for_llm, method_chosen, _metrics_log, full_filtered_text, _full_pages, _qna_sentences, selection_log = result
+
+    assert full_filtered_text
+    assert selection_log['skipped_methods'] == []
+    assert method_chosen in summarizer.SUMMARIZER_METHODS_CHEAPEST_FIRST
+
+
+def test_no_deadline_by_default():
+    assert summarizer.SUMMARIZER_PIPELINE_DEADLINE_SECONDS is None
+
+
+def test_deadline_picks_the_best_of_the_methods_that_finished(tmp_path, monkeypatch):
+    monkeypatch.setattr(summarizer.summary_cache, "SUMMARY_CACHE_PATH", str(tmp_path / "summary_cache.sqlite3"))
+    monkeypatch.setattr(summarizer, "SUMMARIZER_EVALUATION_MODE", "sequential")
+    get_summary_sentence_ids = summarizer.get_summary_sentence_ids
+
+    def slow_after_textrank(parsed_document, summarizer_type_str, target_sentence_count):
+        if summarizer_type_str == "textrank":
+            time.sleep(1.5) # Runs past the deadline, so lexrank and lsa are never started
+        return get_summary_sentence_ids(parsed_document, summarizer_type_str, target_sentence_count)
+
+    monkeypatch.setattr(summarizer, "get_summary_sentence_ids", slow_after_textrank)
+    rng = random.Random(0)
+    pages = [(synthetic_documents.make_content_page(rng, page_num, sentences_count=15), page_num) for page_num in range(1, 5)]
+    writes_before = summarizer.summary_cache.get_cache_stats()['writes']
+    result = summarizer.process_text_for_qna(pages, len(pages), selection_strategy="full", deadline_seconds=1)
+    text_for_llm, pages_for_llm, method_chosen, metrics_log, _full_text, _full_pages, qna_sentences, selection_log = result
+
+    assert selection_log['skipped_methods'] == ['lexrank', 'lsa']
+    assert sorted(metrics_log) == ['luhn', 'textrank']
+    finished_scores = {method: metrics_log[method]['overall_score'] for method in ('luhn', 'textrank')}
+    assert method_chosen == max(finished_scores, key=finished_scores.get)
+    assert text_for_llm == qna_sentences['sentence_store'].text(qna_sentences['summary_sentence_ids'])
+    assert pages_for_llm
+    assert summarizer.summary_cache.get_cache_stats()['writes'] == writes_before # Truncated results are not cached
@@ -0,0 +1,87 @@
+import os
+import pickle
+import random
+
+import pytest
+
+import summarizer
+import synthetic_documents
+from sentence_store import SentenceStore
+
+
+def make_sentence_store(pages_count=6, sentences_count=20, seed=0):
+    rng = random.Random(seed)
+    sentence_store = SentenceStore()
+    for page_num in range(1, pages_count + 1):
+        sentence_store.add_page(synthetic_documents.make_content_page(rng, page_num, sentences_count=sentences_count), page_num)
+    return sentence_store
+
+
+@pytest.fixture
+def fresh_process_pool():
+    summarizer.shutdown_summarizer_process_pool()
+    yield
+    summarizer.shutdown_summarizer_process_pool()
+
+
+def test_pickled_parsed_document_selects_the_same_sentences():
+    sentence_store = make_sentence_store()
+    parsed_document = summarizer.ParsedDocument(sentence_store=sentence_store)
+    unpickled_document = pickle.loads(pickle.dumps(parsed_document))
+    for method_name_str in summarizer.SUMMARIZER_METHODS_CHEAPEST_FIRST:
+        assert (summarizer.get_summary_sentence_ids(unpickled_document, method_name_str, 10)
+                == summarizer.get_summary_sentence_ids(parsed_document, method_name_str, 10))
+
+
+def test_parallel_evaluation_matches_sequential(fresh_process_pool):
+    sentence_store = make_sentence_store()
+    method_names = summarizer.SUMMARIZER_METHODS_CHEAPEST_FIRST
+    parallel_summaries = summarizer.evaluate_summarizer_methods_in_parallel(method_names, sentence_store, 10, 1)
+    sequential_summaries = summarizer.evaluate_summarizer_methods_sequentially(method_names, sentence_store, 10, 1)
+    assert ([(s['method'], s['sentence_ids']) for s in parallel_summaries]
+            == [(s['method'], s['sentence_ids']) for s in sequential_summaries])
+
+
+def test_timed_out_method_recycles_the_pool(fresh_process_pool):
+    sentence_store = make_sentence_store()
+    stuck_pool = summarizer.get_summarizer_process_pool()
+    # Nothing finishes in no time (the spawned workers are still importing), so every method times out
+    summaries_data = summarizer.evaluate_summarizer_methods_in_parallel(['lsa'], sentence_store, 10, 1, method_timeout_seconds=0)
+
+    assert summaries_data == []
+    assert summarizer._summarizer_process_pool is None
+    assert summarizer.get_summarizer_process_pool() is not stuck_pool
+
+
+def test_per_summary_metrics_are_computed_in_the_workers(fresh_process_pool, monkeypatch):
+    monkeypatch.setattr(summarizer, "SUMMARY_METRICS_MODE", "per_summary")
+    sentence_store = make_sentence_store()
+    method_names = summarizer.SUMMARIZER_METHODS_CHEAPEST_FIRST
+    sequential_summaries = summarizer.evaluate_summarizer_methods_sequentially(method_names, sentence_store, 10, 1)
+
+    parent_metrics_calls = []
+    monkeypatch.setattr(summarizer, "calculate_summary_metrics", lambda *args, **kwargs: parent_metrics_calls.append(args))
+    parallel_summaries = summarizer.evaluate_summarizer_methods_in_parallel(method_names, sentence_store, 10, 1)
+    assert parent_metrics_calls == []
+    assert ([(s['method'], s['metrics']) for s in parallel_summaries]
+            == [(s['method'], s['metrics']) for s in sequential_summaries])
+
+
+def test_payload_is_unpickled_once_per_worker_and_removed_after_the_run(fresh_process_pool, monkeypatch):
+    sentence_store = make_sentence_store()
+    payload_path = summarizer.write_summarizer_payload(sentence_store, summarizer.ParsedDocument(sentence_store=sentence_store))
+    try:
+        loaded_store, loaded_document = summarizer.load_summarizer_payload(payload_path)
+        assert summarizer.load_summarizer_payload(payload_path)[1] is loaded_document
+        assert loaded_store.text() == sentence_store.text()
+    finally:
+        summarizer.remove_summarizer_payload(payload_path)
+        summarizer._worker_payload_cache.clear()
+
+    written_payload_paths = []
+    write_summarizer_payload = summarizer.write_summarizer_payload
+    monkeypatch.setattr(summarizer, "write_summarizer_payload",
+                        lambda *args: written_payload_paths.append(write_summarizer_payload(*args)) or written_payload_paths[-1])
+    summarizer.evaluate_summarizer_methods_in_parallel(['luhn', 'lsa'], sentence_store, 10, 1)
+    assert len(written_payload_paths) == 1
+    assert not os.path.exists(written_payload_paths[0])
@@ -0,0 +1,57 @@
+import json
+import random
+
+import summarizer
+import summary_cache
+import synthetic_documents
+
+CONFIG = {'methods': ['luhn', 'lsa'], 'backends': ['sparse', 'truncated', 'fast']}
+
+
+def make_key(pages, config=CONFIG):
+    page_hasher = summary_cache.PageTextHasher()
+    for page_text, page_num in pages:
+        page_hasher.update(page_text, page_num)
+    return page_hasher.cache_key(config)
+
+
+def test_key_depends_on_page_text_numbers_boundaries_and_config():
+    pages = [("Cells divide.", 1), ("Genes mutate.", 2)]
+    assert make_key(pages) == make_key(list(pages))
+    assert make_key(pages) == make_key(pages, dict(reversed(list(CONFIG.items())))) # Key order is irrelevant
+    assert make_key(pages) != make_key([("Cells divide!", 1), ("Genes mutate.", 2)])
+    assert make_key(pages) != make_key([("Cells divide.", 1), ("Genes mutate.", 3)])
+    assert make_key(pages) != make_key([("Cells divide.Genes", 1), (" mutate.", 2)])
+    assert make_key(pages) != make_key(pages, dict(CONFIG, backends=['sumy', 'truncated', 'fast']))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache_path = str(tmp_path / "summary_cache.sqlite3")
+    value = {'method_chosen': 'lsa', 'summary_sentence_ids': list(range(50))}
+    max_bytes = 3 * len(json.dumps(value)) # Room for three entries
+    for entry_key in ("a", "b", "c"):
+        summary_cache.store_result(entry_key, value, cache_path, max_bytes=max_bytes)
+    assert summary_cache.get_cached_result("a", cache_path) == value
+    summary_cache.store_result("d", value, cache_path, max_bytes=max_bytes) # Over the limit: "b" is now the oldest
+    assert summary_cache.get_cached_result("b", cache_path) is None
+    assert summary_cache.get_cached_result("a", cache_path) == value
+
+
+def test_pipeline_result_is_served_from_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_PATH", str(tmp_path / "summary_cache.sqlite3"))
+    monkeypatch.setattr(summarizer, "SUMMARY_CACHE_ENABLED", True)
+    monkeypatch.setattr(summarizer, "SUMMARIZER_EVALUATION_MODE", "sequential")
+    rng = random.Random(0)
+    pages = [(synthetic_documents.make_content_page(rng, page_num, sentences_count=15), page_num) for page_num in range(1, 5)]
+
+    first_result = summarizer.process_text_for_qna(iter(pages), len(pages), selection_strategy="full")
+    hits_before = summary_cache.get_cache_stats()['hits']
+    second_result = summarizer.process_text_for_qna(iter(pages), len(pages), selection_strategy="full")
+    assert summary_cache.get_cache_stats()['hits'] == hits_before + 1
+    assert second_result[2] == first_result[2] # Method chosen
+    assert second_result[4] == first_result[4] # Full filtered text
+    assert second_result[6]['summary_sentence_ids'] == first_result[6]['summary_sentence_ids']
+
+    monkeypatch.setattr(summarizer, "GRAPH_RANKING_BACKEND", "sumy") # A different configuration misses
+    summarizer.process_text_for_qna(iter(pages), len(pages), selection_strategy="full")
+    assert summary_cache.get_cache_stats()['hits'] == hits_before + 1
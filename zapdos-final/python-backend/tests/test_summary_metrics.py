@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+import summarizer
+import summary_metrics
+import synthetic_documents
+from sentence_store import SentenceStore
+
+TRICKY_SENTENCES = [
+    "Enzymes (e.g. amylase) speed up reactions",
+    "—",
+    "See Fig. 3.2 and Table 4!",
+    "ATP",
+    "Is it alive? Viruses are debated",
+    "Cells divide... then they grow.",
+    "12 34 56",
+    "The end.",
+]
+
+
+def make_sentence_store(seed):
+    rng = random.Random(seed)
+    sentence_store = SentenceStore()
+    for page_num in range(1, 4):
+        sentence_store.add_page(synthetic_documents.make_content_page(rng, page_num, sentences_count=12), page_num)
+    for sentence_text in TRICKY_SENTENCES:
+        sentence_store.add_sentence(sentence_text, 4)
+    return sentence_store
+
+
+@pytest.fixture(autouse=True)
+def fast_rouge_engine(monkeypatch):
+    monkeypatch.setattr(summarizer, "ROUGE_ENGINE", "fast")
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_aggregated_metrics_equal_metrics_of_the_joined_text(seed):
+    sentence_store = make_sentence_store(seed)
+    metrics_engine = summary_metrics.SummaryMetricsEngine(sentence_store)
+    rng = random.Random(seed)
+    candidate_ids = [sorted(rng.sample(range(len(sentence_store)), rng.randint(1, 15))) for _ in range(30)]
+    tricky_start = len(sentence_store) - len(TRICKY_SENTENCES)
+    candidate_ids += [[tricky_start + i, tricky_start + i + 1] for i in range(len(TRICKY_SENTENCES) - 1)]
+    candidate_ids.append(list(range(tricky_start, len(sentence_store))))
+    for sentence_ids in candidate_ids:
+        expected_metrics = summarizer.calculate_all_metrics(sentence_store.text(sentence_ids), sentence_store.text(), len(sentence_ids))
+        assert metrics_engine.metrics_for(sentence_ids) == expected_metrics, sentence_ids
+
+
+def test_empty_candidate_gets_the_placeholder_metrics():
+    sentence_store = make_sentence_store(0)
+    assert summary_metrics.SummaryMetricsEngine(sentence_store).metrics_for([]) == summarizer.calculate_all_metrics("", sentence_store.text())
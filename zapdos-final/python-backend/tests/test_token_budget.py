@@ -0,0 +1,89 @@
+import math
+import random
+
+import pytest
+
+import app
+import synthetic_documents
+import token_budget
+from sentence_store import SentenceStore
+
+
+def check_chunk_ranges(chunk_ranges, token_counts, max_chunk_tokens):
+    assert [start for start, _ in chunk_ranges] == [0] + [end for _, end in chunk_ranges[:-1]]
+    assert chunk_ranges[-1][1] == len(token_counts)
+    for start, end in chunk_ranges:
+        assert end - start == 1 or sum(token_counts[start:end]) <= max_chunk_tokens
+
+
+def test_count_without_tiktoken_estimates_from_characters(monkeypatch):
+    monkeypatch.setattr(token_budget, "tiktoken", None)
+    token_budget.get_encoding.cache_clear()
+    try:
+        assert token_budget.count_tokens("a" * 9, "gpt-4o") == 3
+        assert token_budget.count_tokens_per_text(["abcd", "", "abcde"], "gpt-4o") == [1, 0, 2]
+    finally:
+        token_budget.get_encoding.cache_clear()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_boundaries_cover_every_item_within_the_budget(seed):
+    rng = random.Random(seed)
+    token_counts = [rng.randint(1, 60) for _ in range(rng.randint(1, 300))]
+    max_chunk_tokens = rng.randint(60, 2000)
+    chunk_ranges = token_budget.balanced_chunk_boundaries(token_counts, max_chunk_tokens)
+    check_chunk_ranges(chunk_ranges, token_counts, max_chunk_tokens)
+    assert len(chunk_ranges) >= math.ceil(sum(token_counts) / max_chunk_tokens)
+
+
+def test_boundaries_are_balanced_and_isolate_oversized_items():
+    assert token_budget.balanced_chunk_boundaries([10] * 100, 300) == [(0, 25), (25, 50), (50, 75), (75, 100)]
+    token_counts = [10, 10, 500, 10, 10]
+    chunk_ranges = token_budget.balanced_chunk_boundaries(token_counts, 100)
+    check_chunk_ranges(chunk_ranges, token_counts, 100)
+    assert (2, 3) in chunk_ranges
+    assert token_budget.balanced_chunk_boundaries([], 100) == []
+
+
+def test_app_chunks_carry_their_own_pages_and_fit_the_budget(monkeypatch):
+    monkeypatch.setattr(app, "OPENAI_MAX_TOKENS_PER_CHUNK_CALL", app.OPENAI_PROMPT_OVERHEAD_TOKENS + 6000)
+    rng = random.Random(0)
+    sentence_store = SentenceStore()
+    for page_num in range(1, 41):
+        sentence_store.add_page(synthetic_documents.make_content_page(rng, page_num, sentences_count=20), page_num)
+    sentence_ids = list(range(0, len(sentence_store), 2))
+
+    chunks = app.create_token_budget_chunks(sentence_store, sentence_ids, 40)
+    assert len(chunks) > 1
+    assert " ".join(chunk["text"] for chunk in chunks) == sentence_store.text(sentence_ids)
+    max_chunk_input_tokens = (app.OPENAI_MAX_TOKENS_PER_CHUNK_CALL - app.OPENAI_PROMPT_OVERHEAD_TOKENS
+                              - app.get_expected_output_tokens(app.OPENAI_MAX_QUESTIONS_PER_CHUNK, is_chunked=True))
+    assert all(chunk["tokens"] <= max_chunk_input_tokens for chunk in chunks)
+    assert max(chunk["tokens"] for chunk in chunks) - min(chunk["tokens"] for chunk in chunks) < max_chunk_input_tokens / 4
+
+    remaining_sentence_ids = list(sentence_ids)
+    for chunk in chunks: # Recover each chunk's sentences from its text to check its pages
+        chunk_sentence_ids = [remaining_sentence_ids.pop(0)]
+        while sentence_store.text(chunk_sentence_ids) != chunk["text"]:
+            chunk_sentence_ids.append(remaining_sentence_ids.pop(0))
+        assert chunk["pages"] == sentence_store.pages_for(chunk_sentence_ids)
+    assert remaining_sentence_ids == []
+
+
+def test_scheduler_reserves_the_typical_output_not_the_ceiling(monkeypatch):
+    reserved_tokens = []
+
+    class RecordingScheduler:
+        def run(self, request_function, estimated_tokens, log_prefix):
+            reserved_tokens.append(estimated_tokens)
+            return app.CompletionText('{"questions": []}', None)
+
+    monkeypatch.setattr(app, "openai_client", object())
+    monkeypatch.setattr(app.llm_cache, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(app.llm_scheduler, "get_llm_scheduler", RecordingScheduler)
+    text_content = synthetic_documents.make_synthetic_text(400, seed=0)
+    app.get_questions_from_text_openai(text_content, "MCQs", [1, 2], 2, is_chunked=True, chunk_info="1/2")
+    desired_questions = app.get_desired_question_count(len(text_content), len(text_content.split()), 2, is_chunked=True)
+    prompt_tokens = reserved_tokens[0] - app.get_typical_output_tokens(desired_questions)
+    assert token_budget.count_tokens(text_content, app.OPENAI_MODEL_NAME) < prompt_tokens < token_budget.count_tokens(text_content, app.OPENAI_MODEL_NAME) + 2000
+    assert app.get_typical_output_tokens(desired_questions) < app.get_expected_output_tokens(desired_questions, is_chunked=True)
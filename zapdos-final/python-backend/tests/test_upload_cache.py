@@ -0,0 +1,74 @@
+import time
+import threading
+
+import pytest
+
+import summarizer
+import upload_cache
+import synthetic_documents
+
+UPLOAD_SHA256 = "0" * 64
+
+
+@pytest.fixture
+def synthetic_pdf_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_cache, "UPLOAD_CACHE_PATH", str(tmp_path / "upload_cache.sqlite3"))
+    monkeypatch.setattr(upload_cache, "UPLOAD_SHARED_EXTRACTION_TIMEOUT_SECONDS", 60)
+    pdf_path = str(tmp_path / "handout.pdf")
+    synthetic_documents.write_synthetic_pdf(synthetic_documents.make_synthetic_pages(3, seed=0), pdf_path)
+    return pdf_path
+
+
+def read_pages(pdf_path, extraction_stats):
+    with upload_cache.open_pdf_page_texts(pdf_path, UPLOAD_SHA256, extraction_stats) as (total_pages, page_texts):
+        return total_pages, list(page_texts)
+
+
+def test_second_upload_is_served_from_the_cache(synthetic_pdf_path):
+    first_stats, second_stats = {}, {}
+    first_result = read_pages(synthetic_pdf_path, first_stats)
+    second_result = read_pages(synthetic_pdf_path, second_stats)
+    assert (first_stats['upload_cache'], second_stats['upload_cache']) == ("miss", "hit")
+    assert second_result == first_result
+    assert second_stats['pages_with_text'] == len(first_result[1])
+
+
+def test_leader_that_never_reads_its_pages_releases_waiting_requests(synthetic_pdf_path, capsys):
+    follower_result = {}
+
+    def follow():
+        follower_stats = {}
+        follower_result['pages'] = read_pages(synthetic_pdf_path, follower_stats)
+        follower_result['upload_cache'] = follower_stats['upload_cache']
+
+    with upload_cache.open_pdf_page_texts(synthetic_pdf_path, UPLOAD_SHA256, {}) as (_total_pages, _page_texts):
+        follower_thread = threading.Thread(target=follow)
+        follower_thread.start()
+        time.sleep(0.5) # The follower is now waiting on the leader's extraction...
+        # ...which the leader abandons without ever starting its page iterator
+    follower_thread.join(timeout=10)
+
+    assert not follower_thread.is_alive()
+    assert "already being extracted" in capsys.readouterr().out
+    assert follower_result['upload_cache'] == "miss"
+    assert len(follower_result['pages'][1]) == follower_result['pages'][0]
+    assert not upload_cache._inflight_extractions
+
+
+def test_filtered_pages_round_trip_per_filter_config(synthetic_pdf_path):
+    pages = synthetic_documents.make_synthetic_pages(12, seed=0)
+    filtered_pages = summarizer.filter_and_split_pages(iter(pages), len(pages))
+    filter_config = summarizer.get_page_filter_config()
+    cache_key = upload_cache.get_filtered_pages_cache_key(UPLOAD_SHA256, filter_config)
+    assert upload_cache.get_cached_filtered_pages(cache_key) is None
+
+    upload_cache.store_filtered_pages(cache_key, len(pages), len(pages), filtered_pages)
+    total_pages, pages_with_text, cached_filtered_pages = upload_cache.get_cached_filtered_pages(cache_key)
+    assert (total_pages, pages_with_text) == (len(pages), len(pages))
+    content_page_nums, sentence_store, page_digest, first_raw_page = cached_filtered_pages
+    assert (content_page_nums, page_digest, first_raw_page) == (filtered_pages[0], filtered_pages[2], filtered_pages[3])
+    assert list(sentence_store.sentences()) == list(filtered_pages[1].sentences())
+    assert sentence_store.pages_for(range(len(sentence_store))) == filtered_pages[1].pages_for(range(len(filtered_pages[1])))
+
+    changed_config = dict(filter_config, version=filter_config['version'] + 1)
+    assert upload_cache.get_filtered_pages_cache_key(UPLOAD_SHA256, changed_config) != cache_key
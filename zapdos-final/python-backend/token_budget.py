@@ -0,0 +1,79 @@
+"""
+Model-token counting and balanced chunk boundaries.
+
+Tokens are counted with the model's real tiktoken encoding when tiktoken is installed (the
+encoding is loaded once per model and cached), otherwise estimated from the character count.
+Chunk boundaries are chosen so every chunk fits a token budget and all chunks are about the
+same size, so parallel LLM calls over them finish around the same time.
+"""
+import math
+import bisect
+import functools
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+FALLBACK_ENCODING_NAME = "o200k_base" # gpt-4o's encoding, for models tiktoken does not know
+CHARS_PER_TOKEN_ESTIMATE = 4 # Without tiktoken: English prose averages about four characters per token
+
+
+def is_available():
+    return tiktoken is not None
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model_name):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding(FALLBACK_ENCODING_NAME)
+
+
+def count_tokens(text, model_name):
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN_ESTIMATE)
+    return len(encoding.encode_ordinary(text))
+
+
+def count_tokens_per_text(texts, model_name):
+    """Token count of each text (e.g. every sentence of a document), batched when tiktoken is available."""
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return [math.ceil(len(text) / CHARS_PER_TOKEN_ESTIMATE) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+
+def balanced_chunk_boundaries(token_counts, max_chunk_tokens):
+    """
+    Splits a sequence of items (sentences) with the given token counts into the fewest chunks
+    whose totals stay within max_chunk_tokens, placing each boundary at the item nearest an
+    even share of the total so the chunks are about the same size. An item larger than the
+    budget on its own becomes a chunk by itself. Returns [(start, end)] index ranges.
+    """
+    items_count = len(token_counts)
+    if not items_count:
+        return []
+    cumulative_tokens = [0]
+    for token_count in token_counts:
+        cumulative_tokens.append(cumulative_tokens[-1] + token_count)
+    total_tokens = cumulative_tokens[-1]
+
+    for chunks_count in range(max(1, math.ceil(total_tokens / max_chunk_tokens)), items_count + 1):
+        boundaries = [0]
+        for chunk_index in range(1, chunks_count):
+            target_tokens = total_tokens * chunk_index / chunks_count
+            boundary = bisect.bisect_left(cumulative_tokens, target_tokens, lo=boundaries[-1] + 1, hi=items_count)
+            # Snap to whichever neighbouring sentence boundary is closer to the even share
+            if boundary > boundaries[-1] + 1 and target_tokens - cumulative_tokens[boundary - 1] < cumulative_tokens[boundary] - target_tokens:
+                boundary -= 1
+            boundaries.append(min(boundary, items_count - (chunks_count - chunk_index)))
+        boundaries.append(items_count)
+        chunk_ranges = list(zip(boundaries[:-1], boundaries[1:]))
+        if all(end - start == 1 or cumulative_tokens[end] - cumulative_tokens[start] <= max_chunk_tokens for start, end in chunk_ranges):
+            return chunk_ranges
+    return [(index, index + 1) for index in range(items_count)]
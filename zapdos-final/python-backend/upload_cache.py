@@ -0,0 +1,274 @@
+"""
+Cache of extracted PDF page text, keyed on the uploaded bytes.
+
+Uploads are hashed (SHA-256) while they are streamed to disk; the pages extracted from that
+document are kept in a local SQLite file (zlib-compressed JSON, least recently used entries
+evicted beyond UPLOAD_CACHE_MAX_BYTES), so re-uploading the same handout skips extraction.
+The result of boilerplate filtering and sentence splitting (the summarizer's SentenceStore) is
+cached too, keyed on the upload and the filter configuration, so a repeat upload skips reading
+its pages altogether; the summarizer and LLM caches take over from there. Concurrent requests
+for the same document share one in-flight extraction: the first streams pages into its own
+pipeline while recording them, the others wait for the recorded pages.
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import contextlib
+import concurrent.futures
+
+import pdf_extraction
+from sentence_store import SentenceStore
+
+UPLOAD_CACHE_ENABLED = True
+UPLOAD_CACHE_PATH = os.path.join(tempfile.gettempdir(), "zapdos_upload_cache.sqlite3")
+UPLOAD_CACHE_MAX_BYTES = 256 * 1024 * 1024
+UPLOAD_CACHE_VERSION = 1 # Bump when extraction output changes
+UPLOAD_READ_BLOCK_BYTES = 1024 * 1024
+UPLOAD_SHARED_EXTRACTION_TIMEOUT_SECONDS = 300 # A request waiting on another's extraction gives up and extracts itself after this
+
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'filtered_hits': 0, 'filtered_misses': 0, 'shared_extractions': 0, 'writes': 0, 'evictions': 0, 'errors': 0}
+_inflight_extractions = {} # cache_key -> Future of (total_pages, pages) being extracted
+_inflight_lock = threading.Lock()
+
+
+class ExtractionAbandoned(Exception):
+    """The request leading an in-flight extraction stopped before it finished."""
+
+
+def save_and_hash_upload(upload_stream, destination_file):
+    """Copies the upload stream to destination_file in blocks, hashing as it goes. Returns (sha256 hex, bytes written)."""
+    upload_hash = hashlib.sha256()
+    bytes_written = 0
+    while True:
+        block = upload_stream.read(UPLOAD_READ_BLOCK_BYTES)
+        if not block:
+            break
+        upload_hash.update(block)
+        destination_file.write(block)
+        bytes_written += len(block)
+    return upload_hash.hexdigest(), bytes_written
+
+
+def get_extraction_cache_key(upload_sha256):
+    # The backend changes the extracted text, so it is part of the key
+    backend_name = "pypdfium2" if pdf_extraction.use_fast_backend() else "pdfplumber"
+    return f"{upload_sha256}:{backend_name}:v{UPLOAD_CACHE_VERSION}"
+
+
+def get_filtered_pages_cache_key(upload_sha256, filter_config):
+    """Key of the upload's filtered pages: its extraction key plus a hash of the (JSON-serializable) filter configuration."""
+    config_hash = hashlib.sha256(json.dumps(filter_config, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{get_extraction_cache_key(upload_sha256)}:filtered:{config_hash}"
+
+
+def _connect(cache_path):
+    connection = sqlite3.connect(cache_path, timeout=10)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS upload_cache ("
+        " cache_key TEXT PRIMARY KEY, value BLOB NOT NULL, size_bytes INTEGER NOT NULL, last_access REAL NOT NULL)")
+    return connection
+
+
+@contextlib.contextmanager
+def _open_cache(cache_path):
+    # One short-lived connection per call (commits on success), so the cache is usable from any thread
+    connection = _connect(cache_path)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def _get_cached_value(cache_key, cache_path, stats_prefix=""):
+    cache_path = cache_path or UPLOAD_CACHE_PATH
+    with _cache_lock:
+        try:
+            with _open_cache(cache_path) as connection:
+                row = connection.execute("SELECT value FROM upload_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+                if row is not None:
+                    connection.execute("UPDATE upload_cache SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+        except (sqlite3.Error, OSError) as e_cache:
+            _cache_stats['errors'] += 1
+            print(f"[UPLOAD_CACHE] Lookup failed: {e_cache}")
+            return None
+        if row is None:
+            _cache_stats[stats_prefix + 'misses'] += 1
+            return None
+        _cache_stats[stats_prefix + 'hits'] += 1
+    return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+
+def _store_value(cache_key, value, cache_path, max_bytes):
+    cache_path = cache_path or UPLOAD_CACHE_PATH
+    max_bytes = max_bytes or UPLOAD_CACHE_MAX_BYTES
+    value_blob = zlib.compress(json.dumps(value).encode("utf-8"))
+    with _cache_lock:
+        try:
+            with _open_cache(cache_path) as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO upload_cache (cache_key, value, size_bytes, last_access) VALUES (?, ?, ?, ?)",
+                    (cache_key, value_blob, len(value_blob), time.time()))
+                _cache_stats['writes'] += 1
+                total_bytes = connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM upload_cache").fetchone()[0]
+                if total_bytes > max_bytes:
+                    evicted_count = 0
+                    for evict_key, size_bytes in connection.execute(
+                            "SELECT cache_key, size_bytes FROM upload_cache ORDER BY last_access ASC").fetchall():
+                        if total_bytes <= max_bytes:
+                            break
+                        connection.execute("DELETE FROM upload_cache WHERE cache_key = ?", (evict_key,))
+                        total_bytes -= size_bytes
+                        evicted_count += 1
+                    _cache_stats['evictions'] += evicted_count
+                    print(f"[UPLOAD_CACHE] Evicted {evicted_count} least recently used entries ({total_bytes} bytes kept).")
+        except (sqlite3.Error, OSError) as e_cache:
+            _cache_stats['errors'] += 1
+            print(f"[UPLOAD_CACHE] Write failed: {e_cache}")
+
+
+def get_cached_pages(cache_key, cache_path=None):
+    """Returns the cached (total_pages, [(page_text, page_num)]) for cache_key (and marks it recently used), or None."""
+    cached_value = _get_cached_value(cache_key, cache_path)
+    if cached_value is None:
+        return None
+    return cached_value['total_pages'], [(page_text, page_num) for page_text, page_num in cached_value['pages']]
+
+
+def store_pages(cache_key, total_pages, pages, cache_path=None, max_bytes=None):
+    """Stores a document's extracted pages, then evicts least recently used entries beyond max_bytes."""
+    _store_value(cache_key, {'total_pages': total_pages, 'pages': pages}, cache_path, max_bytes)
+
+
+def get_cached_filtered_pages(cache_key, cache_path=None):
+    """
+    Returns the cached (total_pages, pages_with_text, filtered_pages) for cache_key, or None;
+    filtered_pages is summarizer.filter_and_split_pages' (content_page_nums, sentence_store, page_digest, first_raw_page).
+    """
+    cached_value = _get_cached_value(cache_key, cache_path, stats_prefix="filtered_")
+    if cached_value is None:
+        return None
+    first_raw_page = tuple(cached_value['first_raw_page']) if cached_value['first_raw_page'] else None
+    filtered_pages = (cached_value['content_page_nums'], SentenceStore.from_dict(cached_value['sentence_store']),
+                      cached_value['page_digest'], first_raw_page)
+    return cached_value['total_pages'], cached_value['pages_with_text'], filtered_pages
+
+
+def store_filtered_pages(cache_key, total_pages, pages_with_text, filtered_pages, cache_path=None, max_bytes=None):
+    """Stores an upload's filtered pages (see get_cached_filtered_pages), evicting like store_pages."""
+    content_page_nums, sentence_store, page_digest, first_raw_page = filtered_pages
+    _store_value(cache_key, {
+        'total_pages': total_pages,
+        'pages_with_text': pages_with_text,
+        'content_page_nums': content_page_nums,
+        'sentence_store': sentence_store.to_dict(),
+        'page_digest': page_digest,
+        'first_raw_page': first_raw_page,
+    }, cache_path, max_bytes)
+
+
+def _iter_recorded_extraction(pdf_path, total_pages, cache_key, inflight_future, extraction_stats):
+    # Leader: streams pages into the caller's pipeline while recording them for the cache and any waiting requests
+    pages = []
+    for page_text_item in pdf_extraction.iter_pdf_page_texts(pdf_path, total_pages, extraction_stats):
+        pages.append(page_text_item)
+        yield page_text_item
+    store_pages(cache_key, total_pages, pages)
+    inflight_future.set_result((total_pages, pages))
+
+
+def _iter_known_pages(pages, extraction_stats):
+    for page_text_item in pages:
+        if extraction_stats is not None:
+            extraction_stats["pages_with_text"] = extraction_stats.get("pages_with_text", 0) + 1
+        yield page_text_item
+
+
+def _open_uncached_pdf_page_texts(pdf_path, extraction_stats):
+    if extraction_stats is not None:
+        extraction_stats['upload_cache'] = "miss"
+    total_pages = pdf_extraction.get_page_count(pdf_path)
+    return total_pages, pdf_extraction.iter_pdf_page_texts(pdf_path, total_pages, extraction_stats)
+
+
+@contextlib.contextmanager
+def open_pdf_page_texts(pdf_path, upload_sha256=None, extraction_stats=None):
+    """
+    Context manager giving (total_pages, iterator of (page_text, page_num)) for an uploaded PDF:
+    from the cache when these bytes were extracted before, from another request's in-flight
+    extraction of the same bytes, or by extracting it now (and caching the result).
+    extraction_stats['upload_cache'] records which ("hit", "shared", "miss" or "off").
+    A request leading an in-flight extraction releases the requests waiting on it when the block
+    exits, whether or not it read every page (they then extract for themselves).
+    """
+    if not UPLOAD_CACHE_ENABLED or not upload_sha256:
+        if extraction_stats is not None:
+            extraction_stats['upload_cache'] = "off"
+        total_pages = pdf_extraction.get_page_count(pdf_path)
+        yield total_pages, pdf_extraction.iter_pdf_page_texts(pdf_path, total_pages, extraction_stats)
+        return
+
+    cache_key = get_extraction_cache_key(upload_sha256)
+    cached_result = get_cached_pages(cache_key)
+    if cached_result is not None:
+        print(f"[UPLOAD_CACHE] Extracted pages for upload {upload_sha256[:12]} served from cache.")
+        if extraction_stats is not None:
+            extraction_stats['upload_cache'] = "hit"
+        yield cached_result[0], _iter_known_pages(cached_result[1], extraction_stats)
+        return
+
+    with _inflight_lock:
+        inflight_future = _inflight_extractions.get(cache_key)
+        is_leader = inflight_future is None
+        if is_leader:
+            inflight_future = _inflight_extractions[cache_key] = concurrent.futures.Future()
+    if not is_leader:
+        print(f"[UPLOAD_CACHE] Upload {upload_sha256[:12]} is already being extracted; waiting for it.")
+        try:
+            total_pages, pages = inflight_future.result(timeout=UPLOAD_SHARED_EXTRACTION_TIMEOUT_SECONDS)
+        except (ExtractionAbandoned, concurrent.futures.TimeoutError) as e_abandoned:
+            print(f"[UPLOAD_CACHE] Shared extraction did not finish ({type(e_abandoned).__name__}: {e_abandoned}); extracting here.")
+            yield _open_uncached_pdf_page_texts(pdf_path, extraction_stats)
+            return
+        with _cache_lock:
+            _cache_stats['shared_extractions'] += 1
+        if extraction_stats is not None:
+            extraction_stats['upload_cache'] = "shared"
+        yield total_pages, _iter_known_pages(pages, extraction_stats)
+        return
+
+    # Leader: whatever happens to the extraction (or to the caller, before or while it reads the
+    # pages), the in-flight entry is cleared and waiting requests are released on the way out
+    recorded_pages = None
+    try:
+        if extraction_stats is not None:
+            extraction_stats['upload_cache'] = "miss"
+        total_pages = pdf_extraction.get_page_count(pdf_path)
+        recorded_pages = _iter_recorded_extraction(pdf_path, total_pages, cache_key, inflight_future, extraction_stats)
+        yield total_pages, recorded_pages
+    finally:
+        if recorded_pages is not None:
+            recorded_pages.close()
+        with _inflight_lock:
+            if _inflight_extractions.get(cache_key) is inflight_future:
+                del _inflight_extractions[cache_key]
+        if not inflight_future.done():
+            inflight_future.set_exception(ExtractionAbandoned("The leading request stopped before every page was extracted."))
+
+
+def get_cache_stats():
+    with _cache_lock:
+        return dict(_cache_stats)
+
+
+def clear_cache(cache_path=None):
+    cache_path = cache_path or UPLOAD_CACHE_PATH
+    with _cache_lock:
+        with _open_cache(cache_path) as connection:
+            connection.execute("DELETE FROM upload_cache")